@@ -32,10 +32,25 @@ MIDDLEWARE: list[str] = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "library.middleware.PrimaryStickinessMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Per-request SQL and timing instrumentation (``library.middleware``).  When
+# enabled, every response carries a ``Server-Timing`` header with the query
+# count, database time and view time.  Requests slower than
+# ``LIBRARY_SLOW_REQUEST_MS`` are logged (sampled) to ``library.profiling``,
+# and statements repeated ``LIBRARY_N_PLUS_ONE_THRESHOLD`` times in one
+# request are reported as likely N+1 queries.
+LIBRARY_PROFILING: bool = DEBUG
+LIBRARY_SLOW_REQUEST_MS: float = 500.0
+LIBRARY_SLOW_REQUEST_SAMPLE_RATE: float = 1.0
+LIBRARY_N_PLUS_ONE_THRESHOLD: int = 10
+
+if LIBRARY_PROFILING:
+    MIDDLEWARE.insert(0, "library.middleware.QueryProfilingMiddleware")
+
 ROOT_URLCONF: str = "config.urls"
 
 TEMPLATES: list[dict] = [
@@ -64,9 +79,84 @@ DATABASES: dict[str, dict[str, object]] = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Tests use a file, not SQLite's in-memory default, so they can
+        # exercise WAL journaling with several connections.
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
+# Production SQLite profile (``library.sqlite``).  Every new connection runs
+# ``LIBRARY_SQLITE_PRAGMAS``: WAL journaling so readers are not blocked by
+# borrows and returns, relaxed syncing, a busy timeout instead of
+# ``database is locked`` errors, and a larger page cache and mmap window.
+# Connections are kept for ``CONN_MAX_AGE`` seconds and checked before reuse.
+LIBRARY_SQLITE_TUNING: bool = not DEBUG
+LIBRARY_SQLITE_PRAGMAS: dict[str, object] = {
+    "busy_timeout": 5000,  # milliseconds
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": 256 * 1024 * 1024,  # bytes
+    "cache_size": -64 * 1024,  # negative: KiB, i.e. 64 MiB
+    "temp_store": "memory",
+}
+
+if LIBRARY_SQLITE_TUNING:
+    DATABASES["default"].update(
+        {
+            "CONN_MAX_AGE": 600,
+            "CONN_HEALTH_CHECKS": True,
+        }
+    )
+
+# Read replicas: aliases in ``DATABASES`` that hold copies of ``default``.
+# Views decorated with ``library.routers.replica_reads`` read the library's
+# tables from a random replica; a client that wrote is kept on the primary
+# for ``LIBRARY_PRIMARY_STICKY_SECONDS``.  To try it locally, add e.g.
+#
+#     DATABASES["replica"] = {
+#         "ENGINE": "django.db.backends.sqlite3",
+#         "NAME": BASE_DIR / "replica.sqlite3",
+#         "TEST": {"MIRROR": "default"},
+#     }
+#     LIBRARY_READ_REPLICAS = ["replica"]
+#
+# and refresh the copy with ``python manage.py sync_replicas``.
+LIBRARY_READ_REPLICAS: list[str] = []
+LIBRARY_PRIMARY_STICKY_SECONDS: float = 5.0
+DATABASE_ROUTERS: list[str] = ["library.routers.ReplicaRouter"]
+
+# Loans returned more than this many days ago are moved out of the Borrow
+# table by ``python manage.py archive_borrows`` (``library.archive``).
+LIBRARY_ARCHIVE_AFTER_DAYS: int = 180
+
+# Books kept in each most-borrowed ranking (week, month, year) by
+# ``python manage.py rollup_popularity`` (``library.popularity``).
+LIBRARY_POPULAR_BOOKS: int = 100
+
+# Neighbours kept per book in the "patrons also borrowed" index built by
+# ``python manage.py refresh_related_books`` (``library.recommendations``).
+LIBRARY_RELATED_BOOKS: int = 10
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The process-local cache is enough for a single server; point this at
+# Redis or Memcached when running several.
+CACHES: dict[str, dict[str, object]] = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "library",
+    }
+}
+
+# Seconds a serialized API payload stays cached.  Cache keys include the
+# book or catalog revision, so entries never go stale; the timeout only
+# bounds how long superseded payloads occupy memory.
+LIBRARY_API_CACHE_TIMEOUT: int = 300
+
+# Seconds an anonymous catalog page or a catalog card stays cached
+# (``library.pagecache``).  Keys are versioned the same way.
+LIBRARY_PAGE_CACHE_TIMEOUT: int = 300
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS: list[dict[str, str]] = [
@@ -102,11 +192,46 @@ STATICFILES_DIRS: list[Path] = [
 
 # Media files (uploaded by users) configuration.  ``MEDIA_URL`` defines the
 # base URL under which media files are served, and ``MEDIA_ROOT`` points to
-# the directory where uploaded files are stored.  In development, this
-# directory will be served via ``django.conf.urls.static.static`` in
-# ``config/urls.py``.  In production you should configure your web server
-# accordingly.
+# the directory where uploaded files are stored.  The directory is served by
+# ``library.media.serve`` (see ``config/urls.py``), which supports Range and
+# conditional requests.
 MEDIA_URL: str = "media/"
 MEDIA_ROOT: Path = BASE_DIR / "media"
 
-DEFAULT_AUTO_FIELD: str = "django.db.models.BigAutoField"
\ No newline at end of file
+# How ``library.media.serve`` sends file bodies: "" streams them from Django
+# (with sendfile under servers that support ``wsgi.file_wrapper``),
+# "x-accel-redirect" hands them to nginx through an internal location at
+# ``LIBRARY_MEDIA_ACCEL_PREFIX`` (aliased to ``MEDIA_ROOT``), and
+# "x-sendfile" hands them to Apache or lighttpd.
+LIBRARY_MEDIA_OFFLOAD: str = ""
+LIBRARY_MEDIA_ACCEL_PREFIX: str = "/protected-media/"
+# Browser cache lifetime for media other than the immutable cover variants.
+LIBRARY_MEDIA_MAX_AGE: int = 60 * 60
+
+# Cover image variants as ``kind: (width, height)``, see ``library.thumbnails``.
+# Variants live under ``media/book_covers/variants/`` with content-hashed
+# names, so the web server can serve that directory with a far-future
+# ``Cache-Control: public, max-age=31536000, immutable``.
+LIBRARY_COVER_VARIANTS: dict[str, tuple[int, int]] = {
+    "list": (240, 260),
+    "detail": (320, 480),
+    "retina": (640, 960),
+}
+
+DEFAULT_AUTO_FIELD: str = "django.db.models.BigAutoField"
+
+# Logging: send the library's own loggers (e.g. ``library.profiling``) to the
+# console; Django's default logging configuration is kept for everything else.
+LOGGING: dict = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "library": {
+            "handlers": ["console"],
+            "level": "INFO",
+        },
+    },
+}
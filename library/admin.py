@@ -4,21 +4,142 @@ Admin configuration for the Library Management System.
 Registers the Category, Book and Borrow models with the Django admin
 interface, enabling simple management of these objects from the
 administration site.
+
+The changelists are built to stay fast with millions of borrows: related
+objects are joined instead of fetched per row, counts are estimated
+(:class:`~library.pagination.EstimatedCountPaginator`), foreign keys are
+edited with autocomplete widgets instead of dropdowns listing every user
+and book, and the Borrow changelist pages by keyset instead of offset.
 """
 
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.db import connections
+from django.utils import timezone
+
+from . import search
+from .models import (
+    ArchivedBorrow,
+    Book,
+    Borrow,
+    Category,
+    InventoryReconciliation,
+    OverdueReport,
+)
+from .pagination import (
+    EstimatedCountPaginator,
+    InvalidCursor,
+    cursor_for,
+    cursor_values,
+    decode_cursor,
+    keyset_filter,
+)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Base class for changelists that must not count or list whole tables."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class SearchRankedChangeList(ChangeList):
+    """Changelist that shows the best full-text matches first."""
+
+    def get_ordering(self, request, queryset):
+        if (
+            self.query.strip()
+            and ORDER_VAR not in self.params
+            and search.is_supported(connections[queryset.db])
+        ):
+            return ["search_rank", "-pk"]
+        return super().get_ordering(request, queryset)
+
+
+class BorrowChangeList(ChangeList):
+    """
+    Borrow changelist paged by keyset on ``(-borrowed_at, -id)``.
+
+    Instead of a page number the URL carries ``cursor``, the position of
+    the last row shown, so every page is an index range scan no matter how
+    deep it is.  Sorting by another column falls back to numbered pages.
+    """
+
+    CURSOR_VAR = "cursor"
+    KEYSET_ORDERING = ("-borrowed_at", "-id")
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(self.CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Changing filters, search or sorting starts from the first page.
+        new_params = new_params or {}
+        if self.CURSOR_VAR not in new_params:
+            remove = [*(remove or []), self.CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.keyset = ORDER_VAR not in self.params and not self.show_all
+        self.first_page_url = self.next_page_url = None
+        if not self.keyset:
+            return
+        queryset = self.queryset
+        cursor = self.params.get(self.CURSOR_VAR)
+        if cursor:
+            try:
+                values = cursor_values(
+                    queryset,
+                    self.KEYSET_ORDERING,
+                    decode_cursor(cursor, len(self.KEYSET_ORDERING)),
+                )
+                queryset = queryset.filter(keyset_filter(self.KEYSET_ORDERING, values))
+            except InvalidCursor:
+                raise IncorrectLookupParameters
+            self.first_page_url = self.get_query_string()
+        rows = list(queryset[: self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            rows = rows[: self.list_per_page]
+            next_cursor = cursor_for(rows[-1], self.KEYSET_ORDERING)
+            self.next_page_url = self.get_query_string({self.CURSOR_VAR: next_cursor})
+        self.result_list = rows
+        self.multi_page = bool(self.first_page_url or self.next_page_url)
+
+
+class LoanStatusFilter(admin.SimpleListFilter):
+    """Open, overdue or returned loans; open loans come from a partial index."""
 
-from .models import Category, Book, Borrow
+    title = "status"
+    parameter_name = "status"
+
+    def lookups(self, request, model_admin):
+        return (
+            ("open", "On loan"),
+            ("overdue", "Overdue"),
+            ("returned", "Returned"),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == "open":
+            return queryset.filter(returned_at__isnull=True)
+        if self.value() == "overdue":
+            return queryset.filter(returned_at__isnull=True, due_date__lt=timezone.now())
+        if self.value() == "returned":
+            return queryset.filter(returned_at__isnull=False)
+        return queryset
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(ScalableAdmin):
     list_display = ("name",)
     search_fields = ("name",)
 
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(ScalableAdmin):
     list_display = (
         "title",
         "author",
@@ -26,14 +147,67 @@ class BookAdmin(admin.ModelAdmin):
         "total_copies",
         "available_copies",
     )
+    list_select_related = ("category",)
     list_filter = ("category",)
     search_fields = ("title", "author")
+    autocomplete_fields = ("category",)
     list_per_page = 25
 
+    def get_search_results(self, request, queryset, search_term):
+        """Use the full-text index instead of ``icontains`` scans."""
+        if not search_term or not search.is_supported(connections[queryset.db]):
+            return super().get_search_results(request, queryset, search_term)
+        return search.search_books(queryset, search_term), False
+
+    def get_changelist(self, request, **kwargs):
+        return SearchRankedChangeList
+
 
 @admin.register(Borrow)
-class BorrowAdmin(admin.ModelAdmin):
+class BorrowAdmin(ScalableAdmin):
     list_display = ("borrower", "book", "borrowed_at", "due_date", "returned_at")
-    list_filter = ("returned_at",)
+    list_select_related = ("borrower", "book")
+    # Fixed date ranges instead of ``date_hierarchy``, whose drill-down
+    # links need a DISTINCT over the dates of every borrow.
+    list_filter = (LoanStatusFilter, ("borrowed_at", admin.DateFieldListFilter))
     search_fields = ("borrower__username", "book__title")
-    date_hierarchy = "borrowed_at"
\ No newline at end of file
+    autocomplete_fields = ("borrower", "book")
+
+    def get_changelist(self, request, **kwargs):
+        return BorrowChangeList
+
+
+@admin.register(ArchivedBorrow)
+class ArchivedBorrowAdmin(ScalableAdmin):
+    """Read-only view of loans moved out of the Borrow table."""
+
+    list_display = ("id", "borrower", "book", "borrowed_at", "returned_at", "archived_at")
+    list_select_related = ("borrower", "book")
+    search_fields = ("=borrower__username", "book__title")
+    raw_id_fields = ("borrower", "book")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OverdueReport)
+class OverdueReportAdmin(ScalableAdmin):
+    list_display = ("as_of", "loan_count", "total_fine", "started_at", "finished_at")
+    date_hierarchy = "as_of"
+
+
+@admin.register(InventoryReconciliation)
+class InventoryReconciliationAdmin(ScalableAdmin):
+    list_display = (
+        "started_at",
+        "incremental",
+        "repair",
+        "books_checked",
+        "discrepancies",
+        "repaired",
+        "finished_at",
+    )
+    list_filter = ("incremental", "repair")
@@ -6,8 +6,33 @@ register its models with the ORM.
 """
 
 from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+
+
+def install_search_index(sender, using, **kwargs) -> None:
+    """Re-create the full-text index triggers after every ``migrate``."""
+    from . import search
+
+    search.install(connections[using])
 
 
 class LibraryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
-    name = "library"
\ No newline at end of file
+    name = "library"
+
+    def ready(self) -> None:
+        from . import signals, sqlite, stats, thumbnails
+
+        connection_created.connect(sqlite.configure_connection)
+        post_migrate.connect(install_search_index, sender=self)
+        Book = self.get_model("Book")
+        Category = self.get_model("Category")
+        pre_save.connect(signals.book_saving, sender=Book)
+        post_save.connect(signals.book_saved, sender=Book)
+        post_delete.connect(signals.book_deleted, sender=Book)
+        post_save.connect(thumbnails.cover_saved, sender=Book)
+        post_save.connect(signals.category_changed, sender=Category)
+        post_delete.connect(signals.category_changed, sender=Category)
+        post_save.connect(stats.create_category_stats, sender=Category)
@@ -0,0 +1,113 @@
+"""
+Archival of returned loans.
+
+Every loan ever made used to stay in :class:`~library.models.Borrow`,
+which the borrow and return paths, ``my_history`` and the admin all read.
+:func:`archive_returned` moves loans returned more than
+``LIBRARY_ARCHIVE_AFTER_DAYS`` ago into
+:class:`~library.models.ArchivedBorrow`, so the hot table (and its
+indexes) only holds open loans and recent history.
+
+Rows are moved in primary-key ranges of ``batch_size``.  Each range is
+copied and deleted in its own short transaction, so the write lock is
+held for one batch at a time and a failed run can simply be repeated.
+:func:`compact` then returns the freed pages to the operating system.
+"""
+
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import ArchivedBorrow, Borrow
+
+
+ARCHIVED_FIELDS: tuple[str, ...] = (
+    "id",
+    "borrower_id",
+    "book_id",
+    "borrowed_at",
+    "due_date",
+    "returned_at",
+)
+DEFAULT_BATCH_SIZE: int = 5000
+
+
+def archive_cutoff(after_days: int, now: datetime | None = None) -> datetime:
+    """The moment before which returned loans are archived."""
+    return (now or timezone.now()) - timedelta(days=after_days)
+
+
+def archive_batch(start: int, end: int, cutoff: datetime) -> int:
+    """Move the loans with ids in ``[start, end)`` returned before ``cutoff``."""
+    with transaction.atomic():
+        rows = list(
+            Borrow.objects.filter(
+                id__gte=start, id__lt=end, returned_at__lt=cutoff
+            ).values_list(*ARCHIVED_FIELDS)
+        )
+        if not rows:
+            return 0
+        now = timezone.now()
+        ArchivedBorrow.objects.bulk_create(
+            ArchivedBorrow(**dict(zip(ARCHIVED_FIELDS, row)), archived_at=now)
+            for row in rows
+        )
+        Borrow.objects.filter(id__in=[row[0] for row in rows]).delete()
+    return len(rows)
+
+
+def archive_returned(
+    cutoff: datetime,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pause: float = 0.0,
+    progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """
+    Move every loan returned before ``cutoff`` to the archive.
+
+    ``pause`` seconds are slept between batches to leave room for other
+    writers.  ``progress(archived, highest_id)`` is called after each
+    batch.  Returns the number of archived loans.
+    """
+    # Bounds of the whole table come straight from the primary key index.
+    bounds = Borrow.objects.aggregate(low=Min("id"), high=Max("id"))
+    if bounds["low"] is None:
+        return 0
+    archived = 0
+    for start in range(bounds["low"], bounds["high"] + 1, batch_size):
+        end = start + batch_size
+        moved = archive_batch(start, end, cutoff)
+        archived += moved
+        if progress is not None:
+            progress(archived, end - 1)
+        if moved and pause:
+            time.sleep(pause)
+    return archived
+
+
+def compact(using: str = "default") -> bool:
+    """
+    Reclaim the space freed by archiving; returns False if unsupported.
+
+    SQLite rewrites the whole database file and blocks writers while it
+    runs, so schedule this for a quiet period.
+    """
+    connection = connections[using]
+    table = Borrow._meta.db_table
+    if connection.vendor == "sqlite":
+        statement = "VACUUM"
+    elif connection.vendor == "postgresql":
+        statement = f"VACUUM ANALYZE {connection.ops.quote_name(table)}"
+    else:
+        return False
+    if connection.in_atomic_block:
+        raise RuntimeError("VACUUM cannot run inside a transaction")
+    with connection.cursor() as cursor:
+        cursor.execute(statement)
+    return True
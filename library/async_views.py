@@ -0,0 +1,257 @@
+"""
+Async versions of the book endpoints for the ASGI stack.
+
+Under ASGI every synchronous view in :mod:`library.views` is run in a
+worker thread, and a slow client keeps that thread busy until its
+response is written.  The views here are coroutines: queries use
+Django's async ORM (``afirst``, ``aget``, ``async for``, ``asave``),
+cache lookups use the async cache API, and streamed listings are async
+generators, so a waiting client costs a suspended task instead of a
+thread.  Django still runs each query in a thread of its own; what is
+saved is the thread held for the rest of the request.
+
+They are routed under ``async/`` next to their synchronous originals,
+which stay unchanged for WSGI deployments, and accept the same
+parameters and return the same responses.  Validation and serialization
+are shared with :mod:`library.views`; book writes call the transactional
+helpers of :mod:`library.catalog` in a thread, as the async ORM has no
+transactions.
+
+Django 4.2's ``require_http_methods`` and ``csrf_exempt`` wrap views in
+plain functions, which would turn these views back into sync ones, so
+:func:`allow_methods` replaces them here.
+"""
+
+from __future__ import annotations
+
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import (
+    Http404,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import render
+from django.utils.log import log_response
+
+from . import catalog, pagecache, recommendations, serializers
+from .conditional import aconditional_json
+from .models import Book, CatalogRevision, PopularityRollup, RelatedBooksIndex
+from .pagination import InvalidCursor, apaginate_keyset, apply_cursor
+from .routers import replica_reads
+from .views import (
+    API_STREAM_CHUNK_SIZE,
+    STREAM_CONTENT_TYPES,
+    books_cache_key,
+    books_query,
+)
+
+
+def allow_methods(*methods: str, csrf_exempt: bool = False):
+    """Async ``require_http_methods``, optionally marking the view CSRF exempt."""
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = HttpResponseNotAllowed(methods)
+                log_response(
+                    "Method Not Allowed (%s): %s",
+                    request.method,
+                    request.path,
+                    response=response,
+                    request=request,
+                )
+                return response
+            return await view(request, *args, **kwargs)
+
+        wrapper.csrf_exempt = csrf_exempt
+        return wrapper
+
+    return decorator
+
+
+async def load_user(request) -> None:
+    """
+    Load ``request.user`` from a thread before the view reads it.
+
+    The user is loaded lazily from the session, which queries the database
+    and so cannot happen on the event loop.  Requests without a session
+    cookie are anonymous and need no query.
+    """
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+@replica_reads
+async def book_detail(request, pk: int):
+    """Async :func:`library.views.book_detail`."""
+    revision = await Book.objects.filter(pk=pk).values_list("revision", flat=True).afirst()
+    if revision is None:
+        raise Http404("Book not found")
+    generation = (await RelatedBooksIndex.acurrent()).generation
+    await load_user(request)
+
+    async def build():
+        try:
+            book = await Book.objects.select_related("category").aget(pk=pk)
+        except Book.DoesNotExist:
+            raise Http404("Book not found")
+        related = [entry async for entry in recommendations.related_books(pk)]
+        return render(
+            request, "library/book_detail.html", {"book": book, "related": related}
+        )
+
+    return await pagecache.acached_page(request, f"{revision}:{generation}", build)
+
+
+async def _stream_books(rows, fields, fmt: str):
+    """Async :func:`library.views._stream_books` over ``rows.aiterator()``."""
+    dumps = serializers.dumps
+    items = list(fields.items())
+    separator, suffix = (b"", b"\n") if fmt == "ndjson" else (b",", b"")
+    if fmt == "json":
+        yield b"["
+    buffer: list[bytes] = []
+    first = True
+    async for row in rows.aiterator(chunk_size=API_STREAM_CHUNK_SIZE):
+        book = {name: field.value(row) for name, field in items}
+        buffer.append((b"" if first else separator) + dumps(book) + suffix)
+        first = False
+        if len(buffer) >= API_STREAM_CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+    if buffer:
+        yield b"".join(buffer)
+    if fmt == "json":
+        yield b"]"
+
+
+async def _api_books_get(request):
+    """Async :func:`library.views._api_books_get`."""
+    query = books_query(request)
+    if isinstance(query, JsonResponse):
+        return query
+    rows, fields, ordering, cursor, limit, stream = query
+
+    if stream is not None:
+        try:
+            rows = apply_cursor(rows, ordering, cursor)
+        except InvalidCursor:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
+        return StreamingHttpResponse(
+            _stream_books(rows, fields, stream),
+            content_type=STREAM_CONTENT_TYPES[stream],
+        )
+
+    if limit is None:
+        rows = [row async for row in rows.order_by(*ordering)]
+        return list(serializers.serialize_rows(rows, fields))
+
+    try:
+        page, next_cursor = await apaginate_keyset(rows, ordering, limit, cursor)
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    return {
+        "results": list(serializers.serialize_rows(page, fields)),
+        "next_cursor": next_cursor,
+    }
+
+
+def _json_body(request):
+    """The decoded JSON body, or ``None`` if it is not valid JSON."""
+    try:
+        return json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError:
+        return None
+
+
+@allow_methods("GET", "POST", csrf_exempt=True)
+@replica_reads
+async def api_books(request):
+    """Async :func:`library.views.api_books`."""
+    if request.method == "GET":
+        stamp = await CatalogRevision.acurrent()
+        version = str(stamp.revision)
+        if "sort" in request.GET:
+            version += f"-{(await PopularityRollup.acurrent()).generation}"
+        return await aconditional_json(
+            request,
+            etag=f"catalog-{version}",
+            last_modified=stamp.updated_at,
+            cache_key=books_cache_key(request, version),
+            build=lambda: _api_books_get(request),
+        )
+
+    payload = _json_body(request)
+    if payload is None:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+    try:
+        # Writes run in a transaction, which the async ORM does not support.
+        book = await sync_to_async(catalog.create_book)(payload)
+    except catalog.BookPayloadError as exc:
+        return JsonResponse({"error": exc.message}, status=exc.status)
+    return JsonResponse(
+        {
+            "id": book.id,
+            "message": "Book created successfully",
+        },
+        status=201,
+    )
+
+
+async def _book_detail(pk: int, fields):
+    """Async :func:`library.views._book_detail`."""
+    row = await serializers.book_values(Book.objects.filter(pk=pk), fields).afirst()
+    if row is None:
+        return JsonResponse({"error": "Book not found"}, status=404)
+    return serializers.serialize(row, fields)
+
+
+@allow_methods("GET", "PUT", "DELETE", csrf_exempt=True)
+async def api_book_detail(request, pk: int):
+    """Async :func:`library.views.api_book_detail`."""
+    if request.method == "GET":
+        try:
+            fields = serializers.select_fields(
+                serializers.BOOK_DETAIL_FIELDS, request.GET.get("fields")
+            )
+        except serializers.InvalidFields as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        stamp = await (
+            Book.objects.filter(pk=pk).values_list("revision", "updated_at").afirst()
+        )
+        if stamp is None:
+            return JsonResponse({"error": "Book not found"}, status=404)
+        revision, updated_at = stamp
+        variant = str(revision)
+        if "fields" in request.GET:
+            variant += ":" + ",".join(fields)
+        return await aconditional_json(
+            request,
+            etag=f"book-{pk}-{variant}",
+            last_modified=updated_at,
+            cache_key=f"library:api_book:{pk}:{variant}",
+            build=lambda: _book_detail(pk, fields),
+        )
+
+    if request.method == "PUT":
+        payload = _json_body(request)
+        if payload is None:
+            return JsonResponse({"error": "Invalid JSON body"}, status=400)
+        try:
+            await sync_to_async(catalog.update_book)(pk, payload)
+        except catalog.BookPayloadError as exc:
+            return JsonResponse({"error": exc.message}, status=exc.status)
+        return JsonResponse({"message": "Book updated successfully"})
+
+    # DELETE: only allowed while no copies are borrowed
+    try:
+        await sync_to_async(catalog.delete_book)(pk)
+    except catalog.BookPayloadError as exc:
+        return JsonResponse({"error": exc.message}, status=exc.status)
+    return JsonResponse({"message": "Book deleted successfully"}, status=204)
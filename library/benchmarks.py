@@ -0,0 +1,96 @@
+"""
+Shared helpers for the ``bench_*`` management commands.
+
+The benchmark commands print a single JSON document so that results can be
+stored next to a commit and compared later.  This module keeps the timing
+and summary logic in one place so every benchmark reports the same keys.
+"""
+
+from __future__ import annotations
+
+import math
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Sequence
+
+from django.conf import settings
+from django.db import transaction
+
+
+class Rollback(Exception):
+    """Raised inside :func:`rollback_after` to discard benchmark data."""
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """Return the ``fraction`` percentile (0..1) of ``samples``."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+def latency_summary(latencies: Sequence[float], elapsed: float) -> dict:
+    """
+    Summarize a list of per-operation latencies (in seconds).
+
+    Latencies are reported in milliseconds and throughput in operations per
+    second over the wall-clock ``elapsed`` time.
+    """
+    count = len(latencies)
+    return {
+        "operations": count,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_ops": round(count / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(1000 * sum(latencies) / count, 3) if count else 0.0,
+            "p50": round(1000 * percentile(latencies, 0.50), 3),
+            "p95": round(1000 * percentile(latencies, 0.95), 3),
+            "p99": round(1000 * percentile(latencies, 0.99), 3),
+            "max": round(1000 * max(latencies), 3) if count else 0.0,
+        },
+    }
+
+
+def git_revision() -> str | None:
+    """Return the current git commit of the project, if available."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(settings.BASE_DIR),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+
+@contextmanager
+def timer() -> Iterator[list[float]]:
+    """Measure the wall-clock time of a block; the result is in ``[0]``."""
+    result = [0.0]
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result[0] = time.perf_counter() - start
+
+
+@contextmanager
+def rollback_after() -> Iterator[None]:
+    """
+    Run a block in a transaction that is always rolled back.
+
+    Benchmarks use this to create throwaway rows without leaving anything
+    behind in the database they run against.
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
@@ -0,0 +1,170 @@
+"""
+Validation and write helpers for catalog books.
+
+The single-item API views and the batch endpoint share these helpers, so a
+payload is accepted or rejected the same way on both paths.  Category
+lookups go through a *resolver* callable.  The single-item views resolve
+one category with one query, while the batch path resolves every referenced
+category up front with a single ``IN`` query (see :func:`category_resolver`).
+
+:func:`create_book`, :func:`update_book` and :func:`delete_book` are the
+single-item writes.  Each runs in one transaction, so the signal handlers'
+change log entry and statistics update commit together with the book, and
+updates and deletes read the book under lock (see
+:func:`library.sqlite.lock_for_update`).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Iterable
+
+from django.db import transaction
+
+from .models import Book, Category
+from .sqlite import fits_integer, lock_for_update
+
+
+CategoryResolver = Callable[[Any], "Category | None"]
+
+MISSING_FIELDS_ERROR = (
+    "Missing required fields: title, author and category_id must be provided"
+)
+
+
+class BookPayloadError(Exception):
+    """A book payload was rejected; ``status`` is the HTTP status to use."""
+
+    def __init__(self, message: str, status: int = 400) -> None:
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _category_pk(category_id: Any) -> int | None:
+    try:
+        pk = int(category_id)
+    except (TypeError, ValueError):
+        return None
+    return pk if fits_integer(pk) else None
+
+
+def lookup_category(category_id: Any) -> Category | None:
+    """Resolve a single category id with one query."""
+    pk = _category_pk(category_id)
+    if pk is None:
+        return None
+    return Category.objects.filter(pk=pk).first()
+
+
+def category_resolver(category_ids: Iterable[Any]) -> CategoryResolver:
+    """Resolve every id in ``category_ids`` with one query."""
+    pks = {pk for pk in map(_category_pk, category_ids) if pk is not None}
+    categories = Category.objects.in_bulk(pks) if pks else {}
+    return lambda category_id: categories.get(_category_pk(category_id))
+
+
+def _validate_copies(total_copies: Any) -> int:
+    if isinstance(total_copies, bool) or not isinstance(total_copies, int) or total_copies < 0:
+        raise BookPayloadError("total_copies must be a non-negative integer")
+    return total_copies
+
+
+def build_book(payload: dict, resolve_category: CategoryResolver) -> Book:
+    """
+    Validate a create payload and return an unsaved :class:`Book`.
+
+    ``title``, ``author`` and ``category_id`` are required; ``total_copies``
+    defaults to 1 and every copy starts out available.
+    """
+    title = payload.get("title")
+    author = payload.get("author")
+    category_id = payload.get("category_id")
+    if not title or not author or not category_id:
+        raise BookPayloadError(MISSING_FIELDS_ERROR)
+    total_copies = _validate_copies(payload.get("total_copies", 1))
+    category = resolve_category(category_id)
+    if category is None:
+        raise BookPayloadError("Category not found", status=404)
+    return Book(
+        title=title,
+        author=author,
+        category=category,
+        total_copies=total_copies,
+        available_copies=total_copies,
+    )
+
+
+def apply_book_changes(
+    book: Book, payload: dict, resolve_category: CategoryResolver
+) -> None:
+    """
+    Validate an update payload and apply it to ``book`` in memory.
+
+    Supports ``title``, ``author``, ``category_id`` and ``total_copies``.
+    ``total_copies`` may not drop below the number of copies currently on
+    loan; ``available_copies`` moves by the same difference.
+    """
+    title = payload.get("title")
+    author = payload.get("author")
+    category_id = payload.get("category_id")
+    total_copies = payload.get("total_copies")
+    if total_copies is not None:
+        total_copies = _validate_copies(total_copies)
+    if category_id is not None:
+        category = resolve_category(category_id)
+        if category is None:
+            raise BookPayloadError("Category not found", status=404)
+    if total_copies is not None and total_copies < book.borrowed_copies:
+        raise BookPayloadError(
+            "total_copies cannot be less than the number of currently borrowed copies"
+        )
+
+    if title is not None:
+        book.title = title
+    if author is not None:
+        book.author = author
+    if category_id is not None:
+        book.category = category
+    if total_copies is not None:
+        # Adjust available_copies relative to change in total_copies
+        diff = total_copies - book.total_copies
+        book.total_copies = total_copies
+        book.available_copies = max(0, book.available_copies + diff)
+
+
+def create_book(payload: dict) -> Book:
+    """Validate a create payload (see :func:`build_book`) and save the book."""
+    book = build_book(payload, lookup_category)
+    with transaction.atomic():
+        book.save()
+    return book
+
+
+def _locked_book(pk: int) -> Book:
+    book = lock_for_update(Book.objects.filter(pk=pk), "revision").first()
+    if book is None:
+        raise BookPayloadError("Book not found", status=404)
+    return book
+
+
+def update_book(pk: int, payload: dict) -> Book:
+    """
+    Apply an update payload to book ``pk`` and save it.
+
+    The book is read under lock, so its ``available_copies`` cannot be
+    written back over a borrow or return that committed meanwhile.
+    """
+    with transaction.atomic():
+        book = _locked_book(pk)
+        apply_book_changes(book, payload, lookup_category)
+        book.save()
+    return book
+
+
+def delete_book(pk: int) -> None:
+    """Delete book ``pk``, unless some of its copies are on loan."""
+    with transaction.atomic():
+        book = _locked_book(pk)
+        if book.borrowed_copies > 0:
+            raise BookPayloadError("Cannot delete book while copies are borrowed")
+        book.delete()
@@ -0,0 +1,152 @@
+"""
+Reading and writing catalog files (CSV and NDJSON).
+
+Both formats use the same columns: ``title``, ``author``, ``category`` (the
+category *name*) and ``total_copies``.  Exports also carry ``id`` and
+``available_copies``, which imports ignore, so an export can be imported
+into another database as-is.
+
+Files are read as a stream of byte blocks so that imports can be parsed in
+worker processes and resumed from a byte offset.  Parsing functions are
+plain module-level functions without Django dependencies so they can run
+in a process pool.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from pathlib import Path
+from typing import IO, Iterator
+
+
+FORMATS: tuple[str, ...] = ("csv", "ndjson")
+IMPORT_COLUMNS: tuple[str, ...] = ("title", "author", "category", "total_copies")
+EXPORT_COLUMNS: tuple[str, ...] = (
+    "id",
+    "title",
+    "author",
+    "category",
+    "total_copies",
+    "available_copies",
+)
+
+ParsedRow = tuple[str, str, str, int]
+
+
+def detect_format(path: str | Path) -> str | None:
+    """Guess the file format from the file extension."""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        return "csv"
+    if suffix in (".ndjson", ".jsonl"):
+        return "ndjson"
+    return None
+
+
+def read_header(handle: IO[bytes]) -> list[str]:
+    """Read the CSV header line from a binary file positioned at its start."""
+    line = handle.readline().decode("utf-8-sig")
+    return next(csv.reader([line]), [])
+
+
+def iter_blocks(
+    handle: IO[bytes], fmt: str, block_rows: int
+) -> Iterator[tuple[int, int, list[str]]]:
+    """
+    Yield ``(start_offset, end_offset, records)`` blocks of complete records.
+
+    A CSV record may span several lines when a quoted field contains a
+    newline.  Such a record is complete once the number of quote
+    characters seen so far is even, which holds because escaped quotes
+    come in pairs.
+    """
+    start = handle.tell()
+    records: list[str] = []
+    pending = ""
+    while True:
+        raw = handle.readline()
+        if not raw:
+            break
+        pending += raw.decode("utf-8")
+        if fmt == "csv" and pending.count('"') % 2:
+            continue
+        if pending.strip():
+            records.append(pending)
+        pending = ""
+        if len(records) >= block_rows:
+            end = handle.tell()
+            yield start, end, records
+            start, records = end, []
+    if pending.strip():
+        records.append(pending)
+    if records:
+        yield start, handle.tell(), records
+
+
+def _clean_row(record: dict) -> ParsedRow:
+    title = str(record.get("title") or "").strip()
+    author = str(record.get("author") or "").strip()
+    category = str(record.get("category") or "").strip()
+    if not title or not author or not category:
+        raise ValueError("title, author and category are required")
+    copies = record.get("total_copies")
+    if copies in (None, ""):
+        copies = 1
+    try:
+        copies = int(copies)
+    except (TypeError, ValueError):
+        raise ValueError("total_copies must be a non-negative integer")
+    if copies < 0:
+        raise ValueError("total_copies must be a non-negative integer")
+    return title, author, category, copies
+
+
+def parse_block(
+    fmt: str, header: list[str] | None, records: list[str], first_row: int
+) -> tuple[list[ParsedRow], list[str]]:
+    """
+    Parse and validate one block of records.
+
+    Returns the valid rows and a list of error messages that name the row
+    number of every rejected record.
+    """
+    rows: list[ParsedRow] = []
+    errors: list[str] = []
+    if fmt == "csv":
+        parsed = csv.DictReader(io.StringIO("".join(records)), fieldnames=header)
+    else:
+        parsed = (_load_json(record) for record in records)
+    for number, record in enumerate(parsed, start=first_row):
+        try:
+            if not isinstance(record, dict):
+                raise ValueError("row is not a JSON object")
+            rows.append(_clean_row(record))
+        except ValueError as exc:
+            errors.append(f"row {number}: {exc}")
+    return rows, errors
+
+
+def _load_json(record: str):
+    try:
+        return json.loads(record)
+    except json.JSONDecodeError:
+        return None
+
+
+class CatalogWriter:
+    """Write export rows as CSV or NDJSON to a text stream."""
+
+    def __init__(self, stream: IO[str], fmt: str) -> None:
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == "csv":
+            self._csv = csv.writer(stream)
+            self._csv.writerow(EXPORT_COLUMNS)
+
+    def write(self, row: tuple) -> None:
+        if self.fmt == "csv":
+            self._csv.writerow(row)
+        else:
+            self.stream.write(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n")
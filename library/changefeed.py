@@ -0,0 +1,166 @@
+"""
+Incremental catalog sync on top of the :class:`~library.models.BookChange` log.
+
+A client remembers the sequence number of the last change it applied and
+asks for everything after it.  Each page costs one indexed range scan of
+the log plus one ``IN`` query for the books it mentions, so a sync does
+work proportional to the number of changes, not to the catalog size.
+
+A new client starts with ``since=0``.  That is served by :func:`replay`
+from the book table itself, in primary-key pages, and ends with the
+sequence number the log had when the replay started; changes made while
+it runs are picked up from the log afterwards.
+
+The log is kept small by :func:`compact`: only the newest entry per book
+is needed to sync, and tombstones can be purged after a retention period.
+Purging raises ``CatalogRevision.change_floor``; a client whose ``since``
+is below it may have missed a delete and must replay from zero.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Iterator
+
+from django.db import transaction
+from django.db.models import Exists, Max, Min, OuterRef
+from django.utils import timezone
+
+from .models import Book, BookChange, CatalogRevision
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .sqlite import fits_integer
+
+
+class ResyncRequired(Exception):
+    """The client's position was compacted away; it must sync from zero."""
+
+    def __init__(self, floor: int) -> None:
+        super().__init__(f"Changes up to {floor} have been compacted")
+        self.floor = floor
+
+
+@dataclass
+class Change:
+    """The current state of one changed book; ``book`` is None if deleted."""
+
+    seq: int
+    book_id: int
+    book: Book | None
+
+    @property
+    def deleted(self) -> bool:
+        return self.book is None
+
+
+def changes_since(since: int, limit: int) -> tuple[list[Change], int, bool]:
+    """
+    Return up to ``limit`` log entries after ``since`` (which must be > 0).
+
+    Returns ``(changes, next_since, has_more)``.  A book that changed more
+    than once within the page is reported once, at its latest position,
+    with its current state.  Raises :class:`ResyncRequired` if entries
+    after ``since`` may have been purged.
+    """
+    floor = CatalogRevision.current().change_floor
+    if since < floor:
+        raise ResyncRequired(floor)
+    entries = list(
+        BookChange.objects.filter(id__gt=since)
+        .order_by("id")
+        .values_list("id", "book_id", "deleted")[: limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest: dict[int, tuple[int, bool]] = {}
+    for seq, book_id, deleted in entries:
+        latest.pop(book_id, None)
+        latest[book_id] = (seq, deleted)
+    books = Book.objects.select_related("category").in_bulk(
+        [book_id for book_id, (_, deleted) in latest.items() if not deleted]
+    )
+    changes = [
+        Change(seq, book_id, None if deleted else books.get(book_id))
+        for book_id, (seq, deleted) in latest.items()
+    ]
+    next_since = entries[-1][0] if entries else since
+    return changes, next_since, has_more
+
+
+def replay(cursor: str | None, limit: int) -> tuple[list[Change], int | None, str | None]:
+    """
+    Return one page of a full sync, in book id order.
+
+    Returns ``(changes, next_since, next_cursor)``: ``next_cursor`` continues
+    the replay, and on the last page it is None and ``next_since`` is the
+    log position to follow from.  Raises :class:`InvalidCursor`.
+    """
+    if cursor is None:
+        head = BookChange.objects.aggregate(head=Max("id"))["head"] or 0
+        # Purged tombstones are reflected in the book table too.
+        head = max(head, CatalogRevision.current().change_floor)
+        after = 0
+    else:
+        head, after = decode_cursor(cursor, 2)
+        if not all(
+            isinstance(value, int) and not isinstance(value, bool) and fits_integer(value)
+            for value in (head, after)
+        ):
+            raise InvalidCursor("Malformed cursor")
+    books = list(
+        Book.objects.select_related("category").filter(id__gt=after).order_by("id")[: limit + 1]
+    )
+    changes = [Change(head, book.pk, book) for book in books[:limit]]
+    if len(books) > limit:
+        return changes, None, encode_cursor([head, books[limit - 1].pk])
+    return changes, head, None
+
+
+def _ranges(batch_size: int) -> Iterator[tuple[int, int]]:
+    bounds = BookChange.objects.aggregate(low=Min("id"), high=Max("id"))
+    if bounds["low"] is None:
+        return
+    for start in range(bounds["low"], bounds["high"] + 1, batch_size):
+        yield start, start + batch_size
+
+
+def compact(
+    tombstone_retention: timedelta | None = None, batch_size: int = 10_000
+) -> tuple[int, int]:
+    """
+    Drop superseded log entries and, optionally, old tombstones.
+
+    Entries are processed in id ranges of ``batch_size`` so that no single
+    transaction holds locks for long.  Tombstones older than
+    ``tombstone_retention`` are purged and the change floor raised to the
+    highest purged sequence.  Returns ``(superseded, purged)`` row counts.
+    """
+    newer = BookChange.objects.filter(book_id=OuterRef("book_id"), id__gt=OuterRef("id"))
+    superseded = 0
+    for start, end in _ranges(batch_size):
+        with transaction.atomic():
+            superseded += (
+                BookChange.objects.filter(id__gte=start, id__lt=end)
+                .filter(Exists(newer))
+                .delete()[0]
+            )
+
+    purged = 0
+    if tombstone_retention is not None:
+        cutoff = timezone.now() - tombstone_retention
+        for start, end in _ranges(batch_size):
+            with transaction.atomic():
+                tombstones = BookChange.objects.filter(
+                    id__gte=start, id__lt=end, deleted=True, changed_at__lt=cutoff
+                )
+                highest = tombstones.aggregate(highest=Max("id"))["highest"]
+                if highest is None:
+                    continue
+                # Raise the floor before the rows disappear, in the same
+                # transaction, so no reader sees the gap without the floor.
+                CatalogRevision.objects.filter(
+                    pk=CatalogRevision.SINGLETON_ID, change_floor__lt=highest
+                ).update(change_floor=highest)
+                purged += tombstones.delete()[0]
+    return superseded, purged
@@ -0,0 +1,193 @@
+"""
+Borrow and return engine for the Library Management System.
+
+Both operations are built on conditional ``UPDATE`` statements instead of
+``SELECT ... FOR UPDATE`` followed by a read-modify-write in Python.  The
+database evaluates ``available_copies > 0`` and decrements the counter in
+the same statement, and the number of affected rows tells us whether the
+borrow succeeded.  Concurrent borrowers therefore can never oversell a
+book, and each operation costs a single write round trip.
+
+The same statements bump the book's version stamp, and the change is
+logged (bumping the catalog revision) in the same transaction, so cached
+API responses, ETags and the change feed follow availability at once.
+The category statistics (:mod:`library.stats`) are updated in that
+transaction too.
+
+:func:`checkout_books` borrows several books in one transaction: the
+rows are locked in primary-key order, so two overlapping checkouts always
+queue on the same first row instead of deadlocking, and all counters and
+loans are written with one ``UPDATE`` and one ``bulk_create``.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Iterable
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import stats
+from .models import Book, BookChange, Borrow
+from .sqlite import lock_for_update
+
+
+logger = logging.getLogger("library.inventory")
+
+
+class CirculationError(Exception):
+    """Base class for errors raised by the borrow/return engine."""
+
+
+class BookUnavailable(CirculationError):
+    """Raised when every copy of the requested book is already on loan."""
+
+
+def borrow_book(user: User, book_id: int) -> Borrow:
+    """
+    Lend one copy of the book ``book_id`` to ``user``.
+
+    Raises :class:`Book.DoesNotExist` if the book does not exist and
+    :class:`BookUnavailable` if no copies are left.
+    """
+    with transaction.atomic():
+        updated = Book.objects.filter(pk=book_id, available_copies__gt=0).update(
+            available_copies=F("available_copies") - 1, **Book.stamp()
+        )
+        if not updated:
+            if not Book.objects.filter(pk=book_id).exists():
+                raise Book.DoesNotExist(f"Book {book_id} does not exist")
+            raise BookUnavailable(f"No copies of book {book_id} are available")
+        BookChange.record([book_id])
+        stats.apply_to_book(book_id, stats.Delta(available_copies=-1, open_loans=1))
+        return Borrow.objects.create(
+            borrower=user,
+            book_id=book_id,
+            due_date=Borrow.default_due_date(),
+        )
+
+
+def return_book(user: User, borrow_id: int) -> bool:
+    """
+    Mark the loan ``borrow_id`` of ``user`` as returned.
+
+    Returns ``False`` when the loan had already been returned.  Raises
+    :class:`Borrow.DoesNotExist` if the loan does not belong to ``user``.
+    """
+    book_id = (
+        Borrow.objects.filter(pk=borrow_id, borrower=user)
+        .values_list("book_id", flat=True)
+        .get()
+    )
+    with transaction.atomic():
+        returned = Borrow.objects.filter(
+            pk=borrow_id, returned_at__isnull=True
+        ).update(returned_at=timezone.now())
+        if not returned:
+            return False
+        # Never exceed total_copies, even if the counter has drifted.
+        restocked = Book.objects.filter(
+            pk=book_id, available_copies__lt=F("total_copies")
+        ).update(available_copies=F("available_copies") + 1, **Book.stamp())
+        if not restocked:
+            # The counter was wrong; logging the book makes the next
+            # incremental reconcile_inventory run check it.
+            logger.warning(
+                "Book %s already had every copy available when loan %s was "
+                "returned; its available_copies has drifted",
+                book_id,
+                borrow_id,
+            )
+        BookChange.record([book_id])
+        stats.apply_to_book(
+            book_id, stats.Delta(available_copies=restocked, open_loans=-1)
+        )
+    return True
+
+
+# Outcomes of one book in :func:`checkout_books`.
+BORROWED = "borrowed"
+UNAVAILABLE = "unavailable"
+NOT_FOUND = "not_found"
+# Lendable, but left alone because another book of an all-or-nothing
+# checkout was not.
+SKIPPED = "skipped"
+
+
+@dataclass
+class CheckoutResult:
+    """What happened to one book of a checkout; ``borrow`` is set if it was lent."""
+
+    book_id: int
+    status: str
+    borrow: Borrow | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == BORROWED
+
+
+def checkout_books(
+    user: User, book_ids: Iterable[int], *, all_or_nothing: bool = False
+) -> list[CheckoutResult]:
+    """
+    Lend one copy of each book in ``book_ids`` to ``user`` in one transaction.
+
+    Returns one :class:`CheckoutResult` per distinct book id, in ascending
+    id order.  Books that do not exist or have no copies left are reported
+    and skipped; with ``all_or_nothing`` nothing is borrowed unless every
+    book can be, and the lendable books are reported as ``skipped``.
+    """
+    ids = sorted(set(book_ids))
+    books = Book.objects.filter(pk__in=ids).order_by("pk")
+    with transaction.atomic():
+        # Lock in primary-key order so overlapping checkouts cannot deadlock.
+        locked = lock_for_update(books, "revision")
+        stock = {
+            pk: (available, category_id)
+            for pk, available, category_id in locked.values_list(
+                "pk", "available_copies", "category_id"
+            )
+        }
+        results = [
+            CheckoutResult(
+                book_id,
+                NOT_FOUND if book_id not in stock
+                else BORROWED if stock[book_id][0] > 0
+                else UNAVAILABLE,
+            )
+            for book_id in ids
+        ]
+        lendable = [result.book_id for result in results if result.ok]
+        if all_or_nothing and len(lendable) < len(results):
+            for result in results:
+                if result.ok:
+                    result.status = SKIPPED
+            return results
+        if not lendable:
+            return results
+
+        updated = Book.objects.filter(pk__in=lendable, available_copies__gt=0).update(
+            available_copies=F("available_copies") - 1, **Book.stamp()
+        )
+        if updated != len(lendable):
+            # Only possible if the rows were not actually locked.
+            raise CirculationError("Availability changed during checkout; try again")
+        BookChange.record(lendable)
+        deltas: dict[int, stats.Delta] = defaultdict(stats.Delta)
+        for book_id in lendable:
+            deltas[stock[book_id][1]].add(stats.Delta(available_copies=-1, open_loans=1))
+        stats.apply(deltas)
+        due_date = Borrow.default_due_date()
+        borrows = Borrow.objects.bulk_create(
+            Borrow(borrower=user, book_id=book_id, due_date=due_date)
+            for book_id in lendable
+        )
+        for result, borrow in zip((r for r in results if r.ok), borrows):
+            result.borrow = borrow
+    return results
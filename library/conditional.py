@@ -0,0 +1,110 @@
+"""
+Conditional GETs and payload caching for the JSON API.
+
+Responses are identified by a version stamp: a book's ``revision`` for a
+single book and the :class:`~library.models.CatalogRevision` for lists.
+The stamp is read with a tiny query, turned into a strong ``ETag`` and a
+``Last-Modified`` date, and a matching ``If-None-Match`` (or
+``If-Modified-Since``) is answered with ``304 Not Modified`` before any
+book rows are loaded.  Otherwise the serialized payload is looked up in
+Django's cache under a key that contains the stamp, so a change to the
+data simply makes the old entries unreachable until they expire.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime
+from typing import Any, Awaitable, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse, HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .serializers import dumps
+
+
+def query_fingerprint(request: HttpRequest) -> str:
+    """A short digest of the query string, independent of parameter order."""
+    query = "&".join(sorted(request.GET.urlencode().split("&")))
+    return hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+
+
+def _not_modified(
+    request: HttpRequest, etag: str, last_modified: datetime
+) -> tuple[str, int, HttpResponseBase | None]:
+    """The quoted ETag, the timestamp and a 304/412 response if one applies."""
+    etag = quote_etag(etag)
+    timestamp = int(last_modified.timestamp())
+    return etag, timestamp, get_conditional_response(
+        request, etag=etag, last_modified=timestamp
+    )
+
+
+def _respond(data: Any, cache_key: str | None) -> tuple[HttpResponseBase, bytes | None]:
+    """Turn what ``build()`` returned into a response and the payload to cache."""
+    if isinstance(data, HttpResponseBase):
+        return data, None
+    payload = dumps(data)
+    return HttpResponse(payload, content_type="application/json"), payload if cache_key else None
+
+
+def _stamp(response: HttpResponseBase, etag: str, timestamp: int) -> HttpResponseBase:
+    response.headers.setdefault("ETag", etag)
+    response.headers.setdefault("Last-Modified", http_date(timestamp))
+    return response
+
+
+def conditional_json(
+    request: HttpRequest,
+    *,
+    etag: str,
+    last_modified: datetime,
+    cache_key: str | None,
+    build: Callable[[], Any],
+) -> HttpResponseBase:
+    """
+    Return a JSON response for ``build()``, honouring conditional headers.
+
+    ``build`` is only called when the client's copy is stale and the
+    payload is not cached.  Pass ``cache_key=None`` to skip the cache, and
+    a ``build`` that returns a response (e.g. a streaming one or an
+    error) to send that response as-is.
+    """
+    etag, timestamp, response = _not_modified(request, etag, last_modified)
+    if response is not None:
+        return _stamp(response, etag, timestamp)
+    payload = cache.get(cache_key) if cache_key else None
+    if payload is not None:
+        return _stamp(HttpResponse(payload, content_type="application/json"), etag, timestamp)
+    response, payload = _respond(build(), cache_key)
+    if response.status_code != 200:
+        return response
+    if payload is not None:
+        cache.set(cache_key, payload, settings.LIBRARY_API_CACHE_TIMEOUT)
+    return _stamp(response, etag, timestamp)
+
+
+async def aconditional_json(
+    request: HttpRequest,
+    *,
+    etag: str,
+    last_modified: datetime,
+    cache_key: str | None,
+    build: Callable[[], Awaitable[Any]],
+) -> HttpResponseBase:
+    """:func:`conditional_json` for async views; ``build`` is awaited."""
+    etag, timestamp, response = _not_modified(request, etag, last_modified)
+    if response is not None:
+        return _stamp(response, etag, timestamp)
+    payload = await cache.aget(cache_key) if cache_key else None
+    if payload is not None:
+        return _stamp(HttpResponse(payload, content_type="application/json"), etag, timestamp)
+    response, payload = _respond(await build(), cache_key)
+    if response.status_code != 200:
+        return response
+    if payload is not None:
+        await cache.aset(cache_key, payload, settings.LIBRARY_API_CACHE_TIMEOUT)
+    return _stamp(response, etag, timestamp)
@@ -0,0 +1,51 @@
+"""
+Image rendering for cover variants.
+
+This module only depends on Pillow, not on Django, so that
+``manage.py build_thumbnails`` can run :func:`render_variants` in worker
+processes that never set up Django.
+"""
+
+from __future__ import annotations
+
+import io
+
+from PIL import Image, ImageOps
+
+
+JPEG_QUALITY = 82
+
+# ``{kind: (bytes, width, height)}`` as produced by :func:`render_variants`.
+Rendered = dict[str, tuple[bytes, int, int]]
+
+
+def render_variants(source: str | bytes, sizes: dict[str, tuple[int, int]]) -> Rendered:
+    """
+    Render ``source`` (a path or the image bytes) into JPEGs of ``sizes``.
+
+    Images are rotated according to their EXIF orientation, flattened onto
+    white and centre-cropped to fill each size exactly.
+    """
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+        # Let the JPEG decoder downscale while decoding; far cheaper than
+        # resizing a full-resolution image.
+        largest = max(sizes.values(), key=lambda size: size[0] * size[1])
+        image.draft("RGB", largest)
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+
+        rendered: Rendered = {}
+        for kind, size in sizes.items():
+            variant = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            variant.save(
+                buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True
+            )
+            rendered[kind] = (buffer.getvalue(), *variant.size)
+    return rendered
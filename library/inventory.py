@@ -0,0 +1,193 @@
+"""
+Reconciliation of the ``available_copies`` counters.
+
+``Book.available_copies`` is denormalized: the borrow and return paths
+and catalog edits adjust it instead of counting loans.  Its true value is
+``total_copies`` minus the book's open loans.  :func:`reconcile` recomputes
+that with one grouped aggregate query per batch of books, reports every
+book whose counter differs and, with ``repair``, corrects them.
+
+A full run walks the catalog in primary-key order, ``batch_size`` books
+at a time.  An incremental run only checks books that were logged in the
+change log (:class:`~library.models.BookChange`) since the last run that
+left nothing unrepaired; every borrow, return and edit is logged there,
+so it is cheap enough to schedule often.  Without such a run it falls
+back to a full one.  Writes that bypass the change log (raw SQL, deleting
+users with open loans) are only found by full runs.
+
+Repairs are checked again under the books' row locks (on SQLite, the
+database write lock) and written with one ``UPDATE`` per batch, which
+also bumps the books' version stamps, logs the change and updates the
+category statistics (:mod:`library.stats`) in the same transaction.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, QuerySet, Value, When
+from django.utils import timezone
+
+from . import stats
+from .models import Book, BookChange, InventoryReconciliation
+from .sqlite import lock_for_update
+
+
+DEFAULT_BATCH_SIZE: int = 1000
+
+
+@dataclass(frozen=True)
+class Discrepancy:
+    """A book whose ``available_copies`` does not match its open loans."""
+
+    book_id: int
+    category_id: int
+    total_copies: int
+    open_loans: int
+    stored: int
+
+    @property
+    def expected(self) -> int:
+        return max(self.total_copies - self.open_loans, 0)
+
+    @property
+    def overbooked(self) -> bool:
+        """More copies are on loan than the book has."""
+        return self.open_loans > self.total_copies
+
+
+def _counts(books: QuerySet) -> QuerySet:
+    """Each book's counters and open loan count, in one grouped query."""
+    return books.values("id", "category_id", "total_copies", "available_copies").annotate(
+        open_loans=Count("borrows", filter=Q(borrows__returned_at__isnull=True))
+    )
+
+
+def _discrepancies(rows: Iterable[dict]) -> list[Discrepancy]:
+    found = (
+        Discrepancy(
+            row["id"],
+            row["category_id"],
+            row["total_copies"],
+            row["open_loans"],
+            row["available_copies"],
+        )
+        for row in rows
+    )
+    return [item for item in found if item.stored != item.expected]
+
+
+def _all_batches(batch_size: int) -> Iterator[list[dict]]:
+    """Every book's counts, ``batch_size`` books at a time."""
+    last = 0
+    while True:
+        rows = list(_counts(Book.objects.filter(pk__gt=last).order_by("pk"))[:batch_size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]["id"]
+
+
+def _changed_batches(since: int, through: int, batch_size: int) -> Iterator[list[dict]]:
+    """The counts of books logged after ``since`` up to ``through``."""
+    book_ids = sorted(
+        BookChange.objects.filter(id__gt=since, id__lte=through, deleted=False)
+        .order_by()
+        .values_list("book_id", flat=True)
+        .distinct()
+    )
+    for start in range(0, len(book_ids), batch_size):
+        chunk = book_ids[start : start + batch_size]
+        yield list(_counts(Book.objects.filter(pk__in=chunk).order_by("pk")))
+
+
+def last_checkpoint() -> int | None:
+    """
+    Where the next incremental run starts, or ``None`` if it must be full.
+
+    That is the ``through_change`` of the latest finished run that left no
+    discrepancy unrepaired.
+    """
+    return (
+        InventoryReconciliation.objects.filter(
+            finished_at__isnull=False, discrepancies=F("repaired")
+        )
+        .order_by("-through_change")
+        .values_list("through_change", flat=True)
+        .first()
+    )
+
+
+def correct(found: Iterable[Discrepancy]) -> list[Discrepancy]:
+    """
+    Correct the counters of ``found``; returns the corrections made.
+
+    The books are counted again under lock, so a borrow or return that
+    committed since they were found is taken into account.
+    """
+    ids = sorted(item.book_id for item in found)
+    if not ids:
+        return []
+    books = Book.objects.filter(pk__in=ids).order_by("pk")
+    with transaction.atomic():
+        # Lock separately: FOR UPDATE is not allowed with GROUP BY.
+        list(lock_for_update(books, "revision").values_list("pk", flat=True))
+        confirmed = _discrepancies(_counts(books))
+        if not confirmed:
+            return []
+        Book.objects.filter(pk__in=[item.book_id for item in confirmed]).update(
+            available_copies=Case(
+                *(When(pk=item.book_id, then=Value(item.expected)) for item in confirmed)
+            ),
+            **Book.stamp(),
+        )
+        BookChange.record(item.book_id for item in confirmed)
+        deltas: dict[int, stats.Delta] = defaultdict(stats.Delta)
+        for item in confirmed:
+            deltas[item.category_id].add(
+                stats.Delta(available_copies=item.expected - item.stored)
+            )
+        stats.apply(deltas)
+    return confirmed
+
+
+def reconcile(
+    *,
+    incremental: bool = False,
+    repair: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    report: Callable[[Discrepancy], None] | None = None,
+) -> InventoryReconciliation:
+    """
+    Check (and with ``repair``, correct) the ``available_copies`` counters.
+
+    ``report(discrepancy)`` is called for every discrepancy found; when
+    repairing, only for those still wrong under lock.  Returns the
+    finished :class:`~library.models.InventoryReconciliation`.
+    """
+    since = last_checkpoint() if incremental else None
+    # Changes logged while the run goes on are left for the next one.
+    through = BookChange.objects.order_by("-id").values_list("id", flat=True).first() or 0
+    run = InventoryReconciliation.objects.create(
+        incremental=since is not None, repair=repair, through_change=through
+    )
+    if since is None:
+        batches = _all_batches(batch_size)
+    else:
+        batches = _changed_batches(since, through, batch_size)
+    for rows in batches:
+        run.books_checked += len(rows)
+        found = _discrepancies(rows)
+        if repair:
+            found = correct(found)
+            run.repaired += len(found)
+        run.discrepancies += len(found)
+        if report is not None:
+            for item in found:
+                report(item)
+    run.finished_at = timezone.now()
+    run.save()
+    return run
@@ -0,0 +1 @@
+"""Management package for the Library application."""
@@ -0,0 +1 @@
+"""Custom ``manage.py`` commands provided by the Library application."""
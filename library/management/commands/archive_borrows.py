@@ -0,0 +1,93 @@
+"""
+Move old returned loans from the Borrow table to the archive.
+
+Loans returned more than ``--days`` days ago (default
+``LIBRARY_ARCHIVE_AFTER_DAYS``) are copied to ``ArchivedBorrow`` and
+deleted from ``Borrow`` in batches of ``--batch-size`` ids, each in its
+own transaction.  Safe to interrupt and re-run.  ``--compact`` reclaims
+the freed space afterwards (on SQLite this locks the database while it
+runs).
+
+Usage::
+
+    python manage.py archive_borrows
+    python manage.py archive_borrows --days 90 --batch-size 2000 --pause 0.05
+    python manage.py archive_borrows --dry-run
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from library import archive
+from library.models import Borrow
+
+
+class Command(BaseCommand):
+    help = "Archive returned loans older than the configured age in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Archive loans returned more than this many days ago.",
+        )
+        parser.add_argument("--batch-size", type=int, default=archive.DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Seconds to sleep between batches.",
+        )
+        parser.add_argument(
+            "--compact",
+            action="store_true",
+            help="Reclaim the freed space afterwards (VACUUM).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many loans would be archived.",
+        )
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        if days is None:
+            days = settings.LIBRARY_ARCHIVE_AFTER_DAYS
+        if days < 0 or options["batch_size"] < 1 or options["pause"] < 0:
+            raise CommandError(
+                "--days and --pause must not be negative and --batch-size must be positive"
+            )
+        cutoff = archive.archive_cutoff(days)
+
+        if options["dry_run"]:
+            count = Borrow.objects.filter(returned_at__lt=cutoff).count()
+            self.stdout.write(f"{count} loans returned before {cutoff:%Y-%m-%d} would be archived")
+            return
+
+        def progress(archived: int, highest_id: int) -> None:
+            if options["verbosity"] >= 2:
+                self.stderr.write(f"  {archived} archived, up to id {highest_id}")
+
+        started = time.perf_counter()
+        archived = archive.archive_returned(
+            cutoff,
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {archived} loans returned before {cutoff:%Y-%m-%d} "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+        )
+        if options["compact"]:
+            if archive.compact():
+                self.stdout.write("Compacted the database")
+            else:
+                self.stdout.write("Compaction is not supported on this database")
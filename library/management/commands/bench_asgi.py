@@ -0,0 +1,298 @@
+"""
+Compare the book endpoints under WSGI and ASGI at high concurrency.
+
+The application is driven in-process, without a network server, through
+three stacks:
+
+* ``wsgi``: Django's WSGI handler on a pool of ``--wsgi-threads``
+  threads (default: one per connection), the way a threaded WSGI server
+  runs it;
+* ``asgi_sync_views``: the ASGI handler with the synchronous views,
+  which Django runs in a thread pool;
+* ``asgi_async_views``: the ASGI handler with :mod:`library.async_views`.
+
+``--concurrency`` clients share ``--requests`` requests.  Every client
+takes ``--client-delay`` seconds to read each response, like a client on
+a slow network, and keeps its connection busy while it does: a thread
+under WSGI, a task under ASGI.  For each stack the command reports
+throughput and latency, the most threads alive at once and the Python
+memory allocated per connection, measured with ``tracemalloc`` in a
+separate pass of ``--concurrency`` requests issued at the same time
+(thread stacks are not included in that figure; see ``threads_peak``).
+
+The stacks run with the production settings: ``DEBUG`` off and, as
+``LIBRARY_PROFILING`` follows ``DEBUG``, without
+``QueryProfilingMiddleware``.  Its per-statement bookkeeping and slow
+request logging would otherwise be measured along with the handlers.
+
+Seed data first (``manage.py seed_library``), then e.g.::
+
+    python manage.py bench_asgi --endpoint api_book_detail --concurrency 200
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import io
+import json
+import random
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from library.benchmarks import git_revision, latency_summary
+from library.models import Book
+
+
+STACKS: tuple[str, ...] = ("wsgi", "asgi_sync_views", "asgi_async_views")
+# Sync and async URL names of each endpoint, and its query string.
+ENDPOINTS: dict[str, tuple[str, str, str]] = {
+    "api_book_detail": ("library:api_book_detail", "library:async_api_book_detail", ""),
+    "api_books": ("library:api_books", "library:async_api_books", "limit=50"),
+    "book_detail": ("library:book_detail", "library:async_book_detail", ""),
+}
+HOST = "testserver"
+PROFILING_MIDDLEWARE = "library.middleware.QueryProfilingMiddleware"
+
+
+class ThreadWatcher:
+    """Sample the number of live threads while a phase runs."""
+
+    def __init__(self) -> None:
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(0.005):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self) -> "ThreadWatcher":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class Command(BaseCommand):
+    help = "Benchmark the book endpoints under WSGI and ASGI and print JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", choices=ENDPOINTS, default="api_book_detail")
+        parser.add_argument("--stacks", nargs="+", choices=STACKS, default=list(STACKS))
+        parser.add_argument("--concurrency", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--client-delay",
+            type=float,
+            default=0.05,
+            help="Seconds each client takes to read a response.",
+        )
+        parser.add_argument(
+            "--wsgi-threads",
+            type=int,
+            default=None,
+            help="Size of the WSGI thread pool (default: --concurrency).",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"]
+        threads = options["wsgi_threads"] or concurrency
+        if min(concurrency, options["requests"], threads) < 1 or options["client_delay"] < 0:
+            raise CommandError(
+                "--concurrency, --requests and --wsgi-threads must be positive and "
+                "--client-delay must not be negative"
+            )
+        book_ids = list(Book.objects.values_list("id", flat=True))
+        if not book_ids:
+            raise CommandError("The catalog is empty; run seed_library first")
+        rng = random.Random(options["seed"])
+        sync_name, async_name, query = ENDPOINTS[options["endpoint"]]
+        takes_pk = options["endpoint"] != "api_books"
+
+        def paths(name: str, count: int) -> list[str]:
+            if not takes_pk:
+                return [reverse(name)] * count
+            return [reverse(name, args=[rng.choice(book_ids)]) for _ in range(count)]
+
+        # Let the handlers open fresh connections in their own threads.
+        connections.close_all()
+        results = {}
+        # What production runs: LIBRARY_PROFILING is off with DEBUG.
+        middleware = [name for name in settings.MIDDLEWARE if name != PROFILING_MIDDLEWARE]
+        with override_settings(ALLOWED_HOSTS=[HOST], DEBUG=False, MIDDLEWARE=middleware):
+            for stack in options["stacks"]:
+                self.stderr.write(f"  {stack}...")
+                name = async_name if stack == "asgi_async_views" else sync_name
+                if stack == "wsgi":
+                    run = functools.partial(self._run_wsgi, threads=threads)
+                else:
+                    run = self._run_asgi
+                delay = options["client_delay"]
+                timing = run(paths(name, options["requests"]), query, concurrency, delay)
+                memory = self._memory_pass(
+                    run, paths(name, concurrency), query, concurrency, delay
+                )
+                results[stack] = {**timing, **memory}
+
+        report = {
+            "benchmark": "bench_asgi",
+            "revision": git_revision(),
+            "endpoint": options["endpoint"],
+            "concurrency": concurrency,
+            "requests": options["requests"],
+            "client_delay_s": options["client_delay"],
+            "wsgi_threads": threads,
+            "stacks": results,
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(output + "\n")
+        self.stdout.write(output)
+
+    def _memory_pass(
+        self, run: Callable, paths: list[str], query: str, concurrency: int, delay: float
+    ) -> dict:
+        """Python memory allocated per connection with every client in flight."""
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            run(paths, query, concurrency, delay)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {"memory_per_connection_kb": round((peak - baseline) / concurrency / 1024, 1)}
+
+    def _run_wsgi(
+        self, paths: list[str], query: str, concurrency: int, delay: float, threads: int
+    ) -> dict:
+        handler = WSGIHandler()
+
+        def request(path: str) -> tuple[str, float]:
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": path,
+                "QUERY_STRING": query,
+                "HTTP_HOST": HOST,
+                "SERVER_NAME": HOST,
+                "wsgi.input": io.BytesIO(),
+            }
+            setup_testing_defaults(environ)
+            status = []
+            started = time.perf_counter()
+            body = handler(environ, lambda line, headers: status.append(line))
+            try:
+                b"".join(body)
+                # The slow client holds this thread while it reads.
+                time.sleep(delay)
+            finally:
+                body.close()
+            return status[0].split()[0], time.perf_counter() - started
+
+        def worker(path: str) -> tuple[str, float]:
+            try:
+                return request(path)
+            except Exception as exc:
+                return f"error: {type(exc).__name__}", 0.0
+
+        with ThreadWatcher() as watcher:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                outcomes = list(pool.map(worker, paths))
+            elapsed = time.perf_counter() - started
+        return self._summary(outcomes, elapsed, watcher.peak)
+
+    def _run_asgi(self, paths: list[str], query: str, concurrency: int, delay: float) -> dict:
+        application = ASGIHandler()
+
+        async def request(path: str) -> tuple[str, float]:
+            parts = urlsplit(path)
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": parts.path,
+                "raw_path": parts.path.encode(),
+                "query_string": query.encode(),
+                "headers": [(b"host", HOST.encode())],
+                "client": ("127.0.0.1", 50000),
+                "server": (HOST, 80),
+            }
+            sent_body = False
+            disconnected = asyncio.Event()
+            status = []
+
+            async def receive():
+                nonlocal sent_body
+                if not sent_body:
+                    sent_body = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(str(message["status"]))
+                elif not message.get("more_body"):
+                    # The slow client holds only this task while it reads.
+                    await asyncio.sleep(delay)
+
+            started = time.perf_counter()
+            try:
+                await application(scope, receive, send)
+            finally:
+                disconnected.set()
+            return status[0], time.perf_counter() - started
+
+        async def client(queue: asyncio.Queue, outcomes: list) -> None:
+            while not queue.empty():
+                path = queue.get_nowait()
+                try:
+                    outcomes.append(await request(path))
+                except Exception as exc:
+                    outcomes.append((f"error: {type(exc).__name__}", 0.0))
+
+        async def main() -> list:
+            queue: asyncio.Queue = asyncio.Queue()
+            for path in paths:
+                queue.put_nowait(path)
+            outcomes: list = []
+            await asyncio.gather(*(client(queue, outcomes) for _ in range(concurrency)))
+            return outcomes
+
+        with ThreadWatcher() as watcher:
+            started = time.perf_counter()
+            outcomes = asyncio.run(main())
+            elapsed = time.perf_counter() - started
+        return self._summary(outcomes, elapsed, watcher.peak)
+
+    def _summary(self, outcomes: list[tuple[str, float]], elapsed: float, threads: int) -> dict:
+        statuses = Counter(status for status, _ in outcomes)
+        latencies = [latency for status, latency in outcomes if not status.startswith("error")]
+        return {
+            **latency_summary(latencies, elapsed),
+            "status_codes": dict(sorted(statuses.items())),
+            "threads_peak": threads,
+        }
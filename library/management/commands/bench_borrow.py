@@ -0,0 +1,160 @@
+"""
+Contention benchmark for the borrow/return engine.
+
+Many threads try to borrow the same popular book at once.  The command
+reports throughput and latency percentiles and checks that the number of
+successful borrows matches the copies that disappeared from the shelf, i.e.
+that no copy was ever oversold.
+
+Usage::
+
+    python manage.py bench_borrow --threads 16 --copies 500 --attempts 100
+    python manage.py bench_borrow --strategy locking   # previous implementation
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections, transaction
+
+from library import circulation
+from library.benchmarks import git_revision, latency_summary
+from library.models import Book, Borrow, Category
+
+
+def _locking_borrow(user: User, book_id: int) -> Borrow:
+    """The pre-engine implementation: lock the row, check in Python, save."""
+    with transaction.atomic():
+        book = Book.objects.select_for_update().get(pk=book_id)
+        if book.available_copies <= 0:
+            raise circulation.BookUnavailable
+        borrow = Borrow.objects.create(
+            borrower=user, book=book, due_date=Borrow.default_due_date()
+        )
+        book.available_copies -= 1
+        book.save(update_fields=["available_copies"])
+        return borrow
+
+
+STRATEGIES = {
+    "conditional": circulation.borrow_book,
+    "locking": _locking_borrow,
+}
+
+
+class Command(BaseCommand):
+    help = "Hammer one book with concurrent borrows and verify nothing is oversold."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--copies", type=int, default=200)
+        parser.add_argument(
+            "--attempts",
+            type=int,
+            default=50,
+            help="Borrow attempts per thread.",
+        )
+        parser.add_argument(
+            "--strategy", choices=sorted(STRATEGIES), default="conditional"
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the benchmark book, users and borrows afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        threads = options["threads"]
+        copies = options["copies"]
+        attempts = options["attempts"]
+        borrow = STRATEGIES[options["strategy"]]
+        if threads < 1 or copies < 1 or attempts < 1:
+            raise CommandError("--threads, --copies and --attempts must be positive")
+
+        category, created_category = Category.objects.get_or_create(name="Benchmark")
+        book = Book.objects.create(
+            title="Benchmark: popular book",
+            author="bench_borrow",
+            category=category,
+            total_copies=copies,
+            available_copies=copies,
+        )
+        users = [
+            User.objects.get_or_create(username=f"bench_borrow_{index}")[0]
+            for index in range(threads)
+        ]
+
+        latencies: list[float] = []
+        outcomes = {"borrowed": 0, "unavailable": 0, "errors": 0}
+        lock = threading.Lock()
+        start_gate = threading.Barrier(threads)
+
+        def worker(user: User) -> None:
+            local_latencies = []
+            local = {"borrowed": 0, "unavailable": 0, "errors": 0}
+            try:
+                start_gate.wait()
+                for _ in range(attempts):
+                    started = time.perf_counter()
+                    try:
+                        borrow(user, book.pk)
+                        local["borrowed"] += 1
+                    except circulation.BookUnavailable:
+                        local["unavailable"] += 1
+                    except DatabaseError:
+                        local["errors"] += 1
+                    local_latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+            with lock:
+                latencies.extend(local_latencies)
+                for key, value in local.items():
+                    outcomes[key] += value
+
+        workers = [threading.Thread(target=worker, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        book.refresh_from_db()
+        open_loans = Borrow.objects.filter(book=book, returned_at__isnull=True).count()
+        consistent = (
+            open_loans == outcomes["borrowed"]
+            and book.available_copies == copies - open_loans
+            and open_loans <= copies
+        )
+
+        report = {
+            "benchmark": "bench_borrow",
+            "revision": git_revision(),
+            "database": connections["default"].vendor,
+            "strategy": options["strategy"],
+            "threads": threads,
+            "copies": copies,
+            "attempts": threads * attempts,
+            **outcomes,
+            **latency_summary(latencies, elapsed),
+            "available_copies_after": book.available_copies,
+            "open_loans_after": open_loans,
+            "oversold": open_loans > copies or book.available_copies < 0,
+            "consistent": consistent,
+        }
+
+        if not options["keep"]:
+            Borrow.objects.filter(book=book).delete()
+            book.delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            if created_category:
+                category.delete()
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if not consistent:
+            raise CommandError("Inventory is inconsistent after the benchmark")
@@ -0,0 +1,189 @@
+"""
+Reader/writer concurrency check for the SQLite production profile.
+
+Writer threads borrow copies of one book and keep their transaction open
+for ``--hold-ms`` before committing, like a locking borrow that does more
+work after taking the row.  (SQLite ignores ``SELECT ... FOR UPDATE``; the
+database-wide write lock is taken by the first write.)  Reader threads
+meanwhile read the book and its open loans with ``busy_timeout = 0``, so
+every time a reader would have waited for a writer's lock it fails with
+``database is locked`` and is counted instead.  The command reports reader
+and writer latencies, those lock errors and the journal mode in effect.
+
+With the rollback journal readers are locked out whenever a writer
+commits; with ``journal_mode=wal`` they read the last committed snapshot
+and never wait.  Compare::
+
+    python manage.py bench_readers --journal-mode delete
+    python manage.py bench_readers --journal-mode wal --check
+
+``--check`` fails the command if any reader was blocked.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.test.utils import override_settings
+
+from library import circulation, sqlite
+from library.benchmarks import git_revision, latency_summary
+from library.models import Book, Borrow, Category
+
+
+class Command(BaseCommand):
+    help = "Measure whether readers block behind locking borrow transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument(
+            "--duration", type=float, default=5.0, help="Seconds to run."
+        )
+        parser.add_argument(
+            "--hold-ms",
+            type=float,
+            default=50.0,
+            help="How long each writer keeps its transaction open.",
+        )
+        parser.add_argument(
+            "--journal-mode",
+            choices=("wal", "delete"),
+            help="Override the journal mode of LIBRARY_SQLITE_PRAGMAS for this run.",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail if any reader was blocked by a writer.",
+        )
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != "sqlite":
+            raise CommandError("bench_readers only applies to SQLite databases")
+        if options["readers"] < 1 or options["writers"] < 1 or options["duration"] <= 0:
+            raise CommandError("--readers, --writers and --duration must be positive")
+
+        overrides = {}
+        if options["journal_mode"]:
+            overrides = {
+                "LIBRARY_SQLITE_TUNING": True,
+                "LIBRARY_SQLITE_PRAGMAS": {
+                    **settings.LIBRARY_SQLITE_PRAGMAS,
+                    "journal_mode": options["journal_mode"],
+                },
+            }
+        with override_settings(**overrides):
+            # Reconnect so the (overridden) pragmas apply before threads start.
+            connections.close_all()
+            report = self.run(options)
+            connections.close_all()
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if options["check"] and report["readers_blocked"]:
+            raise CommandError("Readers were blocked by writers")
+
+    def run(self, options) -> dict:
+        readers = options["readers"]
+        writers = options["writers"]
+        hold = options["hold_ms"] / 1000
+        connection = connections[DEFAULT_DB_ALIAS]
+
+        category, created_category = Category.objects.get_or_create(name="Benchmark")
+        copies = 1_000_000
+        book = Book.objects.create(
+            title="Benchmark: contended book",
+            author="bench_readers",
+            category=category,
+            total_copies=copies,
+            available_copies=copies,
+        )
+        users = [
+            User.objects.get_or_create(username=f"bench_readers_{index}")[0]
+            for index in range(writers)
+        ]
+
+        results = {"reader": [], "writer": []}
+        errors = {"reader": 0, "writer": 0}
+        lock = threading.Lock()
+        start_gate = threading.Barrier(readers + writers)
+        deadline = [0.0]
+
+        def write(user: User) -> None:
+            with transaction.atomic():
+                circulation.borrow_book(user, book.pk)
+                time.sleep(hold)
+
+        def read() -> None:
+            Book.objects.filter(pk=book.pk).values_list("available_copies").get()
+            Borrow.objects.filter(book_id=book.pk, returned_at__isnull=True).count()
+
+        def worker(role: str, operation) -> None:
+            latencies = []
+            failures = 0
+            try:
+                if role == "reader":
+                    # Fail instead of waiting, so every wait on a writer's
+                    # lock shows up as a lock error.
+                    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+                        cursor.execute("PRAGMA busy_timeout = 0")
+                start_gate.wait()
+                while time.perf_counter() < deadline[0]:
+                    started = time.perf_counter()
+                    try:
+                        operation()
+                    except OperationalError:
+                        failures += 1
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+            with lock:
+                results[role].extend(latencies)
+                errors[role] += failures
+
+        threads = [
+            threading.Thread(target=worker, args=("writer", lambda u=user: write(u)))
+            for user in users
+        ] + [
+            threading.Thread(target=worker, args=("reader", read))
+            for _ in range(readers)
+        ]
+        deadline[0] = time.perf_counter() + options["duration"]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        report = {
+            "benchmark": "bench_readers",
+            "revision": git_revision(),
+            "journal_mode": sqlite.pragma(connection, "journal_mode"),
+            "synchronous": sqlite.pragma(connection, "synchronous"),
+            "busy_timeout_ms": sqlite.pragma(connection, "busy_timeout"),
+            "readers": readers,
+            "writers": writers,
+            "hold_ms": options["hold_ms"],
+            "reader": {
+                **latency_summary(results["reader"], elapsed),
+                "lock_errors": errors["reader"],
+            },
+            "writer": {
+                **latency_summary(results["writer"], elapsed),
+                "lock_errors": errors["writer"],
+            },
+            "readers_blocked": errors["reader"] > 0,
+        }
+
+        Borrow.objects.filter(book=book).delete()
+        book.delete()
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+        if created_category:
+            category.delete()
+        return report
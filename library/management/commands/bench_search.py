@@ -0,0 +1,134 @@
+"""
+Compare full-text search against ``icontains`` scans at catalog scale.
+
+Synthetic books are generated inside a transaction that is rolled back at
+the end, so the benchmark never leaves rows behind.  For every catalog size
+the same queries are timed through :func:`library.search.search_books` and
+through the ``icontains`` filter the admin used before.
+
+Usage::
+
+    python manage.py bench_search --sizes 100000 1000000
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from library import search
+from library.benchmarks import git_revision, rollback_after
+from library.models import Book, Category
+
+
+SYLLABLES = (
+    "an", "bel", "cor", "dun", "el", "far", "gor", "hal", "is", "jor",
+    "kel", "lin", "mor", "nor", "os", "per", "quin", "ros", "sal", "tor",
+    "ul", "ven", "wil", "xan", "yor", "zen",
+)
+
+
+def _vocabulary(rng: random.Random, size: int) -> list[str]:
+    """Generate ``size`` distinct pseudo-words."""
+    words: set[str] = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = "Benchmark FTS5 search against icontains scans over the catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[100_000, 1_000_000]
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not search.is_supported(connection):
+            raise CommandError("The full-text index requires SQLite")
+        sizes = sorted(options["sizes"])
+        rng = random.Random(options["seed"])
+        vocabulary = _vocabulary(rng, 5000)
+        # A Zipf-like distribution gives realistic common and rare words.
+        weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+        queries = {
+            "common word": vocabulary[0],
+            "rare word": vocabulary[-1],
+            "prefix": vocabulary[1][:3],
+            "two words": f"{vocabulary[2]} {vocabulary[40]}",
+        }
+
+        results = []
+        with rollback_after():
+            category = Category.objects.create(name="bench_search")
+            created = 0
+            for size in sizes:
+                self.stderr.write(f"Generating {size - created} books...")
+                while created < size:
+                    count = min(options["batch_size"], size - created)
+                    Book.objects.bulk_create(
+                        Book(
+                            title=" ".join(rng.choices(vocabulary, weights, k=4)).title(),
+                            author=" ".join(rng.choices(vocabulary, weights, k=2)).title(),
+                            category=category,
+                        )
+                        for _ in range(count)
+                    )
+                    created += count
+                results.append(self._measure(size, queries, options["repeat"]))
+
+        self.stdout.write(
+            json.dumps(
+                {
+                    "benchmark": "bench_search",
+                    "revision": git_revision(),
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
+
+    def _measure(self, size: int, queries: dict[str, str], repeat: int) -> dict:
+        books = Book.objects.filter(category__name="bench_search")
+        timings = {}
+        for label, query in queries.items():
+            strategies = {
+                "fts5": lambda: list(
+                    search.search_books(books, query)
+                    .order_by("search_rank", "id")
+                    .values_list("id", flat=True)[:50]
+                ),
+                "icontains": lambda: list(
+                    self._icontains(books, query).values_list("id", flat=True)[:50]
+                ),
+                "fts5_count": lambda: search.search_books(books, query).count(),
+                "icontains_count": lambda: self._icontains(books, query).count(),
+            }
+            timings[label] = {"query": query}
+            for name, run in strategies.items():
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    result = run()
+                    samples.append(time.perf_counter() - started)
+                timings[label][name] = {
+                    "median_ms": round(1000 * statistics.median(samples), 3),
+                    "rows": result if isinstance(result, int) else len(result),
+                }
+        return {"books": size, "queries": timings}
+
+    @staticmethod
+    def _icontains(books, query: str):
+        for token in query.split():
+            books = books.filter(Q(title__icontains=token) | Q(author__icontains=token))
+        return books
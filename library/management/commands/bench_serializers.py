@@ -0,0 +1,132 @@
+"""
+Compare the API book serializers at catalog scale.
+
+Synthetic books are generated inside a transaction that is rolled back at
+the end.  For every catalog size the whole list is serialized and encoded
+the way ``GET /api/books/`` does it, and rows per second are reported for:
+
+* ``instances``: the previous path, ``Book`` and ``Category`` instances
+  copied into dicts and encoded with ``DjangoJSONEncoder``;
+* ``values``: :mod:`library.serializers` with :func:`~library.serializers.dumps`
+  (``orjson`` when installed, see ``encoder`` in the output);
+* ``values_stdlib``: the same rows encoded with the standard library;
+* ``values_sparse``: ``fields=id,title,available_copies``.
+
+Usage::
+
+    python manage.py bench_serializers --sizes 10000 100000
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from library import serializers
+from library.benchmarks import git_revision, rollback_after
+from library.models import Book, Category
+
+
+SPARSE_FIELDS = "id,title,available_copies"
+
+
+def _instance_to_dict(book: Book) -> dict:
+    """The serializer the API used before :mod:`library.serializers`."""
+    covers = book.covers
+    return {
+        "id": book.id,
+        "title": book.title,
+        "author": book.author,
+        "category": book.category.name,
+        "total_copies": book.total_copies,
+        "available_copies": book.available_copies,
+        "covers": {kind: cover._asdict() for kind, cover in covers.items()} or None,
+    }
+
+
+class Command(BaseCommand):
+    help = "Benchmark instance-based against values()-based API serialization."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if min(options["sizes"]) < 1 or options["repeat"] < 1:
+            raise CommandError("--sizes and --repeat must be positive")
+        sizes = sorted(options["sizes"])
+        rng = random.Random(options["seed"])
+
+        results = []
+        with rollback_after():
+            category = Category.objects.create(name="bench_serializers")
+            created = 0
+            for size in sizes:
+                self.stderr.write(f"Generating {size - created} books...")
+                while created < size:
+                    count = min(options["batch_size"], size - created)
+                    Book.objects.bulk_create(
+                        Book(
+                            title=f"Benchmark book {created + index}",
+                            author=f"Author {rng.randrange(10_000)}",
+                            category=category,
+                            total_copies=(copies := rng.randint(1, 10)),
+                            available_copies=rng.randint(0, copies),
+                        )
+                        for index in range(count)
+                    )
+                    created += count
+                results.append(self._measure(category, size, options["repeat"]))
+
+        self.stdout.write(
+            json.dumps(
+                {
+                    "benchmark": "bench_serializers",
+                    "revision": git_revision(),
+                    "encoder": "orjson" if serializers.orjson else "json",
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
+
+    def _measure(self, category: Category, size: int, repeat: int) -> dict:
+        books = Book.objects.filter(category=category).order_by("title", "id")
+        full = serializers.BOOK_LIST_FIELDS
+        sparse = serializers.select_fields(full, SPARSE_FIELDS)
+        encoder = DjangoJSONEncoder()
+
+        def values(fields):
+            rows = serializers.book_values(books, fields)
+            return list(serializers.serialize_rows(rows, fields))
+
+        strategies = {
+            "instances": lambda: encoder.encode(
+                [_instance_to_dict(book) for book in books.select_related("category")]
+            ).encode(),
+            "values": lambda: serializers.dumps(values(full)),
+            "values_stdlib": lambda: encoder.encode(values(full)).encode(),
+            "values_sparse": lambda: serializers.dumps(values(sparse)),
+        }
+        timings = {}
+        for name, run in strategies.items():
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                payload = run()
+                best = min(best, time.perf_counter() - started)
+            timings[name] = {
+                "best_s": round(best, 4),
+                "rows_per_s": round(size / best),
+                "payload_bytes": len(payload),
+            }
+        baseline = timings["instances"]["best_s"]
+        for timing in timings.values():
+            timing["speedup"] = round(baseline / timing["best_s"], 2)
+        return {"books": size, "serializers": timings}
@@ -0,0 +1,252 @@
+"""
+Drive the library views at a given concurrency and report the results.
+
+Each endpoint is exercised in its own phase by ``--concurrency`` threads
+that share ``--requests`` requests.  Each thread has its own test client
+and database connection.  For every endpoint the command reports
+throughput, latency percentiles, status codes and the mean number of SQL
+queries per request as JSON, tagged with the current git revision so runs
+can be compared between commits.
+
+Seed data first (``manage.py seed_library``), then e.g.::
+
+    python manage.py bench_views --concurrency 16 --requests 2000 --output run.json
+"""
+
+from __future__ import annotations
+
+import json
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from library import circulation
+from library.benchmarks import git_revision, latency_summary
+from library.models import Book, Borrow
+
+
+ENDPOINTS: tuple[str, ...] = (
+    "book_list",
+    "book_detail",
+    "api_books",
+    "api_book_detail",
+    "borrow_book",
+    "return_book",
+    "my_history",
+)
+
+
+class QueryCounter:
+    """``execute_wrapper`` that counts statements on one connection."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.paused = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if not self.paused:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+_local = threading.local()
+
+
+@contextmanager
+def uncounted() -> Iterator[None]:
+    """Exclude the benchmark's own bookkeeping queries from the counts."""
+    counter = getattr(_local, "counter", None)
+    if counter is not None:
+        counter.paused = True
+    try:
+        yield
+    finally:
+        if counter is not None:
+            counter.paused = False
+
+
+class Command(BaseCommand):
+    help = "Benchmark the library views and print throughput and latency as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--requests", type=int, default=500, help="Requests per endpoint."
+        )
+        parser.add_argument(
+            "--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS)
+        )
+        parser.add_argument(
+            "--api-limit",
+            type=int,
+            default=50,
+            help="Page size used for api_books (0 requests the full list).",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"]
+        if concurrency < 1 or options["requests"] < 1:
+            raise CommandError("--concurrency and --requests must be positive")
+        book_ids = list(Book.objects.values_list("id", flat=True))
+        if not book_ids:
+            raise CommandError("The catalog is empty; run seed_library first")
+        category_ids = list(
+            Book.objects.values_list("category_id", flat=True).distinct()
+        )
+        self.rng = random.Random(options["seed"])
+        users = [
+            User.objects.get_or_create(username=f"bench_views_{index}")[0]
+            for index in range(concurrency)
+        ]
+        api_query = {"limit": options["api_limit"]} if options["api_limit"] else {}
+        # Loans taken by the borrow phase, per user, for the return phase.
+        loans: dict[int, queue.SimpleQueue[int]] = {
+            user.pk: queue.SimpleQueue() for user in users
+        }
+
+        def pick_book() -> int:
+            # Favour the front of the catalog, like real traffic.
+            return book_ids[min(int(self.rng.paretovariate(1.2)) - 1, len(book_ids) - 1)]
+
+        def borrow(client: Client, user: User):
+            # Uniform picks: skewed picks mostly hit books with no copies left.
+            book_id = self.rng.choice(book_ids)
+            response = client.post(reverse("library:borrow_book", args=[book_id]))
+            if response.status_code == 302:
+                with uncounted():
+                    loan = (
+                        Borrow.objects.filter(
+                            borrower=user, book_id=book_id, returned_at=None
+                        )
+                        .values_list("id", flat=True)
+                        .first()
+                    )
+                if loan:
+                    loans[user.pk].put(loan)
+            return response
+
+        def return_loan(client: Client, user: User):
+            try:
+                loan = loans[user.pk].get_nowait()
+            except queue.Empty:
+                loan = 0
+            return client.post(reverse("library:return_book", args=[loan]))
+
+        requests: dict[str, Callable] = {
+            "book_list": lambda client, user: client.get(
+                reverse("library:book_list"),
+                {"category": self.rng.choice(category_ids)}
+                if self.rng.random() < 0.5
+                else {},
+            ),
+            "book_detail": lambda client, user: client.get(
+                reverse("library:book_detail", args=[pick_book()])
+            ),
+            "api_books": lambda client, user: client.get(
+                reverse("library:api_books"), api_query
+            ),
+            "api_book_detail": lambda client, user: client.get(
+                reverse("library:api_book_detail", args=[pick_book()])
+            ),
+            "borrow_book": borrow,
+            "return_book": return_loan,
+            "my_history": lambda client, user: client.get(
+                reverse("library:my_history")
+            ),
+        }
+
+        results = {}
+        try:
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                for endpoint in options["endpoints"]:
+                    self.stderr.write(f"  {endpoint}...")
+                    results[endpoint] = self._run_phase(
+                        requests[endpoint], users, options["requests"]
+                    )
+        finally:
+            # Return any loans the benchmark still holds.
+            for user in users:
+                while not loans[user.pk].empty():
+                    circulation.return_book(user, loans[user.pk].get_nowait())
+
+        report = {
+            "benchmark": "bench_views",
+            "revision": git_revision(),
+            "concurrency": concurrency,
+            "requests_per_endpoint": options["requests"],
+            "books": len(book_ids),
+            "endpoints": results,
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(output + "\n")
+        self.stdout.write(output)
+
+    def _run_phase(self, make_request: Callable, users: list[User], total: int) -> dict:
+        tasks: queue.SimpleQueue[int] = queue.SimpleQueue()
+        for index in range(total):
+            tasks.put(index)
+        latencies: list[float] = []
+        queries: list[int] = []
+        statuses: Counter[str] = Counter()
+        lock = threading.Lock()
+
+        def worker(user: User) -> None:
+            client = Client()
+            client.force_login(user)
+            counter = QueryCounter()
+            _local.counter = counter
+            local_latencies, local_queries, local_statuses = [], [], Counter()
+            try:
+                with connections["default"].execute_wrapper(counter):
+                    while True:
+                        try:
+                            tasks.get_nowait()
+                        except queue.Empty:
+                            break
+                        before = counter.count
+                        started = time.perf_counter()
+                        try:
+                            response = make_request(client, user)
+                            if getattr(response, "streaming", False):
+                                b"".join(response.streaming_content)
+                            status = str(response.status_code)
+                        except Exception as exc:
+                            status = f"error: {type(exc).__name__}"
+                        local_latencies.append(time.perf_counter() - started)
+                        local_queries.append(counter.count - before)
+                        local_statuses[status] += 1
+            finally:
+                connections.close_all()
+            with lock:
+                latencies.extend(local_latencies)
+                queries.extend(local_queries)
+                statuses.update(local_statuses)
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            **latency_summary(latencies, elapsed),
+            "queries_per_request": round(sum(queries) / len(queries), 2) if queries else 0,
+            "status_codes": dict(sorted(statuses.items())),
+        }
@@ -0,0 +1,127 @@
+"""
+Build the cover variants of existing books.
+
+Books are read in primary-key order and their covers rendered in a
+process pool; the main process stores the finished variants and records
+them on the books.  Books whose variants are already current are skipped
+unless ``--force`` is given, so the command can be re-run after an
+interruption or after ``LIBRARY_COVER_VARIANTS`` changes.
+
+Usage::
+
+    python manage.py build_thumbnails --workers 4
+    python manage.py build_thumbnails --force
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from library.imaging import render_variants
+from library.models import Book
+from library.thumbnails import needs_variants, store_variants
+
+
+class Command(BaseCommand):
+    help = "Render missing cover image variants, in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=max(1, (os.cpu_count() or 2) - 1),
+            help="Rendering processes (0 renders in the main process).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--force", action="store_true", help="Rebuild variants that are current."
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 0 or options["chunk_size"] < 1:
+            raise CommandError("--workers must not be negative and --chunk-size positive")
+        self.built = self.failed = 0
+        self.started = time.perf_counter()
+
+        books = (
+            Book.objects.exclude(cover_image="")
+            .exclude(cover_image__isnull=True)
+            .order_by("id")
+            .only("id", "cover_image", "cover_variants")
+            .iterator(chunk_size=options["chunk_size"])
+        )
+        pending = (
+            book for book in books if options["force"] or needs_variants(book)
+        )
+        for book, rendered in self._render(pending, options["workers"]):
+            if isinstance(rendered, Exception):
+                self.failed += 1
+                self.stderr.write(
+                    self.style.WARNING(f"  book {book.pk} ({book.cover_image.name}): {rendered}")
+                )
+                continue
+            store_variants(book.pk, book.cover_image.name, rendered)
+            self.built += 1
+            if self.built % 100 == 0:
+                self._progress()
+
+        self._progress()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Built variants for {self.built} books ({self.failed} failed) "
+                f"in {time.perf_counter() - self.started:.1f}s"
+            )
+        )
+
+    def _progress(self) -> None:
+        elapsed = time.perf_counter() - self.started
+        rate = self.built / elapsed if elapsed else 0
+        self.stderr.write(f"  {self.built} built, {self.failed} failed ({rate:,.1f} books/s)")
+
+    def _render(self, books, workers):
+        """Yield ``(book, rendered or exception)`` in input order."""
+        sizes = settings.LIBRARY_COVER_VARIANTS
+        if workers == 0:
+            for book in books:
+                try:
+                    yield book, render_variants(_source(book), sizes)
+                except Exception as exc:
+                    yield book, exc
+            return
+
+        in_flight: deque[tuple[Book, Future]] = deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for book in books:
+                try:
+                    in_flight.append((book, pool.submit(render_variants, _source(book), sizes)))
+                except OSError as exc:
+                    yield book, exc
+                    continue
+                # Bound the read-ahead so memory does not grow with the catalog.
+                if len(in_flight) >= 2 * workers:
+                    yield _result(*in_flight.popleft())
+            while in_flight:
+                yield _result(*in_flight.popleft())
+
+
+def _source(book: Book) -> str | bytes:
+    """A local path to the cover if the storage has one, else its bytes."""
+    try:
+        return default_storage.path(book.cover_image.name)
+    except NotImplementedError:
+        with default_storage.open(book.cover_image.name, "rb") as handle:
+            return handle.read()
+
+
+def _result(book: Book, future: Future):
+    try:
+        return book, future.result()
+    except Exception as exc:
+        return book, exc
@@ -0,0 +1,51 @@
+"""
+Compact the book change log behind the change feed.
+
+Superseded entries (a later entry exists for the same book) are always
+dropped.  With ``--tombstone-days``, deletion tombstones older than that
+are purged too; feed clients that have not synced since then are told to
+resync from zero.
+
+Usage::
+
+    python manage.py compact_changes
+    python manage.py compact_changes --tombstone-days 30
+"""
+
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.changefeed import compact
+
+
+class Command(BaseCommand):
+    help = "Drop superseded change log entries and purge old tombstones."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tombstone-days",
+            type=int,
+            default=None,
+            help="Purge deletion tombstones older than this many days.",
+        )
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        days = options["tombstone_days"]
+        if options["batch_size"] < 1 or (days is not None and days < 0):
+            raise CommandError("--batch-size must be positive and --tombstone-days not negative")
+        started = time.perf_counter()
+        superseded, purged = compact(
+            tombstone_retention=timedelta(days=days) if days is not None else None,
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Dropped {superseded} superseded entries and {purged} tombstones "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,190 @@
+"""
+Stream a CSV or NDJSON catalog file into the database.
+
+The file is read in blocks of ``--batch-size`` records.  Blocks are parsed
+and validated in a process pool while the main process writes finished
+blocks in order: categories are upserted by name and books are inserted
+with ``bulk_create``.  After each block a :class:`CatalogImport` checkpoint
+is saved in the same transaction, so ``--resume`` continues exactly where
+an interrupted run stopped.  Only a few blocks are in flight at a time, so
+memory stays flat for files of any size.
+
+Usage::
+
+    python manage.py import_catalog books.csv --workers 4
+    python manage.py import_catalog books.ndjson --resume
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from library import stats
+from library.catalog_io import (
+    FORMATS,
+    IMPORT_COLUMNS,
+    detect_format,
+    iter_blocks,
+    parse_block,
+    read_header,
+)
+from library.models import Book, BookChange, CatalogImport, Category
+
+
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = "Import books from a CSV or NDJSON file, resumably and in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=max(1, (os.cpu_count() or 2) - 1),
+            help="Parser processes (0 parses in the main process).",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue from the checkpoint of a previous run of this file.",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"]).resolve()
+        if not path.is_file():
+            raise CommandError(f"No such file: {path}")
+        fmt = options["format"] or detect_format(path)
+        if fmt is None:
+            raise CommandError("Cannot tell the file format; pass --format")
+        batch_size = options["batch_size"]
+        if batch_size < 1 or options["workers"] < 0:
+            raise CommandError("--batch-size must be positive and --workers not negative")
+
+        checkpoint, created = CatalogImport.objects.get_or_create(source=str(path))
+        if not created and not options["resume"]:
+            if checkpoint.finished_at is None:
+                raise CommandError(
+                    f"An unfinished import of {path} exists; pass --resume to continue it"
+                )
+            checkpoint.delete()
+            checkpoint = CatalogImport.objects.create(source=str(path))
+        if checkpoint.finished_at is not None:
+            self.stdout.write(f"{path} was already imported completely.")
+            return
+
+        self.categories: dict[str, int] = {}
+        self.errors_reported = 0
+        started = time.perf_counter()
+        imported_at_start = checkpoint.rows_imported
+
+        with path.open("rb") as handle:
+            header = None
+            if fmt == "csv":
+                header = [column.strip() for column in read_header(handle)]
+                missing = set(IMPORT_COLUMNS) - set(header) - {"total_copies"}
+                if missing:
+                    raise CommandError(f"Missing CSV columns: {', '.join(sorted(missing))}")
+            if checkpoint.offset > handle.tell():
+                handle.seek(checkpoint.offset)
+            elif checkpoint.offset == 0:
+                checkpoint.offset = handle.tell()
+
+            row_number = checkpoint.rows_imported + checkpoint.rows_rejected + 1
+            blocks = iter_blocks(handle, fmt, batch_size)
+            parsed = self._parse(blocks, fmt, header, row_number, options["workers"])
+            for end, rows, errors in parsed:
+                self._write_block(checkpoint, end, rows, errors)
+                elapsed = time.perf_counter() - started
+                rate = (checkpoint.rows_imported - imported_at_start) / elapsed if elapsed else 0
+                self.stderr.write(
+                    f"  {checkpoint.rows_imported} rows imported, "
+                    f"{checkpoint.rows_rejected} rejected ({rate:,.0f} rows/s)"
+                )
+
+        checkpoint.finished_at = timezone.now()
+        checkpoint.save(update_fields=["finished_at", "updated_at"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {checkpoint.rows_imported} books "
+                f"({checkpoint.rows_rejected} rows rejected) "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+        )
+
+    def _parse(self, blocks, fmt, header, row_number, workers):
+        """Parse blocks, in a process pool if requested, in input order."""
+        if workers == 0:
+            for _, end, records in blocks:
+                rows, errors = parse_block(fmt, header, records, row_number)
+                row_number += len(records)
+                yield end, rows, errors
+            return
+
+        in_flight: deque[tuple[int, Future]] = deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _, end, records in blocks:
+                in_flight.append(
+                    (end, pool.submit(parse_block, fmt, header, records, row_number))
+                )
+                row_number += len(records)
+                # Bound the read-ahead so memory does not grow with file size.
+                if len(in_flight) >= 2 * workers:
+                    end, future = in_flight.popleft()
+                    yield (end, *future.result())
+            while in_flight:
+                end, future = in_flight.popleft()
+                yield (end, *future.result())
+
+    def _write_block(self, checkpoint, end, rows, errors) -> None:
+        for message in errors:
+            if self.errors_reported < MAX_REPORTED_ERRORS:
+                self.stderr.write(self.style.WARNING(f"  rejected {message}"))
+            self.errors_reported += 1
+
+        with transaction.atomic():
+            category_ids = self._category_ids({row[2] for row in rows})
+            created = Book.objects.bulk_create(
+                Book(
+                    title=title,
+                    author=author,
+                    category_id=category_ids[category],
+                    total_copies=copies,
+                    available_copies=copies,
+                )
+                for title, author, category, copies in rows
+            )
+            if created:
+                BookChange.record([book.pk for book in created])
+                stats.apply(
+                    stats.book_deltas(added=[stats.BookCounts.of(book) for book in created])
+                )
+            checkpoint.offset = end
+            checkpoint.rows_imported += len(rows)
+            checkpoint.rows_rejected += len(errors)
+            checkpoint.save(
+                update_fields=["offset", "rows_imported", "rows_rejected", "updated_at"]
+            )
+
+    def _category_ids(self, names: set[str]) -> dict[str, int]:
+        """Upsert categories by name and return their ids."""
+        missing = names - self.categories.keys()
+        if missing:
+            Category.objects.bulk_create(
+                [Category(name=name) for name in missing], ignore_conflicts=True
+            )
+            self.categories.update(
+                Category.objects.filter(name__in=missing).values_list("name", "id")
+            )
+        return self.categories
@@ -0,0 +1,52 @@
+"""
+Recompute the materialized category statistics from books and loans.
+
+The borrow, return and catalog write paths keep ``CategoryStats`` current
+incrementally (see :mod:`library.stats`).  Run this after writes that
+bypass them (raw SQL, bulk scripts, deleting users with open loans) or
+to check that nothing has drifted.  Categories whose stored counts were
+wrong are listed.
+
+Usage::
+
+    python manage.py rebuild_stats
+    python manage.py rebuild_stats --dry-run
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from library import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-category book, copy and loan counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report categories whose stored counts are wrong.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        wrong = stats.drift() if options["dry_run"] else stats.rebuild()
+
+        for category_id, (stored, actual) in sorted(wrong.items()):
+            changes = ", ".join(
+                f"{name} {getattr(stored, name)} -> {getattr(actual, name)}"
+                for name in stats.COUNTERS
+                if getattr(stored, name) != getattr(actual, name)
+            )
+            self.stdout.write(f"  category {category_id}: {changes}")
+        verb = "would be corrected" if options["dry_run"] else "corrected"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(wrong)} categories {verb} "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+        )
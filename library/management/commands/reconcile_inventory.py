@@ -0,0 +1,76 @@
+"""
+Check the books' ``available_copies`` against their open loans.
+
+Every book whose counter is not ``total_copies`` minus its open loans is
+listed; with ``--repair`` the counters are corrected (see
+:mod:`library.inventory`).  ``--incremental`` only checks books changed
+since the last run that left nothing unrepaired, so it can be scheduled
+often, e.g. every few minutes, with a full run nightly::
+
+    */10 * * * *  python manage.py reconcile_inventory --incremental --repair
+    30 3 * * *    python manage.py reconcile_inventory --repair
+
+Usage::
+
+    python manage.py reconcile_inventory
+    python manage.py reconcile_inventory --incremental --repair
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import inventory
+
+
+class Command(BaseCommand):
+    help = "Report (and optionally repair) drifted available_copies counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Correct the counters instead of only reporting them.",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only check books changed since the last complete run.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=inventory.DEFAULT_BATCH_SIZE,
+            help="Books counted per query (default: %(default)s).",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        started = time.perf_counter()
+
+        def report(item: inventory.Discrepancy) -> None:
+            note = ""
+            if item.overbooked:
+                note = f" ({item.open_loans} loans for {item.total_copies} copies)"
+            self.stdout.write(
+                f"  book {item.book_id}: available_copies {item.stored} -> {item.expected}{note}"
+            )
+
+        run = inventory.reconcile(
+            incremental=options["incremental"],
+            repair=options["repair"],
+            batch_size=options["batch_size"],
+            report=report,
+        )
+        kind = "incremental" if run.incremental else "full"
+        verb = "corrected" if options["repair"] else "found"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{kind} check of {run.books_checked} books: "
+                f"{run.discrepancies} discrepancies {verb} "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+        )
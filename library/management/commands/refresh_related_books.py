@@ -0,0 +1,71 @@
+"""
+Bring the "patrons also borrowed" index up to date.
+
+The first run computes the neighbours of every book; later runs only
+recompute the books affected by loans made since the previous run (see
+:mod:`library.recommendations`), so it can be scheduled often, with a
+full run now and then::
+
+    */30 * * * *  python manage.py refresh_related_books
+    15 4 * * 0    python manage.py refresh_related_books --full
+
+Usage::
+
+    python manage.py refresh_related_books
+    python manage.py refresh_related_books --full --batch-size 5000
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import recommendations
+
+
+class Command(BaseCommand):
+    help = "Recompute the related books of books borrowed since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Recompute every book instead of only the affected ones.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=recommendations.DEFAULT_BATCH_SIZE,
+            help="Ids read, and books written, per batch (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Neighbours kept per book (default: LIBRARY_RELATED_BOOKS).",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        if options["limit"] is not None and options["limit"] < 1:
+            raise CommandError("--limit must be positive")
+        started = time.perf_counter()
+
+        def progress(done: int, total: int) -> None:
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {done}/{total} books")
+
+        recomputed = recommendations.refresh(
+            full=options["full"],
+            batch_size=options["batch_size"],
+            limit=options["limit"],
+            progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recomputed the related books of {recomputed} books "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+        )
@@ -0,0 +1,77 @@
+"""
+Count new loans and store the most borrowed books of each window.
+
+Run it from cron; the rankings shown by ``?sort=popular`` stay as they
+are until the next run (see :mod:`library.popularity`)::
+
+    */15 * * * *  python manage.py rollup_popularity
+
+``--rebuild`` clears the daily counters and counts the whole loan history
+of the longest window again, archived loans included.
+
+Usage::
+
+    python manage.py rollup_popularity
+    python manage.py rollup_popularity --rebuild --batch-size 50000
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import popularity
+
+
+class Command(BaseCommand):
+    help = "Add new loans to the daily counters and rank the most borrowed books."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recount the counters from the loan history first.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=popularity.DEFAULT_BATCH_SIZE,
+            help="Loan ids counted per transaction (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Books kept per ranking (default: LIBRARY_POPULAR_BOOKS).",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        if options["limit"] is not None and options["limit"] < 1:
+            raise CommandError("--limit must be positive")
+        started = time.perf_counter()
+        counted = 0
+
+        def progress(total: int, highest_id: int) -> None:
+            nonlocal counted
+            counted = total
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {total} loans counted, up to id {highest_id}")
+
+        rankings = popularity.rollup(
+            rebuild=options["rebuild"],
+            batch_size=options["batch_size"],
+            limit=options["limit"],
+            progress=progress,
+        )
+        for window, ranking in rankings.items():
+            top = ", ".join(f"{book_id} ({borrows})" for book_id, borrows in ranking[:3])
+            self.stdout.write(f"  {window}: {len(ranking)} books; top {top or '-'}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Counted {counted} loans and ranked "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+        )
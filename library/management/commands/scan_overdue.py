@@ -0,0 +1,74 @@
+"""
+Find overdue loans in batches and record them.
+
+Usage::
+
+    python manage.py scan_overdue --fine-per-day 0.50 --max-fine 20
+    python manage.py scan_overdue --csv overdue.csv --no-save
+    python manage.py scan_overdue --csv - > overdue.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.overdue import DEFAULT_BATCH_SIZE, scan_overdue
+
+
+def _decimal(value: str) -> Decimal:
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise argparse.ArgumentTypeError(f"invalid amount: {value!r}")
+
+
+class Command(BaseCommand):
+    help = "Scan open loans for overdue ones and store a report and/or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--fine-per-day", type=_decimal, default=None)
+        parser.add_argument("--max-fine", type=_decimal, default=None)
+        parser.add_argument(
+            "--csv",
+            dest="csv_path",
+            help="Write the overdue loans as CSV to this path ('-' for stdout).",
+        )
+        parser.add_argument(
+            "--no-save",
+            action="store_false",
+            dest="save",
+            help="Do not store the results in the OverdueReport tables.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        csv_path = options["csv_path"]
+        if not options["save"] and not csv_path:
+            raise CommandError("--no-save requires --csv")
+
+        kwargs = {
+            "batch_size": options["batch_size"],
+            "fine_per_day": options["fine_per_day"],
+            "max_fine": options["max_fine"],
+            "save": options["save"],
+        }
+        if csv_path == "-":
+            report = scan_overdue(csv_file=sys.stdout, **kwargs)
+        elif csv_path:
+            with open(csv_path, "w", newline="", encoding="utf-8") as csv_file:
+                report = scan_overdue(csv_file=csv_file, **kwargs)
+        else:
+            report = scan_overdue(**kwargs)
+
+        # Keep stdout clean when it carries the CSV.
+        out = self.stderr if csv_path == "-" else self.stdout
+        out.write(
+            f"{report.loan_count} overdue loans, total fine {report.total_fine}"
+            + (f" (report #{report.pk})" if report.pk else "")
+        )
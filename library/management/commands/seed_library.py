@@ -0,0 +1,238 @@
+"""
+Fill the database with a synthetic, realistically skewed library.
+
+Book popularity and reader activity follow a Zipf-like distribution, so a
+few books account for most loans while most books are borrowed rarely.
+Loans are spread over ``--history-days`` days.  Loans from the last month
+are often still open, and open loans never exceed a book's copies.
+Everything is written with batched ``bulk_create``.
+
+Usage::
+
+    python manage.py seed_library --books 100000 --users 5000 --borrows 1000000
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from library import stats
+from library.models import Book, BookChange, Borrow, Category
+
+
+WORDS = (
+    "amber", "atlas", "autumn", "bridge", "candle", "cipher", "coral", "crown",
+    "dawn", "desert", "echo", "ember", "empire", "falcon", "forest", "garden",
+    "glass", "harbor", "horizon", "iron", "island", "ivory", "jade", "kingdom",
+    "lantern", "legacy", "maple", "meadow", "mirror", "moon", "night", "ocean",
+    "orchard", "paper", "pilgrim", "quiet", "raven", "river", "saga", "shadow",
+    "silver", "stone", "storm", "summer", "thunder", "tide", "tower", "valley",
+    "voyage", "willow", "winter", "wolf",
+)
+FIRST_NAMES = (
+    "Ada", "Alan", "Amara", "Boris", "Chen", "Dana", "Elif", "Farid", "Grace",
+    "Hana", "Igor", "Jun", "Kofi", "Lena", "Maya", "Nikolai", "Olga", "Priya",
+    "Ravi", "Sara", "Tomas", "Yuki", "Zara",
+)
+LAST_NAMES = (
+    "Abenova", "Brooks", "Castillo", "Demir", "Evans", "Fischer", "Garcia",
+    "Haddad", "Ivanova", "Johansson", "Kim", "Lopez", "Moreau", "Nakamura",
+    "Okafor", "Petrov", "Quinn", "Rossi", "Suleimenov", "Tanaka", "Weber",
+)
+
+
+def zipf_weights(count: int, exponent: float) -> list[float]:
+    """Weights proportional to ``1 / rank ** exponent``."""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class Command(BaseCommand):
+    help = "Generate categories, books, users and borrow history for benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--books", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--borrows", type=int, default=100_000)
+        parser.add_argument("--history-days", type=int, default=730)
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Zipf exponent for book popularity and reader activity.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--prefix",
+            default="seed",
+            help="Prefix for generated usernames and category names.",
+        )
+        parser.add_argument(
+            "--password",
+            default="library-seed",
+            help="Password given to every generated user.",
+        )
+
+    def handle(self, *args, **options):
+        for name in ("categories", "books", "users", "batch_size"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be positive")
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        prefix = options["prefix"]
+        started = time.perf_counter()
+
+        categories = self._create_categories(prefix, options["categories"])
+        book_ids, copies = self._create_books(categories, options["books"], options["skew"])
+        user_ids = self._create_users(prefix, options["users"], options["password"])
+        open_loans = self._create_borrows(
+            book_ids,
+            copies,
+            user_ids,
+            options["borrows"],
+            options["history_days"],
+            options["skew"],
+        )
+        self._update_availability(book_ids, copies, open_loans)
+        BookChange.record(book_ids, batch_size=self.batch_size)
+        # Bulk writes bypass the incremental statistics; count them once.
+        stats.rebuild()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {len(categories)} categories, {len(book_ids)} books, "
+                f"{len(user_ids)} users and {options['borrows']} borrows "
+                f"({sum(open_loans.values())} open) in "
+                f"{time.perf_counter() - started:.1f}s"
+            )
+        )
+
+    def _create_categories(self, prefix: str, count: int) -> list[int]:
+        names = [f"{prefix} category {index + 1}" for index in range(count)]
+        Category.objects.bulk_create(
+            [Category(name=name) for name in names], ignore_conflicts=True
+        )
+        return list(
+            Category.objects.filter(name__in=names).values_list("id", flat=True)
+        )
+
+    def _create_books(
+        self, categories: list[int], count: int, skew: float
+    ) -> tuple[list[int], dict[int, int]]:
+        rng = self.rng
+        category_weights = zipf_weights(len(categories), 0.8)
+        book_ids: list[int] = []
+        copies: dict[int, int] = {}
+        for start in range(0, count, self.batch_size):
+            batch = []
+            for rank in range(start, min(count, start + self.batch_size)):
+                # Popular books (low rank) get more copies.
+                total = max(1, round(10 / (1 + rank) ** (skew / 3))) + rng.randint(0, 2)
+                batch.append(
+                    Book(
+                        title=" ".join(rng.sample(WORDS, rng.randint(2, 4))).title(),
+                        author=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                        category_id=rng.choices(categories, category_weights)[0],
+                        total_copies=total,
+                        available_copies=total,
+                    )
+                )
+            created = Book.objects.bulk_create(batch)
+            for book in created:
+                book_ids.append(book.pk)
+                copies[book.pk] = book.total_copies
+            self.stderr.write(f"  books: {len(book_ids)}/{count}")
+        return book_ids, copies
+
+    def _create_users(self, prefix: str, count: int, password: str) -> list[int]:
+        # Hashing is deliberately slow, so every user shares one hash.
+        password_hash = make_password(password)
+        usernames = [f"{prefix}_reader_{index + 1}" for index in range(count)]
+        for start in range(0, count, self.batch_size):
+            User.objects.bulk_create(
+                [
+                    User(username=username, password=password_hash)
+                    for username in usernames[start:start + self.batch_size]
+                ],
+                ignore_conflicts=True,
+            )
+        return list(
+            User.objects.filter(username__in=usernames).values_list("id", flat=True)
+        )
+
+    def _create_borrows(
+        self,
+        book_ids: list[int],
+        copies: dict[int, int],
+        user_ids: list[int],
+        count: int,
+        history_days: int,
+        skew: float,
+    ) -> dict[int, int]:
+        rng = self.rng
+        now = timezone.now()
+        book_weights = zipf_weights(len(book_ids), skew)
+        user_weights = zipf_weights(len(user_ids), skew / 2)
+        open_loans: dict[int, int] = {}
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            books = rng.choices(book_ids, book_weights, k=size)
+            users = rng.choices(user_ids, user_weights, k=size)
+            batch = []
+            for book_id, user_id in zip(books, users):
+                # Skew loan dates towards the present: a long tail of history.
+                age = timedelta(days=history_days * rng.random() ** 2)
+                borrowed_at = now - age
+                due_date = borrowed_at + timedelta(days=14)
+                returned_at = None
+                recent = age < timedelta(days=30)
+                if (
+                    not recent
+                    or rng.random() < 0.6
+                    or open_loans.get(book_id, 0) >= copies[book_id]
+                ):
+                    returned_at = min(
+                        now, borrowed_at + timedelta(days=rng.uniform(1, 21))
+                    )
+                else:
+                    open_loans[book_id] = open_loans.get(book_id, 0) + 1
+                batch.append(
+                    Borrow(
+                        borrower_id=user_id,
+                        book_id=book_id,
+                        borrowed_at=borrowed_at,
+                        due_date=due_date,
+                        returned_at=returned_at,
+                    )
+                )
+            with transaction.atomic():
+                Borrow.objects.bulk_create(batch)
+            created += size
+            self.stderr.write(f"  borrows: {created}/{count}")
+        return open_loans
+
+    def _update_availability(
+        self, book_ids: list[int], copies: dict[int, int], open_loans: dict[int, int]
+    ) -> None:
+        touched = [book_id for book_id in book_ids if open_loans.get(book_id)]
+        for start in range(0, len(touched), self.batch_size):
+            Book.objects.bulk_update(
+                [
+                    Book(
+                        pk=book_id,
+                        available_copies=copies[book_id] - open_loans[book_id],
+                    )
+                    for book_id in touched[start:start + self.batch_size]
+                ],
+                ["available_copies"],
+            )
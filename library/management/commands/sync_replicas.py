@@ -0,0 +1,42 @@
+"""
+Copy the primary SQLite database over the configured read replicas.
+
+This stands in for real replication when trying the read/write router
+locally (see ``LIBRARY_READ_REPLICAS`` in ``config/settings.py``).  It
+uses SQLite's online backup API, so the primary stays usable meanwhile.
+
+Usage::
+
+    python manage.py sync_replicas
+"""
+
+from __future__ import annotations
+
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database to every read replica."
+
+    def handle(self, *args, **options):
+        replicas = settings.LIBRARY_READ_REPLICAS
+        if not replicas:
+            raise CommandError("No read replicas are configured (LIBRARY_READ_REPLICAS)")
+        primary = connections[DEFAULT_DB_ALIAS]
+        for alias in (DEFAULT_DB_ALIAS, *replicas):
+            if connections[alias].vendor != "sqlite":
+                raise CommandError(f"{alias} is not a SQLite database; use real replication")
+
+        primary.ensure_connection()
+        for alias in replicas:
+            connections[alias].close()
+            target = sqlite3.connect(settings.DATABASES[alias]["NAME"])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f"Copied {DEFAULT_DB_ALIAS} to {alias}")
@@ -0,0 +1,179 @@
+"""
+Serving uploaded media (cover images) efficiently.
+
+:func:`serve` replaces ``django.views.static.serve``, which reads whole
+files into Python and knows nothing about caching.  It:
+
+* derives a strong ``ETag`` and ``Last-Modified`` from ``os.stat`` and
+  answers conditional requests with 304 without opening the file;
+* answers single byte ``Range`` requests with 206 (honouring
+  ``If-Range``) and unsatisfiable ones with 416;
+* returns a :class:`~django.http.FileResponse` over a real file handle, so
+  WSGI servers with ``wsgi.file_wrapper`` support (e.g. gunicorn) send it
+  with ``os.sendfile`` instead of copying it through Python;
+* can hand the transfer to the front-end web server entirely with
+  ``X-Accel-Redirect`` (nginx) or ``X-Sendfile`` (Apache, lighttpd), see
+  ``LIBRARY_MEDIA_OFFLOAD``;
+* marks the content-hashed cover variants as cacheable forever.
+"""
+
+from __future__ import annotations
+
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .thumbnails import VARIANT_DIR
+
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class _RangeFile:
+    """
+    A file handle limited to ``length`` bytes from its current position.
+
+    It keeps ``fileno()`` so sendfile-capable servers can still use it;
+    they send ``Content-Length`` bytes from the current offset.
+    """
+
+    def __init__(self, handle, length: int) -> None:
+        self._handle = handle
+        self._remaining = length
+        self.name = handle.name
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._handle.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self) -> int:
+        return self._handle.fileno()
+
+    def close(self) -> None:
+        self._handle.close()
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single-range ``Range`` header into inclusive ``(start, end)``.
+
+    Returns None for headers that should be ignored (malformed or with
+    several ranges) and raises ``ValueError`` for unsatisfiable ones.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def _cache_control(path: str) -> str:
+    if path.startswith(VARIANT_DIR + "/"):
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return f"public, max-age={settings.LIBRARY_MEDIA_MAX_AGE}"
+
+
+@require_safe
+def serve(request, path: str):
+    """Serve the file ``path`` below ``MEDIA_ROOT``."""
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        info = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404("File not found")
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404("File not found")
+
+    etag = f'"{info.st_mtime_ns:x}-{info.st_size:x}"'
+    last_modified = int(info.st_mtime)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Cache-Control": _cache_control(path),
+        "Accept-Ranges": "bytes",
+    }
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        _set_headers(response, headers)
+        return response
+
+    content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+    offload = settings.LIBRARY_MEDIA_OFFLOAD
+    if offload:
+        # The web server handles Range itself; Python never touches the bytes.
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if offload == "x-accel-redirect":
+            response.headers["X-Accel-Redirect"] = quote(
+                settings.LIBRARY_MEDIA_ACCEL_PREFIX + path.replace(os.sep, "/")
+            )
+        else:
+            response.headers["X-Sendfile"] = fullpath
+        return response
+
+    byte_range = None
+    range_header = request.headers.get("Range")
+    if range_header and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, info.st_size)
+        except ValueError:
+            response = HttpResponse(status=416, headers=headers)
+            response.headers["Content-Range"] = f"bytes */{info.st_size}"
+            return response
+
+    if request.method == "HEAD":
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response.headers["Content-Length"] = info.st_size
+        return response
+
+    handle = open(fullpath, "rb")
+    if byte_range is None:
+        response = FileResponse(handle, content_type=content_type)
+    else:
+        start, end = byte_range
+        handle.seek(start)
+        response = FileResponse(_RangeFile(handle, end - start + 1), content_type=content_type)
+        response.status_code = 206
+        response.headers["Content-Length"] = end - start + 1
+        response.headers["Content-Range"] = f"bytes {start}-{end}/{info.st_size}"
+    _set_headers(response, headers)
+    return response
+
+
+def _set_headers(response: HttpResponse, headers: dict) -> None:
+    for name, value in headers.items():
+        response.headers[name] = value
+
+
+def _if_range_matches(request, etag: str, last_modified: int) -> bool:
+    """True unless an ``If-Range`` precondition says the client's copy is stale."""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
@@ -0,0 +1,314 @@
+"""
+Middleware for the Library application.
+
+:class:`QueryProfilingMiddleware` measures what each request costs: the
+number of SQL statements, total database time, the slowest statement and
+the time spent from the view onwards.  The figures are returned to the
+client in a ``Server-Timing`` header (visible in the browser's network
+panel) and slow requests are written to the ``library.profiling`` logger
+as JSON, sampled at ``LIBRARY_SLOW_REQUEST_SAMPLE_RATE``.
+
+The middleware also flags likely N+1 patterns: when the same statement
+shape runs ``LIBRARY_N_PLUS_ONE_THRESHOLD`` times in one request, the
+template (or project source line) that issued it is recorded and logged.
+
+Enable it with ``LIBRARY_PROFILING = True`` in ``config/settings.py``.
+It runs natively in both sync and async stacks.  Statements are timed by
+an execute wrapper installed once on every connection, which reports to
+the profile of the current request through a context variable: async
+views run their queries in worker threads, and connections (with their
+``execute_wrapper``) are per thread.
+
+:class:`PrimaryStickinessMiddleware` tracks whether a request wrote to the
+database and, if so, pins the client to the primary for a short window
+(see :mod:`library.routers`).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import random
+import re
+import sys
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+
+from . import routers
+
+
+logger = logging.getLogger("library.profiling")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*%s\s*,?)+\)", re.IGNORECASE)
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+_THIS_FILE = Path(__file__).resolve()
+
+
+def statement_signature(sql: str) -> str:
+    """
+    Reduce ``sql`` to its shape so repeated statements compare equal.
+
+    Literals are replaced by ``?`` and ``IN (%s, %s, ...)`` lists of any
+    length collapse into one form.
+    """
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    sql = _LITERAL_RE.sub("?", sql)
+    return _WHITESPACE_RE.sub(" ", sql).strip()
+
+
+def query_origin() -> str | None:
+    """
+    Describe where the currently executing query came from.
+
+    Prefers the innermost template being rendered; otherwise returns the
+    innermost frame of project code outside installed packages.
+    """
+    base_dir = str(Path(settings.BASE_DIR).resolve())
+    project_frame = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        owner = frame.f_locals.get("self")
+        if isinstance(owner, Template) and frame.f_code.co_name == "render":
+            origin = owner.origin
+            return f"template {getattr(origin, 'template_name', None) or origin.name}"
+        filename = frame.f_code.co_filename
+        if (
+            project_frame is None
+            and filename.startswith(base_dir)
+            and "site-packages" not in filename
+            and Path(filename).resolve() != _THIS_FILE
+        ):
+            project_frame = f"{filename[len(base_dir) + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return project_frame
+
+
+class RequestProfile:
+    """Collects statistics for every statement executed during a request."""
+
+    def __init__(self, n_plus_one_threshold: int) -> None:
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.query_count = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql: str | None = None
+        self.signatures: Counter[str] = Counter()
+        self.n_plus_one: dict[str, str | None] = {}
+        self.view_started: float | None = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.query_count += 1
+            self.db_time += elapsed
+            if elapsed > self.slowest_time:
+                self.slowest_time = elapsed
+                self.slowest_sql = sql
+            signature = statement_signature(sql)
+            self.signatures[signature] += 1
+            if self.signatures[signature] == self.n_plus_one_threshold:
+                self.n_plus_one[signature] = query_origin()
+
+
+# The profile of the request being handled, if it is profiled.
+_current_profile: ContextVar[RequestProfile | None] = ContextVar(
+    "library_profile", default=None
+)
+
+
+def _profile_statement(execute, sql, params, many, context):
+    """Execute wrapper that times the statement for the current request."""
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def install_profiler(sender=None, connection=None, **kwargs) -> None:
+    """Add :func:`_profile_statement` to ``connection`` if it is missing."""
+    if _profile_statement not in connection.execute_wrappers:
+        # Outermost, so ``execute_wrapper()`` blocks still pop their own.
+        connection.execute_wrappers.insert(0, _profile_statement)
+
+
+class QueryProfilingMiddleware:
+    """
+    Report per-request SQL and timing figures (see module docstring).
+
+    Works in both sync and async stacks, like
+    :class:`PrimaryStickinessMiddleware`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_ms = getattr(settings, "LIBRARY_SLOW_REQUEST_MS", 500.0)
+        self.sample_rate = getattr(settings, "LIBRARY_SLOW_REQUEST_SAMPLE_RATE", 1.0)
+        self.n_plus_one_threshold = getattr(
+            settings, "LIBRARY_N_PLUS_ONE_THRESHOLD", 10
+        )
+        connection_created.connect(install_profiler, dispatch_uid="library.profiling")
+        for connection in connections.all(initialized_only=True):
+            install_profiler(connection=connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Keep the view hook async too, or Django runs it in a thread.
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile, token, started = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self._finish(request, response, profile, started)
+
+    async def __acall__(self, request):
+        profile, token, started = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self._finish(request, response, profile, started)
+
+    def _start(self, request):
+        profile = RequestProfile(self.n_plus_one_threshold)
+        request.library_profile = profile
+        return profile, _current_profile.set(profile), time.perf_counter()
+
+    def _finish(self, request, response, profile: RequestProfile, started: float):
+        finished = time.perf_counter()
+
+        total_ms = 1000 * (finished - started)
+        view_ms = (
+            1000 * (finished - profile.view_started)
+            if profile.view_started is not None
+            else None
+        )
+        response["Server-Timing"] = self._server_timing(profile, total_ms, view_ms)
+        self._log(request, response, profile, total_ms, view_ms)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self._view_started(request)
+        return None
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self._view_started(request)
+        return None
+
+    @staticmethod
+    def _view_started(request) -> None:
+        profile = getattr(request, "library_profile", None)
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+
+    @staticmethod
+    def _server_timing(
+        profile: RequestProfile, total_ms: float, view_ms: float | None
+    ) -> str:
+        metrics = [
+            f'db;dur={1000 * profile.db_time:.2f};desc="{profile.query_count} queries"',
+        ]
+        if profile.slowest_sql is not None:
+            metrics.append(f'db-slowest;dur={1000 * profile.slowest_time:.2f}')
+        if view_ms is not None:
+            metrics.append(f"view;dur={view_ms:.2f}")
+        metrics.append(f"total;dur={total_ms:.2f}")
+        if profile.n_plus_one:
+            metrics.append(f'n-plus-one;desc="{len(profile.n_plus_one)} repeated statements"')
+        return ", ".join(metrics)
+
+    def _log(self, request, response, profile, total_ms, view_ms) -> None:
+        slow = total_ms >= self.slow_request_ms
+        if not profile.n_plus_one and not (slow and random.random() < self.sample_rate):
+            return
+        match = getattr(request, "resolver_match", None)
+        record = {
+            "event": "slow_request" if slow else "n_plus_one",
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 2),
+            "view_ms": round(view_ms, 2) if view_ms is not None else None,
+            "db_ms": round(1000 * profile.db_time, 2),
+            "queries": profile.query_count,
+            "slowest_ms": round(1000 * profile.slowest_time, 2),
+            "slowest_sql": profile.slowest_sql,
+            "n_plus_one": [
+                {
+                    "sql": signature,
+                    "count": profile.signatures[signature],
+                    "origin": origin,
+                }
+                for signature, origin in profile.n_plus_one.items()
+            ],
+        }
+        logger.warning(json.dumps(record))
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Pin clients that just wrote to the primary database (read-your-writes).
+
+    Works in both sync and async stacks, so it does not force async views
+    under ASGI through a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.window = getattr(settings, "LIBRARY_PRIMARY_STICKY_SECONDS", 5.0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = routers.RoutingState()
+        token = routers.activate(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.deactivate(token)
+        return self._stick(state, response)
+
+    async def __acall__(self, request):
+        state = routers.RoutingState()
+        token = routers.activate(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.deactivate(token)
+        return self._stick(state, response)
+
+    def _stick(self, state: routers.RoutingState, response):
+        if state.wrote:
+            response.set_cookie(
+                routers.PRIMARY_COOKIE,
+                f"{time.time() + self.window:.3f}",
+                max_age=max(1, round(self.window)),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
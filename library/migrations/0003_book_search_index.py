@@ -0,0 +1,26 @@
+# Creates the SQLite FTS5 index used by ``library.search``.
+
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from library import search
+
+    search.install(schema_editor.connection)
+
+
+def uninstall_search_index(apps, schema_editor):
+    from library import search
+
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0002_book_cover_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
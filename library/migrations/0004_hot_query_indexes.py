@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_book_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title'], name='book_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['category', 'title'], name='book_category_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['borrower', '-borrowed_at'], name='borrow_borrower_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(condition=models.Q(('returned_at__isnull', True)), fields=['due_date'], name='borrow_open_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrow',
+            index=models.Index(fields=['borrowed_at'], name='borrow_borrowed_at_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('library', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField(help_text='Loans due before this moment were considered overdue.')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('fine_per_day', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('loan_count', models.PositiveIntegerField(default=0)),
+                ('total_fine', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OverdueEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('borrow_id', models.BigIntegerField(db_index=True)),
+                ('due_date', models.DateTimeField()),
+                ('days_overdue', models.PositiveIntegerField()),
+                ('fine', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+                ('borrower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='library.overduereport')),
+            ],
+        ),
+    ]
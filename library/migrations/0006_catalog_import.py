@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:53
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_overdue_reports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=500, unique=True)),
+                ('offset', models.BigIntegerField(default=0, help_text='Byte offset of the first row not imported yet.')),
+                ('rows_imported', models.BigIntegerField(default=0)),
+                ('rows_rejected', models.BigIntegerField(default=0)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
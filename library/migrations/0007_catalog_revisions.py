@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:56
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_catalog_revision(apps, schema_editor):
+    CatalogRevision = apps.get_model("library", "CatalogRevision")
+    CatalogRevision.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_catalog_import'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revision', models.PositiveBigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='revision',
+            field=models.PositiveBigIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(create_catalog_revision, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-16 20:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_catalog_revisions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogrevision',
+            name='change_floor',
+            field=models.BigIntegerField(default=0, help_text='Highest change sequence purged by compaction; feed clients behind it must resync.'),
+        ),
+        migrations.CreateModel(
+            name='BookChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book_id', 'id'], name='bookchange_book_seq_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-16 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_book_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
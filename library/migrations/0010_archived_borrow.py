@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('library', '0009_book_cover_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBorrow',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('borrowed_at', models.DateTimeField()),
+                ('due_date', models.DateTimeField()),
+                ('returned_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_borrows', to='library.book')),
+                ('borrower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrows', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-borrowed_at'],
+                'indexes': [models.Index(fields=['borrower', '-borrowed_at'], name='archborrow_borrower_recent_idx')],
+            },
+        ),
+    ]
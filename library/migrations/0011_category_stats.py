@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def compute_category_stats(apps, schema_editor):
+    Book = apps.get_model("library", "Book")
+    Borrow = apps.get_model("library", "Borrow")
+    Category = apps.get_model("library", "Category")
+    CategoryStats = apps.get_model("library", "CategoryStats")
+    rows = {
+        category_id: CategoryStats(category_id=category_id)
+        for category_id in Category.objects.values_list("id", flat=True)
+    }
+    books = (
+        Book.objects.order_by()
+        .values("category_id")
+        .annotate(
+            count=models.Count("id"),
+            total=models.Sum("total_copies"),
+            available=models.Sum("available_copies"),
+        )
+    )
+    for row in books:
+        stats = rows[row["category_id"]]
+        stats.books = row["count"]
+        stats.total_copies = row["total"] or 0
+        stats.available_copies = row["available"] or 0
+    loans = (
+        Borrow.objects.filter(returned_at__isnull=True)
+        .order_by()
+        .values("book__category_id")
+        .annotate(count=models.Count("id"))
+    )
+    for row in loans:
+        rows[row["book__category_id"]].open_loans = row["count"]
+    CategoryStats.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0010_archived_borrow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='library.category')),
+                ('books', models.BigIntegerField(default=0)),
+                ('total_copies', models.BigIntegerField(default=0)),
+                ('available_copies', models.BigIntegerField(default=0)),
+                ('open_loans', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(compute_category_stats, migrations.RunPython.noop),
+    ]
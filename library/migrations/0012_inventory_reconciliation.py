@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:47
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_category_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryReconciliation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('incremental', models.BooleanField(default=False)),
+                ('repair', models.BooleanField(default=False)),
+                ('through_change', models.BigIntegerField(default=0)),
+                ('books_checked', models.BigIntegerField(default=0)),
+                ('discrepancies', models.BigIntegerField(default=0)),
+                ('repaired', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_inventory_reconciliation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('through_borrow', models.BigIntegerField(default=0)),
+                ('generation', models.PositiveBigIntegerField(default=0)),
+                ('rolled_up_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PopularBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(max_length=10)),
+                ('rank', models.PositiveIntegerField()),
+                ('borrows', models.PositiveIntegerField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='library.book')),
+            ],
+            options={
+                'ordering': ['window', 'rank'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyBorrowCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('borrows', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='popularbook',
+            constraint=models.UniqueConstraint(fields=('window', 'rank'), name='popularbook_window_rank_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='popularbook',
+            constraint=models.UniqueConstraint(fields=('window', 'book'), name='popularbook_window_book_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyborrowcount',
+            constraint=models.UniqueConstraint(fields=('day', 'book'), name='dailyborrow_day_book_uniq'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0013_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedBooksIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('through_borrow', models.BigIntegerField(default=0)),
+                ('generation', models.PositiveBigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RelatedBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('shared_patrons', models.PositiveIntegerField(help_text='Patrons who borrowed both books.')),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_books', to='library.book')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+            ],
+            options={
+                'ordering': ['book', 'rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedbook',
+            constraint=models.UniqueConstraint(fields=('book', 'rank'), name='relatedbook_book_rank_uniq'),
+        ),
+    ]
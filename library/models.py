@@ -9,14 +9,37 @@ These models define the core entities of the application:
 * :class:`Borrow` – records the borrowing of a book by a user,
   including due dates and return timestamps. It exposes helper
   properties to determine overdue status.
+* :class:`ArchivedBorrow` – returned loans moved out of the
+  :class:`Borrow` table by ``manage.py archive_borrows`` (see
+  :mod:`library.archive`).
+* :class:`OverdueReport` and :class:`OverdueEntry` – the results of a
+  batched overdue scan (see :mod:`library.overdue`).
+* :class:`CatalogImport` – resume checkpoints for ``manage.py
+  import_catalog``.
+* :class:`CatalogRevision` – a single-row version stamp for the whole
+  catalog, used for conditional GETs on the books API.
+* :class:`BookChange` – the append-only change log behind the change feed
+  (see :mod:`library.changefeed`).
+* :class:`CategoryStats` – materialized book, copy and loan counts per
+  category (see :mod:`library.stats`).
+* :class:`InventoryReconciliation` – runs of the ``available_copies``
+  reconciler (see :mod:`library.inventory`).
+* :class:`DailyBorrowCount`, :class:`PopularBook` and
+  :class:`PopularityRollup` – daily loan counters and the most borrowed
+  books they are ranked into (see :mod:`library.popularity`).
+* :class:`RelatedBook` and :class:`RelatedBooksIndex` – the "patrons also
+  borrowed" neighbours of each book (see :mod:`library.recommendations`).
 """
 
 from __future__ import annotations
 
 from datetime import timedelta
-from django.db import models
+from typing import Iterable
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.functional import cached_property
 
 
 class Category(models.Model):
@@ -49,13 +72,64 @@ class Book(models.Model):
     cover_image = models.ImageField(
         upload_to="book_covers/", blank=True, null=True
     )
+    # Fixed-size, content-hashed renditions of ``cover_image``, built by
+    # ``library.thumbnails``.  Use ``covers`` rather than reading this.
+    cover_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Version stamp of this row, bumped on every change (see ``touch()``).
+    # The API derives ETags and Last-Modified headers from it.
+    revision = models.PositiveBigIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ["title"]
+        indexes = [
+            # Catalog ordering and the (title, id) keyset used by the API.
+            models.Index(fields=["title"], name="book_title_idx"),
+            # Category-filtered catalog pages ordered by title.
+            models.Index(fields=["category", "title"], name="book_category_title_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title} — {self.author}"
 
+    def save(self, *args, **kwargs) -> None:
+        if not self._state.adding:
+            self.touch()
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "revision", "updated_at"}
+        super().save(*args, **kwargs)
+
+    def touch(self) -> None:
+        """
+        Bump the version stamp on the next write of this instance.
+
+        ``save()`` does this itself.  Call it before ``bulk_update`` and
+        include ``revision`` and ``updated_at`` in the updated fields.  The
+        increment is done by the database, so concurrent writers never
+        produce the same revision; reload the row to read the new value.
+        """
+        self.revision = models.F("revision") + 1
+        self.updated_at = timezone.now()
+
+    @staticmethod
+    def stamp() -> dict:
+        """Keyword arguments that bump the version stamp in ``update()``."""
+        return {"revision": models.F("revision") + 1, "updated_at": timezone.now()}
+
+    @cached_property
+    def covers(self) -> dict:
+        """
+        Cover variants by kind (``list``, ``detail``, ``retina``).
+
+        Each has ``url``, ``width`` and ``height``.  Empty when the book
+        has no cover or its variants have not been built yet.
+        """
+        from .thumbnails import covers
+
+        return covers(self)
+
     def can_borrow(self) -> bool:
         """Return True if there is at least one available copy."""
         return self.available_copies > 0
@@ -73,6 +147,18 @@ class Book(models.Model):
         return self.total_copies - self.available_copies
 
 
+class BorrowQuerySet(models.QuerySet):
+    """Query helpers that keep loan-status predicates in SQL."""
+
+    def open(self) -> "BorrowQuerySet":
+        """Loans that have not been returned yet."""
+        return self.filter(returned_at__isnull=True)
+
+    def overdue(self, as_of=None) -> "BorrowQuerySet":
+        """Open loans whose due date is before ``as_of`` (default: now)."""
+        return self.open().filter(due_date__lt=as_of or timezone.now())
+
+
 class Borrow(models.Model):
     """Represents a record of a user borrowing a book."""
     borrower = models.ForeignKey(
@@ -91,8 +177,26 @@ class Borrow(models.Model):
     due_date = models.DateTimeField()
     returned_at = models.DateTimeField(null=True, blank=True)
 
+    objects = BorrowQuerySet.as_manager()
+
     class Meta:
         ordering = ["-borrowed_at"]
+        indexes = [
+            # A user's history, newest first (``my_history``).
+            models.Index(
+                fields=["borrower", "-borrowed_at"],
+                name="borrow_borrower_recent_idx",
+            ),
+            # Open loans by due date, for overdue scans.  Returned loans are
+            # left out so the index only grows with the number of open loans.
+            models.Index(
+                fields=["due_date"],
+                condition=models.Q(returned_at__isnull=True),
+                name="borrow_open_due_idx",
+            ),
+            # Date drill-down in the admin.
+            models.Index(fields=["borrowed_at"], name="borrow_borrowed_at_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.borrower.username} borrowed {self.book.title}"
@@ -110,4 +214,354 @@ class Borrow(models.Model):
     @classmethod
     def default_due_date(cls) -> timezone.datetime:
         """Provide a default due date 14 days from now."""
-        return timezone.now() + timedelta(days=14)
\ No newline at end of file
+        return timezone.now() + timedelta(days=14)
+
+
+class ArchivedBorrow(models.Model):
+    """
+    A returned loan moved out of the hot :class:`Borrow` table.
+
+    The row keeps the loan's original id, so links and reports that stored
+    it stay meaningful.  Archived loans are read only for a user's older
+    history and for reporting.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    borrower = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_borrows",
+    )
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.PROTECT,
+        related_name="archived_borrows",
+    )
+    borrowed_at = models.DateTimeField()
+    due_date = models.DateTimeField()
+    returned_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    # Archived loans are always returned; these mirror :class:`Borrow` so
+    # templates can show either.
+    is_returned = True
+    is_overdue = False
+
+    class Meta:
+        ordering = ["-borrowed_at"]
+        indexes = [
+            # A user's older history, newest first.
+            models.Index(
+                fields=["borrower", "-borrowed_at"],
+                name="archborrow_borrower_recent_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.borrower.username} borrowed {self.book.title} (archived)"
+
+
+class OverdueReport(models.Model):
+    """Summary of one run of the overdue scan."""
+    as_of = models.DateTimeField(
+        help_text="Loans due before this moment were considered overdue.",
+    )
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    fine_per_day = models.DecimalField(
+        max_digits=8, decimal_places=2, null=True, blank=True
+    )
+    loan_count = models.PositiveIntegerField(default=0)
+    total_fine = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["-started_at"]
+
+    def __str__(self) -> str:
+        return f"Overdue scan as of {self.as_of:%Y-%m-%d %H:%M} ({self.loan_count} loans)"
+
+
+class OverdueEntry(models.Model):
+    """One overdue loan found by an :class:`OverdueReport` run."""
+    report = models.ForeignKey(
+        OverdueReport,
+        on_delete=models.CASCADE,
+        related_name="entries",
+    )
+    # Stored as a plain id so archiving or deleting the loan later does not
+    # rewrite historical reports.
+    borrow_id = models.BigIntegerField(db_index=True)
+    borrower = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    due_date = models.DateTimeField()
+    days_overdue = models.PositiveIntegerField()
+    fine = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"Loan {self.borrow_id}: {self.days_overdue} days overdue"
+
+
+class CatalogImport(models.Model):
+    """
+    Progress of a catalog import, used to resume an interrupted run.
+
+    The checkpoint is updated in the same transaction as each imported
+    batch, so a resumed import neither skips nor repeats rows.
+    """
+    source = models.CharField(max_length=500, unique=True)
+    offset = models.BigIntegerField(
+        default=0, help_text="Byte offset of the first row not imported yet."
+    )
+    rows_imported = models.BigIntegerField(default=0)
+    rows_rejected = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"Import of {self.source} ({self.rows_imported} rows)"
+
+
+class SingletonModel(models.Model):
+    """
+    Base for tables that hold a single row of shared state.
+
+    The row has the primary key ``SINGLETON_ID`` and is created on first
+    use by :meth:`current`.
+    """
+
+    SINGLETON_ID = 1
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def current(cls):
+        """Return the row, creating it if needed."""
+        # A plain read first: get_or_create() counts as a write for routing.
+        row = cls.objects.filter(pk=cls.SINGLETON_ID).first()
+        if row is None:
+            row = cls.objects.get_or_create(pk=cls.SINGLETON_ID)[0]
+        return row
+
+    @classmethod
+    async def acurrent(cls):
+        """:meth:`current` for async views."""
+        row = await cls.objects.filter(pk=cls.SINGLETON_ID).afirst()
+        if row is None:
+            row = (await cls.objects.aget_or_create(pk=cls.SINGLETON_ID))[0]
+        return row
+
+
+class CatalogRevision(SingletonModel):
+    """
+    Version stamp for the catalog as a whole.
+
+    There is a single row.  It is bumped in the same transaction as every
+    change to a book or category, so a reader never sees a new revision
+    together with old data.  List endpoints use it for their ETags and as
+    part of their cache keys.
+    """
+    revision = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(default=timezone.now)
+    change_floor = models.BigIntegerField(
+        default=0,
+        help_text="Highest change sequence purged by compaction; feed clients "
+        "behind it must resync.",
+    )
+
+    def __str__(self) -> str:
+        return f"Catalog revision {self.revision}"
+
+    @classmethod
+    def bump(cls) -> None:
+        """Advance the catalog revision."""
+        updated = cls.objects.filter(pk=cls.SINGLETON_ID).update(
+            revision=models.F("revision") + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            cls.objects.get_or_create(pk=cls.SINGLETON_ID)
+
+
+class BookChange(models.Model):
+    """
+    One entry of the append-only book change log.
+
+    ``id`` doubles as the sequence number that change feed clients pass
+    back as ``since``.  ``book_id`` is a plain column rather than a foreign
+    key so that tombstones (``deleted=True``) outlive the book.
+    """
+    book_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Latest entry per book, for compaction.
+            models.Index(fields=["book_id", "id"], name="bookchange_book_seq_idx"),
+        ]
+
+    def __str__(self) -> str:
+        action = "deleted" if self.deleted else "changed"
+        return f"#{self.pk}: book {self.book_id} {action}"
+
+    @classmethod
+    def record(
+        cls, book_ids: Iterable[int], *, deleted: bool = False, batch_size: int | None = None
+    ) -> None:
+        """
+        Log a change to every book in ``book_ids`` and bump the catalog revision.
+
+        Call this in the transaction that makes the change.  The revision
+        row is updated first, and its row lock makes concurrent writers
+        take sequence numbers in commit order, so a feed reader never skips
+        an entry that commits after it has read a higher one.
+        """
+        with transaction.atomic():
+            CatalogRevision.bump()
+            now = timezone.now()
+            cls.objects.bulk_create(
+                [cls(book_id=pk, deleted=deleted, changed_at=now) for pk in book_ids],
+                batch_size=batch_size,
+            )
+
+
+class CategoryStats(models.Model):
+    """
+    Materialized counts for one category.
+
+    Every write path applies its change to these rows in its own
+    transaction (see :mod:`library.stats`), so catalog pages and the stats
+    API read them instead of aggregating books and loans.  ``manage.py
+    rebuild_stats`` recomputes them from scratch.
+    """
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+    )
+    books = models.BigIntegerField(default=0)
+    total_copies = models.BigIntegerField(default=0)
+    available_copies = models.BigIntegerField(default=0)
+    open_loans = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return f"Statistics of category {self.category_id}"
+
+    @property
+    def copies_on_loan(self) -> int:
+        """Copies not available, according to the books' counters."""
+        return self.total_copies - self.available_copies
+
+
+class InventoryReconciliation(models.Model):
+    """
+    Summary of one run of the inventory reconciler (see :mod:`library.inventory`).
+
+    ``through_change`` is the highest change log entry that existed when
+    the run started.  An incremental run only checks books logged after
+    the ``through_change`` of the last finished repairing run.
+    """
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    incremental = models.BooleanField(default=False)
+    repair = models.BooleanField(default=False)
+    through_change = models.BigIntegerField(default=0)
+    books_checked = models.BigIntegerField(default=0)
+    discrepancies = models.BigIntegerField(default=0)
+    repaired = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-started_at"]
+
+    def __str__(self) -> str:
+        kind = "Incremental" if self.incremental else "Full"
+        return f"{kind} inventory check ({self.discrepancies} discrepancies)"
+
+
+class DailyBorrowCount(models.Model):
+    """Number of times one book was borrowed on one day."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    borrows = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves the rollup's scan of the days in the longest window.
+            models.UniqueConstraint(fields=["day", "book"], name="dailyborrow_day_book_uniq"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Book {self.book_id} borrowed {self.borrows} times on {self.day}"
+
+
+class PopularBook(models.Model):
+    """One entry of a most-borrowed ranking, stored by the last rollup."""
+    window = models.CharField(max_length=10)
+    rank = models.PositiveIntegerField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="popularity")
+    borrows = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ["window", "rank"]
+        constraints = [
+            models.UniqueConstraint(fields=["window", "rank"], name="popularbook_window_rank_uniq"),
+            models.UniqueConstraint(fields=["window", "book"], name="popularbook_window_book_uniq"),
+        ]
+
+    def __str__(self) -> str:
+        return f"#{self.rank} of the {self.window}: book {self.book_id}"
+
+
+class PopularityRollup(SingletonModel):
+    """
+    State of the popularity rollup.
+
+    There is a single row.  ``through_borrow`` is the highest loan id
+    counted into :class:`DailyBorrowCount`; ``generation`` is bumped each
+    time the rankings are stored, and versions responses that show them.
+    """
+    through_borrow = models.BigIntegerField(default=0)
+    generation = models.PositiveBigIntegerField(default=0)
+    rolled_up_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"Popularity rollup {self.generation}"
+
+
+class RelatedBook(models.Model):
+    """One "patrons also borrowed" neighbour of a book, ranked by ``score``."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="related_books")
+    related = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    shared_patrons = models.PositiveIntegerField(
+        help_text="Patrons who borrowed both books.",
+    )
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ["book", "rank"]
+        constraints = [
+            # A book's neighbours in order, for book_detail.
+            models.UniqueConstraint(fields=["book", "rank"], name="relatedbook_book_rank_uniq"),
+        ]
+
+    def __str__(self) -> str:
+        return f"#{self.rank} for book {self.book_id}: book {self.related_id}"
+
+
+class RelatedBooksIndex(SingletonModel):
+    """
+    State of the related books index.
+
+    There is a single row.  ``through_borrow`` is the highest loan id the
+    index has taken into account; ``generation`` is bumped by every
+    refresh, and versions the pages and responses that show neighbours.
+    """
+    through_borrow = models.BigIntegerField(default=0)
+    generation = models.PositiveBigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"Related books index {self.generation}"
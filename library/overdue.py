@@ -0,0 +1,183 @@
+"""
+Batched overdue-loan scanning.
+
+:attr:`Borrow.is_overdue` is convenient in templates but needs every loan
+in Python.  This module pushes the overdue predicate into SQL (served by
+the partial ``borrow_open_due_idx`` index) and walks the matches in
+fixed-size keyset batches ordered by ``(due_date, id)``.  Days overdue and
+fines are computed per batch, and results are written to the
+:class:`OverdueReport` tables and/or a CSV file one batch at a time.  Memory
+use therefore stays bounded however many loans are open.
+"""
+
+from __future__ import annotations
+
+import csv
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import IO, Iterator
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Borrow, OverdueEntry, OverdueReport
+from .pagination import paginate_keyset
+
+
+SCAN_ORDERING: tuple[str, ...] = ("due_date", "id")
+DEFAULT_BATCH_SIZE: int = 1000
+
+CSV_HEADER: tuple[str, ...] = (
+    "borrow_id",
+    "borrower_id",
+    "borrower",
+    "book_id",
+    "book",
+    "due_date",
+    "days_overdue",
+    "fine",
+)
+
+_DAY = timedelta(days=1)
+
+
+@dataclass(frozen=True)
+class OverdueLoan:
+    """An overdue loan with its computed lateness and fine."""
+    borrow_id: int
+    borrower_id: int
+    borrower: str
+    book_id: int
+    book: str
+    due_date: datetime
+    days_overdue: int
+    fine: Decimal | None
+
+    def as_csv_row(self) -> tuple:
+        return (
+            self.borrow_id,
+            self.borrower_id,
+            self.borrower,
+            self.book_id,
+            self.book,
+            self.due_date.isoformat(),
+            self.days_overdue,
+            "" if self.fine is None else self.fine,
+        )
+
+
+def days_overdue(due_date: datetime, as_of: datetime) -> int:
+    """Number of started days between ``due_date`` and ``as_of``."""
+    return max(1, math.ceil((as_of - due_date) / _DAY))
+
+
+def compute_fine(
+    days: int, fine_per_day: Decimal | None, max_fine: Decimal | None = None
+) -> Decimal | None:
+    """Return the fine for ``days`` late, capped at ``max_fine``."""
+    if fine_per_day is None:
+        return None
+    fine = fine_per_day * days
+    if max_fine is not None:
+        fine = min(fine, max_fine)
+    return fine
+
+
+def iter_overdue_batches(
+    as_of: datetime | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    fine_per_day: Decimal | None = None,
+    max_fine: Decimal | None = None,
+) -> Iterator[list[OverdueLoan]]:
+    """
+    Yield lists of at most ``batch_size`` overdue loans.
+
+    Each batch is a single indexed query that starts after the last loan of
+    the previous batch, so late batches cost as much as early ones.
+    """
+    as_of = as_of or timezone.now()
+    queryset = Borrow.objects.overdue(as_of).values(
+        "id",
+        "borrower_id",
+        "borrower__username",
+        "book_id",
+        "book__title",
+        "due_date",
+    )
+    cursor = None
+    while True:
+        rows, cursor = paginate_keyset(queryset, SCAN_ORDERING, batch_size, cursor)
+        if rows:
+            batch = []
+            for row in rows:
+                days = days_overdue(row["due_date"], as_of)
+                batch.append(
+                    OverdueLoan(
+                        borrow_id=row["id"],
+                        borrower_id=row["borrower_id"],
+                        borrower=row["borrower__username"],
+                        book_id=row["book_id"],
+                        book=row["book__title"],
+                        due_date=row["due_date"],
+                        days_overdue=days,
+                        fine=compute_fine(days, fine_per_day, max_fine),
+                    )
+                )
+            yield batch
+        if cursor is None:
+            return
+
+
+def scan_overdue(
+    as_of: datetime | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    fine_per_day: Decimal | None = None,
+    max_fine: Decimal | None = None,
+    save: bool = True,
+    csv_file: IO[str] | None = None,
+) -> OverdueReport:
+    """
+    Scan every overdue loan and record the results.
+
+    With ``save`` the loans are stored as :class:`OverdueEntry` rows of a new
+    :class:`OverdueReport`; with ``csv_file`` they are written as CSV.  The
+    returned report carries the totals (it is unsaved when ``save`` is
+    false).
+    """
+    as_of = as_of or timezone.now()
+    report = OverdueReport(as_of=as_of, fine_per_day=fine_per_day)
+    if save:
+        report.save()
+    writer = None
+    if csv_file is not None:
+        writer = csv.writer(csv_file)
+        writer.writerow(CSV_HEADER)
+
+    total_fine = Decimal("0")
+    for batch in iter_overdue_batches(as_of, batch_size, fine_per_day, max_fine):
+        report.loan_count += len(batch)
+        total_fine += sum((loan.fine for loan in batch if loan.fine), Decimal("0"))
+        if save:
+            with transaction.atomic():
+                OverdueEntry.objects.bulk_create(
+                    OverdueEntry(
+                        report=report,
+                        borrow_id=loan.borrow_id,
+                        borrower_id=loan.borrower_id,
+                        book_id=loan.book_id,
+                        due_date=loan.due_date,
+                        days_overdue=loan.days_overdue,
+                        fine=loan.fine,
+                    )
+                    for loan in batch
+                )
+        if writer is not None:
+            writer.writerows(loan.as_csv_row() for loan in batch)
+
+    report.total_fine = total_fine
+    report.finished_at = timezone.now()
+    if save:
+        report.save(update_fields=["loan_count", "total_fine", "finished_at"])
+    return report
@@ -0,0 +1,196 @@
+"""
+Versioned page and fragment caching for the HTML catalog.
+
+Anonymous visitors all see the same catalog, so :func:`cached_page`
+stores whole ``book_list`` and ``book_detail`` pages in Django's cache.
+Logged-in users get per-user content (their name, the borrow form) and
+always render.  Rows of the catalog grid are cached on their own by
+:func:`book_rows`, for every user, so a page that has to be rendered
+still reuses the rows of the books that did not change.
+
+Nothing is ever deleted from the cache.  Every key contains a generation
+counter that the save and delete signals (and the bulk paths calling
+:meth:`~library.models.BookChange.record`) bump in the writer's
+transaction:
+
+* catalog pages use the :class:`~library.models.CatalogRevision`;
+* detail pages and rows use the book's ``revision``.
+
+A change therefore makes the old entries unreachable, and they expire
+after ``LIBRARY_PAGE_CACHE_TIMEOUT``.  Hits and misses are counted in
+the cache as well; :func:`stats` reads them (see the ``api_cache_stats``
+view).  :func:`acached_page` and :func:`acount` serve the async views.
+"""
+
+from __future__ import annotations
+
+from typing import Awaitable, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.http import HttpRequest, HttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import SafeString, mark_safe
+
+from .models import Book
+
+
+KINDS: tuple[str, ...] = ("page", "fragment")
+ROW_TEMPLATE = "library/book_card.html"
+
+
+def _counter_key(kind: str, outcome: str) -> str:
+    return f"library:pagecache:{kind}:{outcome}"
+
+
+def count(kind: str, outcome: str, amount: int = 1) -> None:
+    """Add ``amount`` to the ``hits`` or ``misses`` counter of ``kind``."""
+    if not amount:
+        return
+    key = _counter_key(kind, outcome)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # First use (or the counter was evicted); a lost race only
+        # drops a few counts.
+        if not cache.add(key, amount, timeout=None):
+            cache.incr(key, amount)
+
+
+async def acount(kind: str, outcome: str, amount: int = 1) -> None:
+    """:func:`count` for async views."""
+    if not amount:
+        return
+    key = _counter_key(kind, outcome)
+    try:
+        await cache.aincr(key, amount)
+    except ValueError:
+        if not await cache.aadd(key, amount, timeout=None):
+            await cache.aincr(key, amount)
+
+
+def stats() -> dict:
+    """Hits, misses and hit rate per kind of cached content."""
+    keys = [_counter_key(kind, outcome) for kind in KINDS for outcome in ("hits", "misses")]
+    values = cache.get_many(keys)
+    result = {}
+    for kind in KINDS:
+        hits = values.get(_counter_key(kind, "hits"), 0)
+        misses = values.get(_counter_key(kind, "misses"), 0)
+        total = hits + misses
+        result[kind] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else None,
+        }
+    return result
+
+
+def cacheable(request: HttpRequest) -> bool:
+    """True for requests that may be answered from the page cache."""
+    return request.method in ("GET", "HEAD") and not request.user.is_authenticated
+
+
+def cached_page(
+    request: HttpRequest, version: str, build: Callable[[], HttpResponse]
+) -> HttpResponse:
+    """
+    Return the cached page for ``request.path`` at ``version``, or ``build()`` it.
+
+    ``version`` must contain the generation counter(s) of the data on the
+    page and any query parameters that change it.  Only successful
+    responses are stored.
+    """
+    if not cacheable(request):
+        return build()
+    key = f"library:page:{request.path}:{version}"
+    entry = cache.get(key)
+    if entry is not None:
+        count("page", "hits")
+        content, content_type = entry
+        response = HttpResponse(content, content_type=content_type)
+        response["X-Cache"] = "HIT"
+        return response
+
+    count("page", "misses")
+    response = build()
+    if response.status_code == 200 and not response.streaming:
+        cache.set(
+            key,
+            (response.content, response["Content-Type"]),
+            settings.LIBRARY_PAGE_CACHE_TIMEOUT,
+        )
+    response["X-Cache"] = "MISS"
+    return response
+
+
+async def acached_page(
+    request: HttpRequest, version: str, build: Callable[[], Awaitable[HttpResponse]]
+) -> HttpResponse:
+    """
+    :func:`cached_page` for async views; ``build`` is awaited.
+
+    ``request.user`` must already be loaded: evaluating it here would
+    query the database from the event loop.
+    """
+    if not cacheable(request):
+        return await build()
+    key = f"library:page:{request.path}:{version}"
+    entry = await cache.aget(key)
+    if entry is not None:
+        await acount("page", "hits")
+        content, content_type = entry
+        response = HttpResponse(content, content_type=content_type)
+        response["X-Cache"] = "HIT"
+        return response
+
+    await acount("page", "misses")
+    response = await build()
+    if response.status_code == 200 and not response.streaming:
+        await cache.aset(
+            key,
+            (response.content, response["Content-Type"]),
+            settings.LIBRARY_PAGE_CACHE_TIMEOUT,
+        )
+    response["X-Cache"] = "MISS"
+    return response
+
+
+def _row_key(book_id: int, revision: int) -> str:
+    return f"library:row:{book_id}:{revision}"
+
+
+def book_rows(books: QuerySet) -> list[SafeString]:
+    """
+    Render the catalog card of every book in ``books``, in order.
+
+    Only ids and revisions are read for the whole queryset.  Cards are
+    fetched from the cache in one round trip, and only the books whose
+    card is missing are loaded and rendered.
+    """
+    stamps = list(books.values_list("id", "revision"))
+    keys = [_row_key(book_id, revision) for book_id, revision in stamps]
+    cached = cache.get_many(keys)
+    missing = [book_id for (book_id, _), key in zip(stamps, keys) if key not in cached]
+    count("fragment", "hits", len(keys) - len(missing))
+    count("fragment", "misses", len(missing))
+
+    rendered: dict[int, str] = {}
+    if missing:
+        loaded = Book.objects.select_related("category").in_bulk(missing)
+        for book in loaded.values():
+            rendered[book.pk] = render_to_string(ROW_TEMPLATE, {"book": book})
+        # Keyed on the revision just loaded, which may be newer than the
+        # one read with the ids.
+        cache.set_many(
+            {_row_key(book.pk, book.revision): rendered[book.pk] for book in loaded.values()},
+            settings.LIBRARY_PAGE_CACHE_TIMEOUT,
+        )
+
+    rows = []
+    for (book_id, _), key in zip(stamps, keys):
+        row = cached.get(key) or rendered.get(book_id)
+        if row is not None:
+            rows.append(mark_safe(row))
+    return rows
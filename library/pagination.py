@@ -0,0 +1,223 @@
+"""
+Keyset (cursor) pagination helpers for the Library application.
+
+Offset pagination gets slower with every page because the database has to
+walk past all of the skipped rows.  Keyset pagination instead remembers the
+ordering values of the last row that was returned and asks for rows that
+sort strictly after it, which an index can answer directly no matter how
+deep into the result set the client is.
+
+Cursors are opaque, URL-safe strings that encode the ordering values of the
+last row on a page.  Orderings may mix ascending and descending keys
+(``"-borrowed_at"``) and must end in a unique key (normally ``"id"``) so
+that rows with equal values are never skipped or repeated.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import datetime
+import json
+from typing import Any, AnyStr, Iterable, Sequence
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max, Q, QuerySet
+from django.utils.functional import cached_property
+
+from .sqlite import fits_integer
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client supplies a cursor that cannot be decoded or typed."""
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """JSON encoder that keeps the full microsecond precision of datetimes."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the ordering values of a row into an opaque cursor string."""
+    raw = json.dumps(list(values), separators=(",", ":"), cls=_CursorEncoder)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """
+    Decode a cursor produced by :func:`encode_cursor`.
+
+    ``size`` is the number of ordering keys the cursor must contain.  Any
+    malformed input raises :class:`InvalidCursor` so views can answer with
+    a 400 instead of a server error.
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Malformed cursor")
+    return values
+
+
+def _ordering_field(queryset: QuerySet, name: str):
+    """The model field (or annotation output field) behind an ordering key."""
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    opts = queryset.model._meta
+    field = None
+    for part in name.split("__"):
+        field = opts.pk if part == "pk" else opts.get_field(part)
+        if field.is_relation:
+            opts = field.related_model._meta
+    return field
+
+
+def cursor_values(
+    queryset: QuerySet, ordering: Sequence[str], values: Sequence[Any]
+) -> list:
+    """
+    Convert decoded cursor ``values`` to the types of the ordering fields.
+
+    A cursor is only base64 JSON, so a client can send values of any type.
+    Anything the fields cannot take, ``null`` and integers beyond 64 bits
+    included, raises :class:`InvalidCursor` instead of failing in the query.
+    """
+    converted = []
+    for key, value in zip(ordering, values):
+        try:
+            value = _ordering_field(queryset, key.lstrip("-")).to_python(value)
+        except (TypeError, ValueError, ValidationError):
+            raise InvalidCursor("Invalid cursor values")
+        if value is None or (
+            isinstance(value, int) and not isinstance(value, bool) and not fits_integer(value)
+        ):
+            raise InvalidCursor("Invalid cursor values")
+        converted.append(value)
+    return converted
+
+
+def keyset_filter(ordering: Sequence[str], values: Sequence[Any]) -> Q:
+    """
+    Build the ``WHERE`` clause selecting rows that sort after ``values``.
+
+    For an ordering ``(a, -b, id)`` this produces
+    ``a > x OR (a = x AND b < y) OR (a = x AND b = y AND id > z)``.
+    """
+    condition = Q()
+    for position, key in enumerate(ordering):
+        field = key.lstrip("-")
+        lookup = "lt" if key.startswith("-") else "gt"
+        clause = Q(**{f"{field}__{lookup}": values[position]})
+        for previous, value in zip(ordering[:position], values[:position]):
+            clause &= Q(**{previous.lstrip("-"): value})
+        condition |= clause
+    return condition
+
+
+def row_value(row: Any, key: str) -> Any:
+    """Read an ordering key from a model instance or a ``values()`` dict."""
+    if isinstance(row, dict):
+        return row[key]
+    value = row
+    for attribute in key.split("__"):
+        value = getattr(value, attribute)
+    return value
+
+
+def cursor_for(row: Any, ordering: Sequence[str]) -> str:
+    """Return the cursor pointing just after ``row``."""
+    return encode_cursor([row_value(row, key.lstrip("-")) for key in ordering])
+
+
+def apply_cursor(
+    queryset: QuerySet, ordering: Sequence[str], cursor: str | None
+) -> QuerySet:
+    """Order ``queryset`` by ``ordering`` and skip rows up to ``cursor``."""
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = cursor_values(queryset, ordering, decode_cursor(cursor, len(ordering)))
+        queryset = queryset.filter(keyset_filter(ordering, values))
+    return queryset
+
+
+def paginate_keyset(
+    queryset: QuerySet,
+    ordering: Sequence[str],
+    limit: int,
+    cursor: str | None = None,
+) -> tuple[list, str | None]:
+    """
+    Return one page of ``queryset`` and the cursor for the next page.
+
+    One extra row is fetched to find out whether another page exists, so
+    the next cursor is ``None`` exactly when the caller reached the end.
+    """
+    rows = list(apply_cursor(queryset, ordering, cursor)[: limit + 1])
+    return _split_page(rows, ordering, limit)
+
+
+async def apaginate_keyset(
+    queryset: QuerySet,
+    ordering: Sequence[str],
+    limit: int,
+    cursor: str | None = None,
+) -> tuple[list, str | None]:
+    """:func:`paginate_keyset` for async views."""
+    rows = [row async for row in apply_cursor(queryset, ordering, cursor)[: limit + 1]]
+    return _split_page(rows, ordering, limit)
+
+
+def _split_page(rows: list, ordering: Sequence[str], limit: int) -> tuple[list, str | None]:
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, cursor_for(rows[-1], ordering)
+
+
+def chunked(rows: Iterable[AnyStr], size: int) -> Iterable[AnyStr]:
+    """Join an iterable of strings (or of bytes) into chunks of ``size`` items."""
+    buffer: list = []
+    for row in rows:
+        buffer.append(row)
+        if len(buffer) >= size:
+            yield buffer[0][:0].join(buffer)
+            buffer = []
+    if buffer:
+        yield buffer[0][:0].join(buffer)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never runs an exact ``COUNT(*)`` over a large table.
+
+    An unfiltered queryset is counted as its highest primary key, which
+    the primary key index answers directly; it overestimates by the rows
+    that were deleted.  A filtered one is counted up to ``count_limit``
+    rows, so the count costs at most that many index or row visits.
+    Either way the result is only an estimate for display, which is why
+    :class:`~django.contrib.admin.ModelAdmin` classes using it also set
+    ``show_full_result_count = False``.
+    """
+
+    count_limit = 10_000
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        if not queryset.query.where:
+            highest = queryset.model._base_manager.using(queryset.db).aggregate(
+                highest=Max("pk")
+            )["highest"]
+            return highest or 0
+        return queryset.order_by()[: self.count_limit].count()
@@ -0,0 +1,277 @@
+"""
+Most borrowed books of the week, month and year.
+
+Ranking books by their loans in a window would aggregate and sort every
+loan of the window on each request.  Instead loans are counted per book
+and day in :class:`~library.models.DailyBorrowCount`, and :func:`rollup`
+(``manage.py rollup_popularity``, run from cron) does the rest:
+
+1. new loans, by id since the last rollup, are added to the counters in
+   batches of ``batch_size`` ids, each in a transaction that also moves
+   the checkpoint, so a failed rollup can simply be repeated;
+2. the counters of the longest window are loaded as arrays and summed per
+   book for every window (with NumPy when it is installed), and the top
+   ``LIBRARY_POPULAR_BOOKS`` of each are stored in
+   :class:`~library.models.PopularBook`;
+3. counters older than the longest window are dropped.
+
+Readers join the stored rankings (:func:`popular_books`), so a ranked
+page costs one indexed query, and responses that show them are cached
+per rollup ``generation`` until the next rollup.  ``rollup(rebuild=True)``
+recounts everything from the loan history, archived loans included.
+"""
+
+from __future__ import annotations
+
+import heapq
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Iterable, Mapping, Sequence
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, QuerySet
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    ArchivedBorrow,
+    Borrow,
+    DailyBorrowCount,
+    PopularBook,
+    PopularityRollup,
+)
+from .sqlite import lock_for_update
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Ranking windows, in days up to and including the day of the rollup.
+WINDOWS: dict[str, int] = {"week": 7, "month": 30, "year": 365}
+DEFAULT_WINDOW: str = "month"
+DEFAULT_BATCH_SIZE: int = 10_000
+# Loans younger than this are left for the next rollup: a loan with a
+# lower id may still be committing, and would be skipped for good.
+SETTLE_TIME = timedelta(minutes=1)
+
+
+Ranking = list[tuple[int, int]]
+
+
+def popular_books(books: QuerySet, window: str) -> QuerySet:
+    """
+    Restrict ``books`` to the ranking of ``window``.
+
+    The result is annotated with ``popularity_rank`` (1 is the most
+    borrowed) and ``popularity_borrows``; order by
+    ``("popularity_rank", "id")``.
+    """
+    return books.filter(popularity__window=window).annotate(
+        popularity_rank=F("popularity__rank"),
+        popularity_borrows=F("popularity__borrows"),
+    )
+
+
+def _lock() -> PopularityRollup:
+    """Lock the rollup row for the current transaction and return it."""
+    PopularityRollup.current()
+    return lock_for_update(
+        PopularityRollup.objects.filter(pk=PopularityRollup.SINGLETON_ID), "generation"
+    ).get()
+
+
+def _daily_loans(loans: QuerySet, start: int, end: int, since: date) -> Counter:
+    """Loans with ids in ``(start, end]`` borrowed since ``since``, by (book, day)."""
+    midnight = timezone.make_aware(datetime.combine(since, time.min))
+    rows = (
+        loans.filter(id__gt=start, id__lte=end, borrowed_at__gte=midnight)
+        .order_by()
+        .values("book_id", day=TruncDate("borrowed_at"))
+        .annotate(count=Count("id"))
+        .values_list("book_id", "day", "count")
+    )
+    return Counter({(book_id, day): count for book_id, day, count in rows})
+
+
+def count_batch(start: int, end: int, since: date) -> int:
+    """
+    Add the loans with ids in ``(start, end]`` to the daily counters.
+
+    Returns the number of loans counted; 0 if another rollup already
+    counted this range.
+    """
+    with transaction.atomic():
+        state = _lock()
+        if state.through_borrow >= end:
+            return 0
+        start = max(start, state.through_borrow)
+        counts = _daily_loans(Borrow.objects, start, end, since)
+        # Loans may have been archived since they were made.
+        counts.update(_daily_loans(ArchivedBorrow.objects, start, end, since))
+        if counts:
+            existing = DailyBorrowCount.objects.filter(
+                day__in={day for _, day in counts},
+                book_id__in={book_id for book_id, _ in counts},
+            )
+            rows = {(row.book_id, row.day): row for row in existing}
+            updated = [row for key, row in rows.items() if key in counts]
+            for row in updated:
+                row.borrows += counts[row.book_id, row.day]
+            DailyBorrowCount.objects.bulk_update(updated, ["borrows"])
+            DailyBorrowCount.objects.bulk_create(
+                DailyBorrowCount(book_id=book_id, day=day, borrows=count)
+                for (book_id, day), count in counts.items()
+                if (book_id, day) not in rows
+            )
+        PopularityRollup.objects.filter(pk=state.pk).update(through_borrow=end)
+    return sum(counts.values())
+
+
+def settled_loan_id() -> int:
+    """The highest loan id the rollup may count up to now."""
+    settled = timezone.now() - SETTLE_TIME
+    newest = (
+        Borrow.objects.filter(borrowed_at__lt=settled)
+        .order_by("-id")
+        .values_list("id", flat=True)
+        .first()
+    )
+    archived = ArchivedBorrow.objects.aggregate(high=Max("id"))["high"]
+    return max(newest or 0, archived or 0)
+
+
+def top_books(
+    book_ids: Sequence[int],
+    ages: Sequence[int],
+    counts: Sequence[int],
+    windows: Mapping[str, int],
+    limit: int,
+) -> dict[str, Ranking]:
+    """
+    The ``limit`` most borrowed books of each window.
+
+    The three sequences are the counters: a book, its age in days, and how
+    often it was borrowed that day.  Returns ``{window: [(book_id,
+    borrows), ...]}``, most borrowed first and ties by book id.
+    """
+    if numpy is None:
+        return _top_books_python(book_ids, ages, counts, windows, limit)
+    ages = numpy.asarray(ages, dtype=numpy.int64)
+    counts = numpy.asarray(counts, dtype=numpy.int64)
+    books, index = numpy.unique(numpy.asarray(book_ids, dtype=numpy.int64), return_inverse=True)
+    rankings = {}
+    for window, days in windows.items():
+        inside = ages < days
+        totals = numpy.bincount(index[inside], weights=counts[inside], minlength=len(books))
+        totals = totals.astype(numpy.int64)
+        ranked = numpy.flatnonzero(totals)
+        if 0 < limit < len(ranked):
+            # Keep everything tied with the limit-th book, then sort.
+            cutoff = numpy.partition(totals[ranked], len(ranked) - limit)[len(ranked) - limit]
+            ranked = ranked[totals[ranked] >= cutoff]
+        ranked = ranked[numpy.lexsort((books[ranked], -totals[ranked]))][:limit]
+        rankings[window] = list(zip(books[ranked].tolist(), totals[ranked].tolist()))
+    return rankings
+
+
+def _top_books_python(
+    book_ids: Sequence[int],
+    ages: Sequence[int],
+    counts: Sequence[int],
+    windows: Mapping[str, int],
+    limit: int,
+) -> dict[str, Ranking]:
+    """:func:`top_books` without NumPy."""
+    rankings = {}
+    for window, days in windows.items():
+        totals: Counter = Counter()
+        for book_id, age, count in zip(book_ids, ages, counts):
+            if age < days:
+                totals[book_id] += count
+        rankings[window] = heapq.nsmallest(
+            limit, totals.items(), key=lambda item: (-item[1], item[0])
+        )
+    return rankings
+
+
+def rank(as_of: date, limit: int) -> dict[str, Ranking]:
+    """Rank the books of every window from the daily counters."""
+    since = as_of - timedelta(days=max(WINDOWS.values()) - 1)
+    rows = DailyBorrowCount.objects.filter(day__gte=since, day__lte=as_of).values_list(
+        "book_id", "day", "borrows"
+    )
+    book_ids, ages, counts = [], [], []
+    for book_id, day, borrows in rows.iterator(chunk_size=DEFAULT_BATCH_SIZE):
+        book_ids.append(book_id)
+        ages.append((as_of - day).days)
+        counts.append(borrows)
+    return top_books(book_ids, ages, counts, WINDOWS, limit)
+
+
+def store(rankings: Mapping[str, Iterable[tuple[int, int]]]) -> int:
+    """Replace the stored rankings; returns the new generation."""
+    with transaction.atomic():
+        state = _lock()
+        PopularBook.objects.all().delete()
+        PopularBook.objects.bulk_create(
+            PopularBook(window=window, rank=position, book_id=book_id, borrows=borrows)
+            for window, ranking in rankings.items()
+            for position, (book_id, borrows) in enumerate(ranking, start=1)
+        )
+        PopularityRollup.objects.filter(pk=state.pk).update(
+            generation=F("generation") + 1, rolled_up_at=timezone.now()
+        )
+    return state.generation + 1
+
+
+def rollup(
+    *,
+    rebuild: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    limit: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+) -> dict[str, Ranking]:
+    """
+    Count new loans, then rank and store the most borrowed books.
+
+    With ``rebuild`` the counters are first cleared and every loan of the
+    longest window is counted again.  ``progress(counted, highest_id)`` is
+    called after each batch.  Returns the rankings that were stored.
+    """
+    limit = settings.LIBRARY_POPULAR_BOOKS if limit is None else limit
+    today = timezone.localdate()
+    since = today - timedelta(days=max(WINDOWS.values()) - 1)
+    if rebuild:
+        with transaction.atomic():
+            state = _lock()
+            DailyBorrowCount.objects.all().delete()
+            PopularityRollup.objects.filter(pk=state.pk).update(through_borrow=0)
+
+    start = PopularityRollup.current().through_borrow
+    end = settled_loan_id()
+    counted = 0
+    for low in range(start, end, batch_size):
+        high = min(low + batch_size, end)
+        counted += count_batch(low, high, since)
+        if progress is not None:
+            progress(counted, high)
+
+    rankings = rank(today, limit)
+    store(rankings)
+    DailyBorrowCount.objects.filter(day__lt=since).delete()
+    return rankings
+
+
+def generation() -> int:
+    """The version of the stored rankings, for cache keys and ETags."""
+    return PopularityRollup.current().generation
+
+
+def parse_window(value: str | None) -> str | None:
+    """The window named by ``value`` (the default if empty), or ``None`` if unknown."""
+    if not value:
+        return DEFAULT_WINDOW
+    return value if value in WINDOWS else None
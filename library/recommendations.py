@@ -0,0 +1,235 @@
+"""
+"Patrons also borrowed" recommendations.
+
+Finding the books most often borrowed by the patrons of a given book means
+joining the loans to themselves across every patron, far too slow for a
+page view.  The neighbours are computed offline instead and stored in
+:class:`~library.models.RelatedBook`, at most ``LIBRARY_RELATED_BOOKS`` per
+book, so :func:`related_books` reads them in one indexed query.
+
+:func:`refresh` (``manage.py refresh_related_books``) reads the distinct
+(patron, book) pairs of all loans, archived ones included, into a sparse
+patron × book matrix, :class:`Incidence`, in batches of loan ids.  Two
+books are related by the patrons who borrowed both; they are scored by
+cosine similarity (shared patrons divided by the geometric mean of their
+patron counts), so best sellers do not top every list.  Pairs shared by
+fewer than ``MIN_SHARED_PATRONS`` patrons are noise and are left out.
+
+The first refresh computes every book.  Later ones are incremental: only
+the books in the baskets of patrons with loans since the last refresh
+gained co-occurrences, so only their rows are recomputed and rewritten.
+Such a refresh reads no more of the matrix than those rows need
+(:func:`read_neighbourhood`): the affected books' patrons, those patrons'
+baskets, and the patron counts of the books in them.  The scores of other
+books that list them drift slightly as their patron counts grow;
+``--full`` recomputes everything.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+from collections import Counter, defaultdict
+from typing import Callable, Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Min, QuerySet
+from django.utils import timezone
+
+from .models import ArchivedBorrow, Book, Borrow, RelatedBook, RelatedBooksIndex
+from .popularity import settled_loan_id
+
+
+DEFAULT_BATCH_SIZE: int = 10_000
+# Pairs shared by fewer patrons are not stored.
+MIN_SHARED_PATRONS: int = 2
+# Patrons who borrowed more distinct books (reading groups, staff
+# accounts) relate nearly everything and are left out of the pairs.
+MAX_BASKET: int = 1000
+
+
+Neighbour = tuple[int, int, float]
+
+
+class Incidence:
+    """The sparse patron × book matrix: who borrowed which books."""
+
+    def __init__(self) -> None:
+        self.readers: dict[int, set[int]] = defaultdict(set)
+        self.baskets: dict[int, set[int]] = defaultdict(set)
+
+    def add(self, pairs: Iterable[tuple[int, int]]) -> None:
+        for patron, book in pairs:
+            self.readers[book].add(patron)
+            self.baskets[patron].add(book)
+
+    def neighbours(self, book_id: int, limit: int) -> list[Neighbour]:
+        """The ``limit`` best ``(book_id, shared_patrons, score)`` for ``book_id``."""
+        readers = self.readers.get(book_id)
+        if not readers:
+            return []
+        shared: Counter = Counter()
+        for patron in readers:
+            basket = self.baskets[patron]
+            if len(basket) <= MAX_BASKET:
+                shared.update(basket)
+        del shared[book_id]
+        scored = (
+            (other, count, count / math.sqrt(len(readers) * len(self.readers[other])))
+            for other, count in shared.items()
+            if count >= MIN_SHARED_PATRONS
+        )
+        return heapq.nlargest(limit, scored, key=lambda item: (item[2], item[1], -item[0]))
+
+
+def read_incidence(batch_size: int = DEFAULT_BATCH_SIZE) -> Incidence:
+    """Load the (patron, book) pairs of every loan, ``batch_size`` ids at a time."""
+    incidence = Incidence()
+    for loans in (Borrow.objects, ArchivedBorrow.objects):
+        bounds = loans.aggregate(low=Min("id"), high=Max("id"))
+        if bounds["low"] is None:
+            continue
+        for start in range(bounds["low"], bounds["high"] + 1, batch_size):
+            incidence.add(
+                loans.filter(id__gte=start, id__lt=start + batch_size)
+                .order_by()
+                .values_list("borrower_id", "book_id")
+            )
+    return incidence
+
+
+def _add_loans(incidence: Incidence, field: str, ids: Iterable[int], batch_size: int) -> None:
+    """Add the pairs of every loan whose ``field`` is in ``ids``, ``batch_size`` ids at a time."""
+    ids = sorted(ids)
+    for loans in (Borrow.objects, ArchivedBorrow.objects):
+        for start in range(0, len(ids), batch_size):
+            incidence.add(
+                loans.filter(**{f"{field}__in": ids[start : start + batch_size]})
+                .order_by()
+                .values_list("borrower_id", "book_id")
+                .distinct()
+            )
+
+
+def read_neighbourhood(
+    patrons: Iterable[int], batch_size: int = DEFAULT_BATCH_SIZE
+) -> tuple[Incidence, set[int]]:
+    """
+    Load the part of the matrix that the books borrowed by ``patrons`` need.
+
+    Returns the incidence and those books.  Their readers and the readers'
+    baskets are complete, and so are the readers of every book that may be
+    shared by two of them, which :meth:`Incidence.neighbours` divides by.
+    """
+    incidence = Incidence()
+    patrons = set(patrons)
+    _add_loans(incidence, "borrower_id", patrons, batch_size)
+    books = {book for patron in patrons for book in incidence.baskets[patron]}
+    _add_loans(incidence, "book_id", books, batch_size)
+    readers = {patron for book in books for patron in incidence.readers[book]}
+    _add_loans(incidence, "borrower_id", readers - patrons, batch_size)
+    candidates: Counter = Counter()
+    for patron in readers:
+        basket = incidence.baskets[patron]
+        if len(basket) <= MAX_BASKET:
+            candidates.update(basket)
+    _add_loans(
+        incidence,
+        "book_id",
+        {book for book, count in candidates.items() if count >= MIN_SHARED_PATRONS} - books,
+        batch_size,
+    )
+    return incidence, books
+
+
+def _new_patrons(since: int, through: int) -> set[int]:
+    """Patrons with loans whose ids are in ``(since, through]``."""
+    patrons: set[int] = set()
+    for loans in (Borrow.objects, ArchivedBorrow.objects):
+        patrons.update(
+            loans.filter(id__gt=since, id__lte=through)
+            .order_by()
+            .values_list("borrower_id", flat=True)
+            .distinct()
+        )
+    return patrons
+
+
+def store(incidence: Incidence, book_ids: Iterable[int], limit: int) -> int:
+    """Recompute and replace the neighbours of ``book_ids``; returns rows written."""
+    book_ids = list(book_ids)
+    rows = [
+        RelatedBook(book_id=book_id, related_id=other, rank=rank, shared_patrons=count, score=score)
+        for book_id in book_ids
+        for rank, (other, count, score) in enumerate(
+            incidence.neighbours(book_id, limit), start=1
+        )
+    ]
+    with transaction.atomic():
+        RelatedBook.objects.filter(book_id__in=book_ids).delete()
+        RelatedBook.objects.bulk_create(rows)
+    return len(rows)
+
+
+def refresh(
+    *,
+    full: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    limit: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """
+    Bring the related books index up to date with the loans.
+
+    Recomputes every book when ``full`` or on the first refresh, otherwise
+    only the books affected by new loans.  Loans are read ``batch_size``
+    ids (of loans, or of patrons and books) at a time, and ``batch_size``
+    books are written per transaction.  ``progress(done, total)`` is called after each
+    batch.  Returns the number of books recomputed.
+    """
+    limit = settings.LIBRARY_RELATED_BOOKS if limit is None else limit
+    since = RelatedBooksIndex.current().through_borrow
+    through = settled_loan_id()
+
+    if full or not since:
+        incidence = read_incidence(batch_size)
+        book_ids = list(Book.objects.order_by("pk").values_list("pk", flat=True))
+    else:
+        incidence, affected = read_neighbourhood(_new_patrons(since, through), batch_size)
+        # Rows of deleted books went with them.
+        book_ids = list(
+            Book.objects.filter(pk__in=affected).order_by("pk").values_list("pk", flat=True)
+        )
+
+    for start in range(0, len(book_ids), batch_size):
+        store(incidence, book_ids[start : start + batch_size], limit)
+        if progress is not None:
+            progress(min(start + batch_size, len(book_ids)), len(book_ids))
+
+    RelatedBooksIndex.objects.filter(pk=RelatedBooksIndex.SINGLETON_ID).update(
+        through_borrow=through,
+        generation=F("generation") + 1,
+        refreshed_at=timezone.now(),
+    )
+    return len(book_ids)
+
+
+def related_books(book_id: int) -> QuerySet:
+    """The stored neighbours of ``book_id``, best first, with their books."""
+    return (
+        RelatedBook.objects.filter(book_id=book_id)
+        .select_related("related")
+        .order_by("rank")
+    )
+
+
+def serialize(entry: RelatedBook) -> dict:
+    """The API representation of one neighbour."""
+    return {
+        "id": entry.related_id,
+        "title": entry.related.title,
+        "author": entry.related.author,
+        "shared_patrons": entry.shared_patrons,
+        "score": round(entry.score, 4),
+    }
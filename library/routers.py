@@ -0,0 +1,135 @@
+"""
+Database routing between the primary and read replicas.
+
+Reads go to the primary (``default``) unless the view opted in with
+:func:`replica_reads`, the request is a GET or HEAD, and the client has
+not written recently.  Writes always go to the primary.  When a request
+writes, :class:`~library.middleware.PrimaryStickinessMiddleware` pins the
+client to the primary for ``LIBRARY_PRIMARY_STICKY_SECONDS`` with a
+cookie, so users read their own writes despite replica lag.
+
+Only this app's models are read from replicas.  Sessions and users stay
+on the primary, so logging in never races replication.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+PRIMARY_COOKIE = "library_primary_until"
+REPLICATED_APPS: frozenset[str] = frozenset({"library"})
+
+
+@dataclass
+class RoutingState:
+    """Per-request routing state, shared by the middleware and the router."""
+
+    use_replica: bool = False
+    wrote: bool = False
+
+
+_state: ContextVar[RoutingState | None] = ContextVar("library_routing", default=None)
+
+
+def current_state() -> RoutingState | None:
+    return _state.get()
+
+
+def activate(state: RoutingState):
+    """Make ``state`` current; returns a token for :func:`deactivate`."""
+    return _state.set(state)
+
+
+def deactivate(token) -> None:
+    _state.reset(token)
+
+
+def pinned_to_primary(request) -> bool:
+    """True while the client is inside its read-your-writes window."""
+    try:
+        return float(request.COOKIES.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _replica_state(request) -> RoutingState | None:
+    """The state to switch to replicas for ``request``, if it may use them."""
+    state = _state.get()
+    if (
+        state is None
+        or not settings.LIBRARY_READ_REPLICAS
+        or request.method not in ("GET", "HEAD")
+        or pinned_to_primary(request)
+    ):
+        return None
+    return state
+
+
+def replica_reads(view):
+    """Let safe requests to ``view`` (sync or async) read from a replica."""
+
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            state = _replica_state(request)
+            if state is None:
+                return await view(request, *args, **kwargs)
+            state.use_replica = True
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                state.use_replica = False
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _replica_state(request)
+        if state is None:
+            return view(request, *args, **kwargs)
+        state.use_replica = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.use_replica = False
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """Send opted-in reads to a random replica and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            state is not None
+            and state.use_replica
+            and not state.wrote
+            and model._meta.app_label in REPLICATED_APPS
+        ):
+            return random.choice(settings.LIBRARY_READ_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary and are never migrated directly.
+        return db not in settings.LIBRARY_READ_REPLICAS
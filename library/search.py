@@ -0,0 +1,184 @@
+"""
+Full-text search over the book catalog.
+
+On SQLite the catalog is indexed by an FTS5 virtual table that uses
+``library_book`` as its external content table.  Triggers keep the index in
+sync on every insert, delete and title/author update, including bulk
+operations that bypass model signals.  Queries are matched with prefix
+semantics (``"dun"`` finds *Dune*) and ranked with BM25, with title matches
+weighted above author matches.
+
+Other database backends fall back to ``icontains`` filtering, so callers can
+use :func:`search_books` without checking the backend themselves.
+"""
+
+from __future__ import annotations
+
+import re
+
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import FloatField, Q, QuerySet, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Book
+
+
+FTS_TABLE: str = "library_book_fts"
+
+# BM25 column weights for (title, author).
+TITLE_WEIGHT: float = 10.0
+AUTHOR_WEIGHT: float = 5.0
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_INSTALL_SQL: tuple[str, ...] = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title,
+        author,
+        content='library_book',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON library_book BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON library_book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF title, author ON library_book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO {FTS_TABLE}(rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+)
+
+_UNINSTALL_SQL: tuple[str, ...] = (
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+)
+
+_TRIGGER_NAMES = {f"{FTS_TABLE}_ai", f"{FTS_TABLE}_ad", f"{FTS_TABLE}_au"}
+
+
+def is_supported(connection: BaseDatabaseWrapper) -> bool:
+    """Return True if ``connection`` can host the FTS5 index."""
+    return connection.vendor == "sqlite"
+
+
+def install(connection: BaseDatabaseWrapper) -> None:
+    """
+    Create the FTS5 table and its triggers if they are missing.
+
+    SQLite drops triggers whenever Django rebuilds ``library_book`` during
+    a schema change, so this is also run after every ``migrate``.  If any
+    trigger had to be recreated the index is rebuilt from the book table.
+    """
+    if not is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+            sorted(_TRIGGER_NAMES),
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        for statement in _INSTALL_SQL:
+            cursor.execute(statement)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', %s)",
+            [f"bm25({TITLE_WEIGHT}, {AUTHOR_WEIGHT})"],
+        )
+        if existing != _TRIGGER_NAMES:
+            rebuild(connection)
+
+
+def uninstall(connection: BaseDatabaseWrapper) -> None:
+    """Drop the FTS5 table and its triggers."""
+    if not is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        for statement in _UNINSTALL_SQL:
+            cursor.execute(statement)
+
+
+def rebuild(connection: BaseDatabaseWrapper) -> None:
+    """Re-index every book from the content table."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def match_expression(query: str) -> str | None:
+    """
+    Turn free text into an FTS5 ``MATCH`` expression.
+
+    Every word becomes a quoted prefix term and all terms must match, so
+    user input can never inject FTS5 operators.  Returns ``None`` if the
+    query contains no searchable words.
+    """
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search_books(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Restrict ``queryset`` of books to those matching ``query``.
+
+    The result is annotated with ``search_rank``; lower values are better
+    matches, so order by ``("search_rank", "id")`` for ranked results.
+    """
+    connection = connections[queryset.db]
+    if not is_supported(connection):
+        return _search_books_fallback(queryset, query)
+
+    match = match_expression(query)
+    if match is None:
+        return _no_results(queryset)
+    # Join the FTS table instead of correlating a MATCH per book row, and
+    # read ``rank`` (BM25 with the weights configured in :func:`install`)
+    # once per matching row.  The unary ``+`` hides the rowid from FTS5 so
+    # SQLite always drives the join from the MATCH rather than re-running
+    # the full-text query for every book the other filters select.
+    book_table = Book._meta.db_table
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f"+{FTS_TABLE}.rowid = {book_table}.id", f"{FTS_TABLE} MATCH %s"],
+        params=[match],
+    ).annotate(
+        search_rank=RawSQL(f"{FTS_TABLE}.rank", (), output_field=FloatField())
+    )
+
+
+def _search_books_fallback(queryset: QuerySet, query: str) -> QuerySet:
+    """Unranked ``icontains`` search for backends without FTS5."""
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return _no_results(queryset)
+    for token in tokens:
+        queryset = queryset.filter(
+            Q(title__icontains=token) | Q(author__icontains=token)
+        )
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def _no_results(queryset: QuerySet) -> QuerySet:
+    """An empty result that still carries the ``search_rank`` annotation."""
+    return queryset.annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    ).none()
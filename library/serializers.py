@@ -0,0 +1,157 @@
+"""
+Lean serialization of books for the JSON API.
+
+The API representations are described as tables of :class:`Field`\\ s.
+Each field names the columns it needs and how to turn them into its
+value, so a view reads exactly those columns with ``values()`` (joining
+the category name in the same query) and builds plain dicts, without
+creating ``Book`` and ``Category`` instances.
+
+Clients may ask for a subset of the fields with ``fields=id,title``
+(a sparse fieldset); fewer fields means fewer columns read.  Payloads are
+encoded by :func:`dumps`, which uses ``orjson`` when it is installed and
+the standard library otherwise.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Any, Callable, Iterable, Iterator, Mapping
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+
+from .pagination import row_value
+from .thumbnails import stored_covers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class InvalidFields(ValueError):
+    """Raised when a client asks for fields the representation lacks."""
+
+
+@dataclass(frozen=True)
+class Field:
+    """One key of a representation: the columns it reads and its value."""
+
+    columns: tuple[str, ...]
+    value: Callable[[Mapping[str, Any]], Any]
+
+
+def column(name: str) -> Field:
+    """A field that is a single column, copied as-is."""
+    return Field((name,), itemgetter(name))
+
+
+def _covers(row: Mapping[str, Any]) -> dict | None:
+    # ``values()`` yields the stored name, a model instance its FieldFile.
+    source = row["cover_image"]
+    found = stored_covers(getattr(source, "name", source), row["cover_variants"])
+    if not found:
+        return None
+    return {kind: cover._asdict() for kind, cover in found.items()}
+
+
+_COVERS = Field(("cover_image", "cover_variants"), _covers)
+
+# ``GET /api/books/`` and the change feed.
+BOOK_LIST_FIELDS: dict[str, Field] = {
+    "id": column("id"),
+    "title": column("title"),
+    "author": column("author"),
+    "category": column("category__name"),
+    "total_copies": column("total_copies"),
+    "available_copies": column("available_copies"),
+    "covers": _COVERS,
+}
+
+# ``GET /api/books/<pk>/``.
+BOOK_DETAIL_FIELDS: dict[str, Field] = {
+    "id": column("id"),
+    "title": column("title"),
+    "author": column("author"),
+    "category": column("category__name"),
+    "category_id": column("category_id"),
+    "total_copies": column("total_copies"),
+    "available_copies": column("available_copies"),
+    "covers": _COVERS,
+}
+
+
+def select_fields(
+    representation: dict[str, Field], requested: str | None
+) -> dict[str, Field]:
+    """
+    Restrict ``representation`` to the comma-separated ``requested`` names.
+
+    ``None`` selects every field.  The result keeps the representation's
+    key order.  Raises :class:`InvalidFields` for unknown or no names.
+    """
+    if requested is None:
+        return representation
+    names = {name.strip() for name in requested.split(",") if name.strip()}
+    unknown = sorted(names - representation.keys())
+    if unknown or not names:
+        raise InvalidFields(
+            f"Unknown fields: {', '.join(unknown) or '(none given)'}; "
+            f"choose from {', '.join(representation)}"
+        )
+    return {name: field for name, field in representation.items() if name in names}
+
+
+def columns(fields: dict[str, Field], extra: Iterable[str] = ()) -> list[str]:
+    """The distinct columns ``fields`` read, followed by ``extra``."""
+    needed = dict.fromkeys(col for field in fields.values() for col in field.columns)
+    needed.update(dict.fromkeys(key.lstrip("-") for key in extra))
+    return list(needed)
+
+
+def book_values(
+    books: QuerySet, fields: dict[str, Field], extra: Iterable[str] = ()
+) -> QuerySet:
+    """
+    ``books`` as ``values()`` rows holding what ``fields`` need.
+
+    Pass the ordering keys as ``extra`` so keyset cursors can be built
+    from the rows.
+    """
+    return books.values(*columns(fields, extra))
+
+
+def serialize(row: Mapping[str, Any], fields: dict[str, Field]) -> dict:
+    """Build the representation of one row."""
+    return {name: field.value(row) for name, field in fields.items()}
+
+
+def serialize_rows(
+    rows: Iterable[Mapping[str, Any]], fields: dict[str, Field]
+) -> Iterator[dict]:
+    """Build the representation of every row, lazily."""
+    items = list(fields.items())
+    for row in rows:
+        yield {name: field.value(row) for name, field in items}
+
+
+def serialize_instance(book, fields: dict[str, Field] = BOOK_LIST_FIELDS) -> dict:
+    """Build the representation of a ``Book`` instance that is already loaded."""
+    return serialize({col: row_value(book, col) for col in columns(fields)}, fields)
+
+
+_encoder = DjangoJSONEncoder()
+
+
+def dumps(data: Any) -> bytes:
+    """Encode ``data`` as JSON, with ``orjson`` if it is available."""
+    if orjson is not None:
+        # Datetimes go through Django's encoder so the output does not
+        # depend on which encoder is installed.
+        return orjson.dumps(
+            data, default=_encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME
+        )
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
@@ -0,0 +1,53 @@
+"""
+Signal handlers that keep the change log, catalog revision and category
+statistics current.
+
+Writes that go through ``Model.save()`` and ``Model.delete()`` (the single
+item API views, the admin) are covered here.  Bulk writes and queryset
+``update()`` calls do not send signals; code on those paths calls
+:meth:`BookChange.record` and :func:`library.stats.apply` itself (see
+:mod:`library.circulation`).
+"""
+
+from __future__ import annotations
+
+from . import stats
+from .models import Book, BookChange
+
+
+def book_saving(sender, instance, **kwargs) -> None:
+    # The stored counts, not the instance's: it may have been loaded before
+    # a borrow changed them.
+    instance._stats_before = None
+    if not instance._state.adding:
+        row = (
+            Book.objects.filter(pk=instance.pk)
+            .values_list("category_id", "total_copies", "available_copies")
+            .first()
+        )
+        instance._stats_before = stats.BookCounts(*row) if row else None
+
+
+def book_saved(sender, instance, **kwargs) -> None:
+    BookChange.record([instance.pk])
+    before = getattr(instance, "_stats_before", None)
+    if before is None:
+        stats.apply(stats.book_deltas(added=[stats.BookCounts.of(instance)]))
+    else:
+        stats.apply(stats.updated_book_deltas({instance.pk: before}, [instance]))
+
+
+def book_deleted(sender, instance, **kwargs) -> None:
+    BookChange.record([instance.pk], deleted=True)
+    stats.apply(stats.book_deltas(removed=[stats.BookCounts.of(instance)]))
+
+
+def category_changed(sender, instance, created: bool = False, **kwargs) -> None:
+    # Book payloads include the category name, so renaming a category
+    # changes every book in it.
+    book_ids = []
+    if not created:
+        books = Book.objects.filter(category=instance)
+        books.update(**Book.stamp())
+        book_ids = list(books.values_list("id", flat=True))
+    BookChange.record(book_ids)
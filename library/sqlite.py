@@ -0,0 +1,72 @@
+"""
+Production tuning for SQLite connections.
+
+With the default rollback journal a writer that is committing locks the
+whole database file, so page views queue up behind borrows and returns
+and, once ``timeout`` runs out, fail with ``database is locked``.  When
+``LIBRARY_SQLITE_TUNING`` is on, :func:`configure_connection` runs the
+``LIBRARY_SQLITE_PRAGMAS`` on every new SQLite connection:
+
+* ``journal_mode=wal`` lets readers keep reading the last committed
+  snapshot while a writer appends to the write-ahead log;
+* ``synchronous=normal`` only syncs the log at checkpoints, which is
+  still crash-safe in WAL mode;
+* ``busy_timeout`` makes writers wait for each other instead of failing;
+* ``mmap_size`` and ``cache_size`` keep the hot pages in memory.
+
+The settings module pairs this with ``CONN_MAX_AGE`` and
+``CONN_HEALTH_CHECKS`` so the pragmas run once per connection rather
+than once per request.
+
+SQLite also has no row locks.  :func:`lock_for_update` gives code that
+reads rows before writing them the same guarantee as ``SELECT ... FOR
+UPDATE`` on other databases.  Its integers are signed 64-bit; check
+client-supplied numbers with :func:`fits_integer` before they reach a
+query, as binding a larger one raises ``OverflowError``.
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import F, QuerySet
+
+
+INTEGER_MIN: int = -(2**63)
+INTEGER_MAX: int = 2**63 - 1
+
+
+def configure_connection(sender, connection, **kwargs) -> None:
+    """Apply ``LIBRARY_SQLITE_PRAGMAS`` to a newly opened SQLite connection."""
+    if connection.vendor != "sqlite" or not settings.LIBRARY_SQLITE_TUNING:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.LIBRARY_SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def fits_integer(value: int) -> bool:
+    """True if ``value`` can be stored in (and compared with) an SQLite INTEGER."""
+    return INTEGER_MIN <= value <= INTEGER_MAX
+
+
+def pragma(connection, name: str):
+    """Return the current value of the pragma ``name`` on ``connection``."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA {name}")
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def lock_for_update(queryset: QuerySet, field: str) -> QuerySet:
+    """
+    Return ``queryset.select_for_update()``, which also locks on SQLite.
+
+    SQLite ignores ``FOR UPDATE``, so there a no-op write of ``field`` to
+    the rows first takes the database write lock for the rest of the
+    transaction: a concurrent writer then waits (``busy_timeout``) instead
+    of failing when its read is upgraded to a write.
+    """
+    if not connections[router.db_for_write(queryset.model)].features.has_select_for_update:
+        queryset.update(**{field: F(field)})
+    return queryset.select_for_update()
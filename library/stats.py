@@ -0,0 +1,256 @@
+"""
+Materialized per-category and library-wide statistics.
+
+Counting books, copies and open loans per category means aggregating
+over every book and loan.  Instead :class:`~library.models.CategoryStats`
+keeps one row of counts per category, and every path that changes those
+numbers applies its change with :func:`apply` in its own transaction:
+
+* borrowing and returning (:mod:`library.circulation`) move a copy
+  between ``available_copies`` and ``open_loans``;
+* saving and deleting a book (:mod:`library.signals`) and the bulk paths
+  (the batch API, ``import_catalog``) subtract the books' old counts and
+  add their new ones, see :func:`book_deltas`.  A book moved to another
+  category takes its open loans along.
+
+Updates are relative (``F() + n``), so concurrent writers never overwrite
+each other.  Reads cost one row per category; the library-wide totals
+are the sum of those rows.  :func:`rebuild` recomputes every row from the
+books and loans, for ``manage.py rebuild_stats`` and after writes that
+bypass these paths.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, fields
+from typing import Iterable, Mapping, NamedTuple
+
+from django.db import transaction
+from django.db.models import Count, F, Subquery, Sum
+from django.utils import timezone
+
+from .models import Book, Borrow, Category, CategoryStats
+
+
+# Counters of a :class:`CategoryStats` row, in API order.
+COUNTERS: tuple[str, ...] = ("books", "total_copies", "available_copies", "open_loans")
+
+
+@dataclass
+class Delta:
+    """A change to the counters of one category."""
+
+    books: int = 0
+    total_copies: int = 0
+    available_copies: int = 0
+    open_loans: int = 0
+
+    def __bool__(self) -> bool:
+        return any(getattr(self, field.name) for field in fields(self))
+
+    def add(self, other: "Delta") -> None:
+        for field in fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+
+class BookCounts(NamedTuple):
+    """What one book contributes to its category's counters."""
+
+    category_id: int
+    total_copies: int
+    available_copies: int
+    open_loans: int = 0
+
+    @classmethod
+    def of(cls, book: Book, open_loans: int = 0) -> "BookCounts":
+        return cls(book.category_id, book.total_copies, book.available_copies, open_loans)
+
+
+def book_deltas(
+    removed: Iterable[BookCounts] = (), added: Iterable[BookCounts] = ()
+) -> dict[int, Delta]:
+    """
+    Per-category deltas for books going from ``removed`` to ``added``.
+
+    A created book is only added and a deleted one only removed.  For
+    updated books use :func:`updated_book_deltas`.
+    """
+    deltas: dict[int, Delta] = defaultdict(Delta)
+    for sign, books in ((-1, removed), (1, added)):
+        for category_id, *counts in books:
+            deltas[category_id].add(Delta(sign, *(sign * count for count in counts)))
+    return deltas
+
+
+def updated_book_deltas(
+    before: Mapping[int, BookCounts], books: Iterable[Book]
+) -> dict[int, Delta]:
+    """
+    Per-category deltas for ``books`` updated from ``before`` (by book id).
+
+    Open loans move with books that changed category; they are counted
+    with one query for those books only.
+    """
+    books = list(books)
+    moved = [book.pk for book in books if book.category_id != before[book.pk].category_id]
+    loans = dict(
+        Borrow.objects.open()
+        .filter(book_id__in=moved)
+        .order_by()
+        .values("book_id")
+        .annotate(count=Count("id"))
+        .values_list("book_id", "count")
+    ) if moved else {}
+    return book_deltas(
+        removed=[before[book.pk]._replace(open_loans=loans.get(book.pk, 0)) for book in books],
+        added=[BookCounts.of(book, loans.get(book.pk, 0)) for book in books],
+    )
+
+
+def _changes(delta: Delta) -> dict:
+    """``update()`` arguments adding ``delta`` to a row."""
+    changes = {
+        name: F(name) + getattr(delta, name) for name in COUNTERS if getattr(delta, name)
+    }
+    return {**changes, "updated_at": timezone.now()}
+
+
+def apply(deltas: Mapping[int, Delta]) -> None:
+    """Add ``deltas`` (by category id) to the stored counters."""
+    with transaction.atomic():
+        for category_id, delta in deltas.items():
+            if not delta:
+                continue
+            rows = CategoryStats.objects.filter(category_id=category_id)
+            if not rows.update(**_changes(delta)):
+                # A category created before its row existed.
+                CategoryStats.objects.get_or_create(category_id=category_id)
+                rows.update(**_changes(delta))
+
+
+def apply_to_book(book_id: int, delta: Delta) -> None:
+    """Add ``delta`` to the counters of the category of ``book_id``."""
+    category = Book.objects.filter(pk=book_id).values("category_id")
+    # One statement: the UPDATE looks the category up itself.
+    if not CategoryStats.objects.filter(category_id=Subquery(category)).update(
+        **_changes(delta)
+    ):
+        category_id = category.values_list("category_id", flat=True).first()
+        if category_id is not None:
+            apply({category_id: delta})
+
+
+def create_category_stats(sender, instance: Category, created: bool = False, **kwargs) -> None:
+    """Give a new category its (empty) statistics row."""
+    if created:
+        CategoryStats.objects.get_or_create(category=instance)
+
+
+def compute() -> dict[int, Delta]:
+    """Count every category's books, copies and open loans from scratch."""
+    counts: dict[int, Delta] = {
+        category_id: Delta() for category_id in Category.objects.values_list("id", flat=True)
+    }
+    books = (
+        Book.objects.order_by()
+        .values("category_id")
+        .annotate(
+            books=Count("id"),
+            total_copies=Sum("total_copies"),
+            available_copies=Sum("available_copies"),
+        )
+    )
+    for row in books:
+        delta = counts.setdefault(row["category_id"], Delta())
+        delta.books = row["books"]
+        delta.total_copies = row["total_copies"] or 0
+        delta.available_copies = row["available_copies"] or 0
+    loans = (
+        Borrow.objects.open()
+        .order_by()
+        .values("book__category_id")
+        .annotate(open_loans=Count("id"))
+    )
+    for row in loans:
+        counts.setdefault(row["book__category_id"], Delta()).open_loans = row["open_loans"]
+    return counts
+
+
+def stored() -> dict[int, Delta]:
+    """The counters as currently stored, by category id."""
+    return {
+        row["category_id"]: Delta(*(row[name] for name in COUNTERS))
+        for row in CategoryStats.objects.values("category_id", *COUNTERS)
+    }
+
+
+def _differences(
+    before: Mapping[int, Delta], actual: Mapping[int, Delta]
+) -> dict[int, tuple[Delta, Delta]]:
+    return {
+        category_id: (before.get(category_id, Delta()), delta)
+        for category_id, delta in actual.items()
+        if before.get(category_id) != delta
+    }
+
+
+def drift() -> dict[int, tuple[Delta, Delta]]:
+    """``{category_id: (stored, actual)}`` for categories whose counters are wrong."""
+    return _differences(stored(), compute())
+
+
+def rebuild() -> dict[int, tuple[Delta, Delta]]:
+    """
+    Recompute every category's counters and store them.
+
+    Returns what :func:`drift` returned just before: the categories whose
+    stored counters were wrong (or missing).
+    """
+    with transaction.atomic():
+        # Write first: this takes SQLite's write lock (or the rows' locks),
+        # so no borrow changes the counts between reading and storing them.
+        now = timezone.now()
+        CategoryStats.objects.update(updated_at=now)
+        before = stored()
+        wrong = _differences(before, compute())
+        rows = [
+            CategoryStats(category_id=category_id, updated_at=now, **vars(delta))
+            for category_id, (_, delta) in wrong.items()
+        ]
+        CategoryStats.objects.bulk_update(
+            [row for row in rows if row.category_id in before], [*COUNTERS, "updated_at"]
+        )
+        CategoryStats.objects.bulk_create(
+            row for row in rows if row.category_id not in before
+        )
+    return wrong
+
+
+def category_stats() -> list[dict]:
+    """The counters of every category, ordered by category name."""
+    rows = CategoryStats.objects.annotate(name=F("category__name")).order_by("name")
+    return [
+        {
+            "id": row.category_id,
+            "name": row.name,
+            **{name: getattr(row, name) for name in COUNTERS},
+            "copies_on_loan": row.copies_on_loan,
+        }
+        for row in rows
+    ]
+
+
+def library_totals(categories: Iterable[Mapping] | None = None) -> dict:
+    """
+    Library-wide counters: the sum of the category rows.
+
+    Pass the result of :func:`category_stats` if it was already read.
+    """
+    if categories is None:
+        sums = CategoryStats.objects.aggregate(*(Sum(name) for name in COUNTERS))
+        totals = {name: sums[f"{name}__sum"] or 0 for name in COUNTERS}
+    else:
+        totals = {name: sum(row[name] for row in categories) for name in COUNTERS}
+    totals["copies_on_loan"] = totals["total_copies"] - totals["available_copies"]
+    return totals
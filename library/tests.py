@@ -0,0 +1,871 @@
+import io
+import math
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    modify_settings,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import circulation, inventory, popularity, recommendations
+from .middleware import QueryProfilingMiddleware
+from .models import (
+    ArchivedBorrow,
+    Book,
+    BookChange,
+    Borrow,
+    Category,
+    DailyBorrowCount,
+    PopularBook,
+    PopularityRollup,
+    RelatedBook,
+    RelatedBooksIndex,
+)
+from .overdue import SCAN_ORDERING
+from .pagination import encode_cursor
+from .sqlite import pragma
+from .thumbnails import needs_variants
+from .views import HISTORY_ORDERING, books_cache_key
+
+
+def lend(user: User, book: Book, days_ago: float = 1, archived: bool = False) -> None:
+    """Record a settled loan made ``days_ago``, moved to the archive if ``archived``."""
+    borrowed_at = timezone.now() - timedelta(days=days_ago, minutes=2)
+    due_date = borrowed_at + timedelta(days=14)
+    loan = Borrow.objects.create(
+        borrower=user, book=book, borrowed_at=borrowed_at, due_date=due_date
+    )
+    if archived:
+        Borrow.objects.filter(pk=loan.pk).delete()
+        ArchivedBorrow.objects.create(
+            id=loan.pk,
+            borrower=user,
+            book=book,
+            borrowed_at=borrowed_at,
+            due_date=due_date,
+            returned_at=borrowed_at,
+        )
+
+
+class HotQueryPlanTests(TestCase):
+    """The hot queries are served by the indexes added for them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader", password="secret")
+        cls.category = Category.objects.create(name="Fiction")
+        book = Book.objects.create(
+            title="Dune", author="Frank Herbert", category=cls.category
+        )
+        now = timezone.now()
+        Borrow.objects.create(
+            borrower=cls.user, book=book, due_date=now - timedelta(days=1)
+        )
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f"USING INDEX {index}", plan)
+
+    def test_history_uses_borrower_recent_index(self):
+        history = (
+            Borrow.objects.select_related("book")
+            .filter(borrower=self.user)
+            .order_by(*HISTORY_ORDERING)
+        )
+        self.assertUsesIndex(history, "borrow_borrower_recent_idx")
+
+    def test_overdue_scan_uses_open_due_index(self):
+        overdue = Borrow.objects.overdue(timezone.now()).order_by(*SCAN_ORDERING)
+        self.assertUsesIndex(overdue, "borrow_open_due_idx")
+
+    def test_category_page_uses_category_title_index(self):
+        books = Book.objects.filter(category=self.category).order_by("title")
+        self.assertUsesIndex(books, "book_category_title_idx")
+
+
+class BookListApiTests(TestCase):
+    """Paging and streaming of the book list."""
+
+    BAD_VALUES = (
+        ["x", "abc"],
+        [None, None],
+        [1, [2]],
+        ["t", {"a": 1}],
+        ["a", 10**30],
+        ["a", -(10**30)],
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader", password="secret")
+        category = Category.objects.create(name="Fiction")
+        Book.objects.bulk_create(
+            Book(title=f"Book {n:02}", author="Anon", category=category)
+            for n in range(3)
+        )
+
+    def test_api_pages_with_valid_cursor(self):
+        url = reverse("library:api_books")
+        first = self.client.get(url, {"limit": 2}).json()
+        second = self.client.get(url, {"limit": 2, "cursor": first["next_cursor"]})
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual([book["title"] for book in second.json()["results"]], ["Book 02"])
+
+    def test_api_streams_every_book(self):
+        for fmt in ("json", "ndjson"):
+            with self.subTest(stream=fmt):
+                response = self.client.get(reverse("library:api_books"), {"stream": fmt})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.streaming)
+                body = b"".join(response.streaming_content).decode()
+                self.assertEqual(body.count('"title"'), 3)
+
+    def test_only_pages_are_cached(self):
+        factory = RequestFactory()
+        for params, cached in (
+            ({}, False),
+            ({"q": "dune"}, False),
+            ({"stream": "json"}, False),
+            ({"limit": 2}, True),
+            ({"cursor": "abc"}, True),
+        ):
+            with self.subTest(params=params):
+                request = factory.get(reverse("library:api_books"), params)
+                self.assertEqual(books_cache_key(request, "1") is not None, cached)
+
+    def test_api_rejects_mistyped_cursor(self):
+        for values in self.BAD_VALUES:
+            with self.subTest(values=values):
+                response = self.client.get(
+                    reverse("library:api_books"), {"cursor": encode_cursor(values)}
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_archive_history_rejects_mistyped_cursor(self):
+        self.client.force_login(self.user)
+        for values in self.BAD_VALUES:
+            with self.subTest(values=values):
+                response = self.client.get(
+                    reverse("library:my_history"), {"archive": 1, "cursor": encode_cursor(values)}
+                )
+                self.assertEqual(response.status_code, 404)
+
+
+class BatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Fiction")
+        cls.book = Book.objects.create(title="Dune", author="Frank Herbert", category=cls.category)
+
+    def test_update_with_invalid_id_is_reported_per_item(self):
+        items = [
+            {"op": "update", "id": [1]},
+            {"op": "update", "id": {"pk": 1}},
+            {"op": "update", "id": True},
+            {"op": "update", "id": self.book.pk, "title": "Dune Messiah"},
+        ]
+        response = self.client.post(
+            reverse("library:api_books_batch"), items, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 207)
+        statuses = [result["status"] for result in response.json()["results"]]
+        self.assertEqual(statuses, [400, 400, 400, 200])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "Dune Messiah")
+
+    def test_out_of_range_ids_are_reported_per_item(self):
+        items = [
+            {"op": "update", "id": 10**30},
+            {"op": "update", "id": self.book.pk, "category_id": 10**30},
+            {"title": "Children of Dune", "author": "Frank Herbert", "category_id": 10**30},
+            {"title": "Children of Dune", "author": "Frank Herbert", "category_id": self.category.pk},
+        ]
+        response = self.client.post(
+            reverse("library:api_books_batch"), items, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 207)
+        statuses = [result["status"] for result in response.json()["results"]]
+        self.assertEqual(statuses, [400, 404, 404, 201])
+
+
+class BookDetailApiTests(TestCase):
+    """Single-book writes, through the sync and the async views."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader", password="secret")
+        cls.category = Category.objects.create(name="Fiction")
+
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            category=self.category,
+            total_copies=2,
+            available_copies=2,
+        )
+
+    def test_create_update_delete(self):
+        for prefix in ("", "async_"):
+            with self.subTest(view=f"{prefix}api_books"):
+                response = self.client.post(
+                    reverse(f"library:{prefix}api_books"),
+                    {"title": "Emma", "author": "Jane Austen", "category_id": self.category.pk},
+                    content_type="application/json",
+                )
+                self.assertEqual(response.status_code, 201)
+                url = reverse(f"library:{prefix}api_book_detail", args=[response.json()["id"]])
+                response = self.client.put(
+                    url, {"total_copies": 4}, content_type="application/json"
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                self.assertEqual(self.client.delete(url).status_code, 404)
+        self.assertEqual(BookChange.objects.filter(deleted=True).count(), 2)
+
+    def test_delete_refused_while_borrowed(self):
+        circulation.borrow_book(self.user, self.book.pk)
+        for prefix in ("", "async_"):
+            with self.subTest(view=f"{prefix}api_book_detail"):
+                url = reverse(f"library:{prefix}api_book_detail", args=[self.book.pk])
+                self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertTrue(Book.objects.filter(pk=self.book.pk).exists())
+
+    def test_failed_side_effects_roll_the_update_back(self):
+        url = reverse("library:api_book_detail", args=[self.book.pk])
+        changes = BookChange.objects.count()
+        with mock.patch("library.signals.stats.apply", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.put(url, {"title": "Dune Messiah"}, content_type="application/json")
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "Dune")
+        self.assertEqual(BookChange.objects.count(), changes)
+
+
+class ChangeFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Fiction")
+        Book.objects.create(title="Dune", author="Frank Herbert", category=category)
+
+    def test_out_of_range_positions_are_rejected(self):
+        url = reverse("library:api_book_changes")
+        for params in (
+            {"since": 10**30},
+            {"since": 0, "cursor": encode_cursor([1, 10**30])},
+            {"since": 0, "cursor": encode_cursor([10**30, 1])},
+            {"since": 0, "cursor": encode_cursor([True, 1])},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_replay_then_follow(self):
+        url = reverse("library:api_book_changes")
+        replay = self.client.get(url, {"since": 0}).json()
+        self.assertEqual([change["book"]["title"] for change in replay["changes"]], ["Dune"])
+        self.assertFalse(replay["has_more"])
+        follow = self.client.get(url, {"since": replay["next_since"]}).json()
+        self.assertEqual(follow["changes"], [])
+
+
+class CoverVariantTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Fiction")
+
+    def save_book(self, cover) -> Book:
+        book = Book(title="Dune", author="Frank Herbert", category=self.category)
+        book.cover_image = cover
+        book.save()
+        book.refresh_from_db()
+        return book
+
+    def test_builds_variants_of_new_cover(self):
+        image = io.BytesIO()
+        Image.new("RGB", (600, 900), "navy").save(image, "JPEG")
+        book = self.save_book(SimpleUploadedFile("dune.jpg", image.getvalue()))
+        self.assertFalse(needs_variants(book))
+        self.assertTrue(book.covers)
+
+    def test_cover_that_is_not_an_image_is_skipped(self):
+        with self.assertLogs("library.thumbnails", "WARNING"):
+            book = self.save_book(SimpleUploadedFile("dune.jpg", b"not an image"))
+        self.assertEqual(book.cover_variants, {})
+        self.assertTrue(needs_variants(book))
+
+    def test_oversized_cover_is_skipped(self):
+        image = io.BytesIO()
+        Image.new("RGB", (600, 900), "navy").save(image, "JPEG")
+        # More than twice the limit is a DecompressionBombError.
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+            with self.assertLogs("library.thumbnails", "WARNING"):
+                book = self.save_book(SimpleUploadedFile("dune.jpg", image.getvalue()))
+        self.assertEqual(book.cover_variants, {})
+        self.assertTrue(needs_variants(book))
+
+    def test_missing_cover_file_is_skipped(self):
+        with self.assertLogs("library.thumbnails", "WARNING"):
+            book = self.save_book("book_covers/missing.jpg")
+        self.assertEqual(book.cover_variants, {})
+        self.assertTrue(needs_variants(book))
+
+
+class CirculationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader", password="secret")
+        category = Category.objects.create(name="Fiction")
+        cls.book = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            category=category,
+            total_copies=2,
+            available_copies=2,
+        )
+
+    def test_borrow_stops_at_zero_copies(self):
+        circulation.borrow_book(self.user, self.book.pk)
+        circulation.borrow_book(self.user, self.book.pk)
+        with self.assertRaises(circulation.BookUnavailable):
+            circulation.borrow_book(self.user, self.book.pk)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(Borrow.objects.filter(book=self.book).count(), 2)
+
+    def test_return_gives_the_copy_back_once(self):
+        loan = circulation.borrow_book(self.user, self.book.pk)
+        self.assertTrue(circulation.return_book(self.user, loan.pk))
+        self.assertFalse(circulation.return_book(self.user, loan.pk))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader", password="secret")
+        category = Category.objects.create(name="Fiction")
+        cls.dune, cls.emma, cls.ulysses = (
+            Book.objects.create(
+                title=title,
+                author="Anon",
+                category=category,
+                total_copies=copies,
+                available_copies=copies,
+            )
+            for title, copies in (("Dune", 2), ("Emma", 0), ("Ulysses", 1))
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def checkout(self, book_ids, **options):
+        return self.client.post(
+            reverse("library:api_checkout"),
+            {"book_ids": book_ids, **options},
+            content_type="application/json",
+        )
+
+    def statuses(self, response) -> list[tuple[int, str]]:
+        return [(entry["book_id"], entry["status"]) for entry in response.json()["results"]]
+
+    def test_everything_borrowed_is_200(self):
+        response = self.checkout([self.ulysses.pk, self.dune.pk, self.dune.pk])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.statuses(response),
+            [(self.dune.pk, "borrowed"), (self.ulysses.pk, "borrowed")],
+        )
+        self.assertEqual(Borrow.objects.filter(borrower=self.user).count(), 2)
+
+    def test_some_borrowed_is_207(self):
+        missing = self.ulysses.pk + 100
+        response = self.checkout([missing, self.emma.pk, self.dune.pk])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            self.statuses(response),
+            [(self.dune.pk, "borrowed"), (self.emma.pk, "unavailable"), (missing, "not_found")],
+        )
+
+    def test_nothing_borrowed_is_409(self):
+        response = self.checkout([self.emma.pk])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.statuses(response), [(self.emma.pk, "unavailable")])
+
+    def test_all_or_nothing_borrows_nothing_if_one_fails(self):
+        response = self.checkout([self.dune.pk, self.emma.pk], all_or_nothing=True)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            self.statuses(response),
+            [(self.dune.pk, "skipped"), (self.emma.pk, "unavailable")],
+        )
+        self.dune.refresh_from_db()
+        self.assertEqual(self.dune.available_copies, 2)
+        self.assertFalse(Borrow.objects.exists())
+
+    def test_invalid_ids_are_rejected(self):
+        for book_ids in ([], [True], ["1"], [10**30], [-(10**30)]):
+            with self.subTest(book_ids=book_ids):
+                self.assertEqual(self.checkout(book_ids).status_code, 400)
+
+    def test_books_are_locked_in_id_order(self):
+        with CaptureQueriesContext(connection) as queries:
+            circulation.checkout_books(self.user, [self.ulysses.pk, self.dune.pk])
+        statements = [query["sql"] for query in queries.captured_queries]
+        lock = next(index for index, sql in enumerate(statements) if sql.startswith("UPDATE"))
+        # SQLite: the no-op write takes the write lock before anything is read.
+        self.assertIn('SET "revision" = "library_book"."revision"', statements[lock])
+        self.assertRegex(statements[lock + 1], r'^SELECT .* ORDER BY "library_book"."id" ASC$')
+
+
+class InventoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader", password="secret")
+        category = Category.objects.create(name="Fiction")
+        cls.dune, cls.emma = (
+            Book.objects.create(
+                title=title,
+                author=author,
+                category=category,
+                total_copies=2,
+                available_copies=2,
+            )
+            for title, author in (("Dune", "Frank Herbert"), ("Emma", "Jane Austen"))
+        )
+
+    def corrupt(self, book: Book, available_copies: int) -> None:
+        """Change the counter behind the change log's back."""
+        Book.objects.filter(pk=book.pk).update(available_copies=available_copies)
+
+    def test_full_run_reports_then_repairs(self):
+        circulation.borrow_book(self.user, self.dune.pk)
+        self.corrupt(self.emma, 0)
+        run = inventory.reconcile(batch_size=1)
+        self.assertEqual((run.books_checked, run.discrepancies, run.repaired), (2, 1, 0))
+        self.assertIsNone(inventory.last_checkpoint())
+
+        found = []
+        run = inventory.reconcile(repair=True, report=found.append)
+        self.assertEqual((run.discrepancies, run.repaired), (1, 1))
+        self.assertEqual(
+            [(item.book_id, item.stored, item.expected) for item in found],
+            [(self.emma.pk, 0, 2)],
+        )
+        self.emma.refresh_from_db()
+        self.assertEqual(self.emma.available_copies, 2)
+        self.assertEqual(inventory.last_checkpoint(), run.through_change)
+
+    def test_incremental_run_checks_changed_books_only(self):
+        run = inventory.reconcile(incremental=True)
+        self.assertFalse(run.incremental)
+        self.assertEqual(inventory.last_checkpoint(), run.through_change)
+
+        self.corrupt(self.dune, 0)
+        circulation.borrow_book(self.user, self.emma.pk)
+        run = inventory.reconcile(incremental=True, repair=True)
+        self.assertTrue(run.incremental)
+        self.assertEqual((run.books_checked, run.discrepancies), (1, 0))
+        self.assertEqual(
+            run.through_change, BookChange.objects.order_by("-id").values_list("id", flat=True)[0]
+        )
+        # Only a full run sees writes that bypass the change log.
+        run = inventory.reconcile(repair=True)
+        self.assertEqual((run.books_checked, run.repaired), (2, 1))
+
+    def test_correct_counts_again_under_lock(self):
+        self.corrupt(self.dune, 1)
+        found = inventory._discrepancies(inventory._counts(Book.objects.all()))
+        self.assertEqual([(item.stored, item.expected) for item in found], [(1, 2)])
+
+        # A borrow commits between finding and correcting the counter.
+        circulation.borrow_book(self.user, self.dune.pk)
+        corrected = inventory.correct(found)
+        self.assertEqual([(item.stored, item.expected) for item in corrected], [(0, 1)])
+        self.dune.refresh_from_db()
+        self.assertEqual(self.dune.available_copies, 1)
+        self.assertEqual(inventory.correct(found), [])
+
+
+class PopularityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader", password="secret")
+        category = Category.objects.create(name="Fiction")
+        cls.books = [
+            Book.objects.create(title=title, author="Anon", category=category)
+            for title in ("Dune", "Emma", "Ulysses")
+        ]
+
+    def lend(self, book: Book, days_ago: float, archived: bool = False) -> None:
+        lend(self.user, book, days_ago, archived)
+
+    def test_top_books_ranks_each_window(self):
+        book_ids, ages, counts = [1, 2, 2, 3, 3], [0, 1, 20, 2, 40], [3, 2, 2, 3, 9]
+        rankings = popularity._top_books_python(
+            book_ids, ages, counts, {"week": 7, "month": 30, "year": 365}, 2
+        )
+        self.assertEqual(
+            rankings,
+            {
+                "week": [(1, 3), (3, 3)],
+                "month": [(2, 4), (1, 3)],
+                "year": [(3, 12), (2, 4)],
+            },
+        )
+
+    @skipUnless(popularity.numpy is not None, "NumPy is not installed")
+    def test_numpy_ranking_matches_python(self):
+        rng = random.Random(7)
+        size = 2000
+        book_ids = [rng.randint(1, 300) for _ in range(size)]
+        ages = [rng.randrange(365) for _ in range(size)]
+        # Few distinct counts, so ties straddle the limit.
+        counts = [rng.randint(1, 3) for _ in range(size)]
+        for limit in (0, 1, 10, 50, 1000):
+            with self.subTest(limit=limit):
+                self.assertEqual(
+                    popularity.top_books(book_ids, ages, counts, popularity.WINDOWS, limit),
+                    popularity._top_books_python(
+                        book_ids, ages, counts, popularity.WINDOWS, limit
+                    ),
+                )
+
+    def test_rollup_counts_new_loans_once(self):
+        dune, emma, ulysses = self.books
+        for _ in range(3):
+            self.lend(emma, 10)
+        self.lend(dune, 1)
+        self.lend(dune, 2, archived=True)
+        self.lend(ulysses, 400)
+        # Not settled yet: left for the next rollup.
+        Borrow.objects.create(
+            borrower=self.user, book=ulysses, due_date=timezone.now() + timedelta(days=14)
+        )
+        progress = []
+        rankings = popularity.rollup(batch_size=2, progress=lambda *args: progress.append(args))
+        self.assertEqual(rankings["week"], [(dune.pk, 2)])
+        self.assertEqual(rankings["month"], [(emma.pk, 3), (dune.pk, 2)])
+        self.assertEqual(progress[-1], (5, popularity.settled_loan_id()))
+        self.assertEqual(
+            list(PopularBook.objects.filter(window="month").values_list("rank", "book_id")),
+            [(1, emma.pk), (2, dune.pk)],
+        )
+        self.assertEqual(popularity.generation(), 1)
+
+        # Settled now, together with the older loan that was held back.
+        self.lend(ulysses, 0)
+        rankings = popularity.rollup(limit=1)
+        self.assertEqual(rankings["month"], [(emma.pk, 3)])
+        self.assertEqual(rankings["week"], [(dune.pk, 2)])
+        self.assertEqual(sum(DailyBorrowCount.objects.values_list("borrows", flat=True)), 7)
+        self.assertEqual(popularity.generation(), 2)
+
+    def test_rebuild_recounts_the_loan_history(self):
+        dune, emma, _ = self.books
+        self.lend(dune, 1)
+        self.lend(emma, 3, archived=True)
+        popularity.rollup()
+        DailyBorrowCount.objects.update(borrows=50)
+        DailyBorrowCount.objects.create(book=emma, day=timezone.localdate(), borrows=9)
+
+        rankings = popularity.rollup(rebuild=True)
+        self.assertEqual(rankings["week"], [(dune.pk, 1), (emma.pk, 1)])
+        self.assertEqual(DailyBorrowCount.objects.count(), 2)
+        self.assertEqual(
+            PopularityRollup.current().through_borrow, popularity.settled_loan_id()
+        )
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Fiction")
+        cls.users = [User.objects.create_user(f"reader{n}", password="secret") for n in range(5)]
+        cls.books = [
+            Book.objects.create(title=title, author="Anon", category=category)
+            for title in ("Dune", "Emma", "Ulysses", "Walden", "Beloved")
+        ]
+
+    def neighbours(self, book: Book) -> list[tuple[int, int, float]]:
+        return list(
+            RelatedBook.objects.filter(book=book)
+            .order_by("rank")
+            .values_list("related_id", "shared_patrons", "score")
+        )
+
+    def test_neighbours_are_scored_by_cosine_similarity(self):
+        incidence = recommendations.Incidence()
+        incidence.add([(1, 10), (2, 10), (3, 10), (4, 20), (5, 20), (1, 40)])
+        incidence.add((patron, 20) for patron in (1, 2, 3))
+        incidence.add((patron, 30) for patron in (4, 5))
+        self.assertEqual(incidence.neighbours(10, 5), [(20, 3, 3 / math.sqrt(15))])
+        self.assertEqual(
+            incidence.neighbours(20, 5), [(10, 3, 3 / math.sqrt(15)), (30, 2, 2 / math.sqrt(10))]
+        )
+        self.assertEqual(incidence.neighbours(20, 1), [(10, 3, 3 / math.sqrt(15))])
+        # Shared by one patron only.
+        self.assertEqual(incidence.neighbours(40, 5), [])
+        # Patron 1's basket is too large to count as shared, but still a reader.
+        with mock.patch.object(recommendations, "MAX_BASKET", 2):
+            self.assertEqual(incidence.neighbours(10, 5), [(20, 2, 2 / math.sqrt(15))])
+
+    def test_incremental_refresh_reads_only_the_affected_loans(self):
+        dune, emma, ulysses, walden, beloved = self.books
+        for user in self.users[:2]:
+            lend(user, dune)
+            lend(user, emma)
+        for user in self.users[2:4]:
+            lend(user, ulysses)
+            lend(user, walden, archived=True)
+        self.assertEqual(recommendations.refresh(), 5)
+        self.assertEqual(self.neighbours(ulysses), [(walden.pk, 2, 1.0)])
+        untouched = list(RelatedBook.objects.filter(book=dune).values_list("pk", flat=True))
+
+        lend(self.users[2], beloved)
+        lend(self.users[3], beloved, archived=True)
+        lend(self.users[4], walden)
+        with mock.patch.object(
+            recommendations, "read_incidence", side_effect=AssertionError("full read")
+        ):
+            self.assertEqual(recommendations.refresh(), 3)
+        incremental = {book.pk: self.neighbours(book) for book in self.books}
+        self.assertEqual(
+            list(RelatedBook.objects.filter(book=dune).values_list("pk", flat=True)), untouched
+        )
+        self.assertEqual(
+            incremental[walden.pk],
+            [(ulysses.pk, 2, 2 / math.sqrt(6)), (beloved.pk, 2, 2 / math.sqrt(6))],
+        )
+
+        recommendations.refresh(full=True)
+        self.assertEqual({book.pk: self.neighbours(book) for book in self.books}, incremental)
+        self.assertEqual(RelatedBooksIndex.current().generation, 3)
+
+
+@override_settings(LIBRARY_SQLITE_TUNING=True)
+class ConcurrentBorrowTests(TransactionTestCase):
+    """Concurrent borrows of one book never lend more copies than it has."""
+
+    def test_concurrent_borrows_do_not_oversell(self):
+        user = User.objects.create_user("reader", password="secret")
+        category = Category.objects.create(name="Fiction")
+        book = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            category=category,
+            total_copies=3,
+            available_copies=3,
+        )
+        threads = 8
+        start = threading.Barrier(threads)
+        outcomes: list[str] = []
+        errors: list[Exception] = []
+
+        def borrow():
+            try:
+                start.wait(10)
+                circulation.borrow_book(user, book.pk)
+                outcomes.append("borrowed")
+            except circulation.BookUnavailable:
+                outcomes.append("unavailable")
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=borrow) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+        self.assertEqual(errors, [])
+        self.assertEqual(outcomes.count("borrowed"), 3)
+        self.assertEqual(outcomes.count("unavailable"), threads - 3)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 0)
+        self.assertEqual(Borrow.objects.filter(book=book, returned_at__isnull=True).count(), 3)
+
+
+@override_settings(LIBRARY_SQLITE_TUNING=True)
+class ConcurrentReadTests(TransactionTestCase):
+    """With WAL, reads do not wait for a borrow that is still in progress."""
+
+    def test_read_during_borrow(self):
+        user = User.objects.create_user("reader", password="secret")
+        category = Category.objects.create(name="Fiction")
+        book = Book.objects.create(
+            title="Dune", author="Frank Herbert", category=category, total_copies=1
+        )
+        borrowing, done = threading.Event(), threading.Event()
+        errors: list[Exception] = []
+
+        def borrow():
+            try:
+                with transaction.atomic():
+                    circulation.borrow_book(user, book.pk)
+                    borrowing.set()
+                    done.wait(10)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                borrowing.set()
+                connection.close()
+
+        seen = {}
+
+        def read():
+            try:
+                seen["journal_mode"] = pragma(connection, "journal_mode")
+                seen["available"] = Book.objects.get(pk=book.pk).available_copies
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=borrow)
+        writer.start()
+        try:
+            self.assertTrue(borrowing.wait(10))
+            reader = threading.Thread(target=read)
+            started = time.monotonic()
+            reader.start()
+            reader.join(2)
+            elapsed = time.monotonic() - started
+            self.assertFalse(reader.is_alive(), "the read waited for the borrow")
+        finally:
+            done.set()
+            writer.join(10)
+        self.assertEqual(errors, [])
+        self.assertEqual(seen["journal_mode"], "wal")
+        # The reader sees the last committed state, before the borrow.
+        self.assertEqual(seen["available"], 1)
+        self.assertLess(elapsed, 1)
+        self.assertEqual(Book.objects.get(pk=book.pk).available_copies, 0)
+
+
+@override_settings(LIBRARY_SQLITE_TUNING=True)
+class ConcurrentWriteTests(TransactionTestCase):
+    """Catalog writes wait for a borrow in progress instead of undoing it."""
+
+    def write_during_borrow(self, send) -> tuple[Book, object]:
+        """Borrow a two-copy book and, before that commits, ``send(client, book)``."""
+        user = User.objects.create_user("reader", password="secret")
+        category = Category.objects.create(name="Fiction")
+        book = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            category=category,
+            total_copies=2,
+            available_copies=2,
+        )
+        borrowing, done = threading.Event(), threading.Event()
+        responses = []
+
+        def borrow():
+            try:
+                with transaction.atomic():
+                    circulation.borrow_book(user, book.pk)
+                    borrowing.set()
+                    done.wait(10)
+            finally:
+                borrowing.set()
+                connection.close()
+
+        def write():
+            try:
+                responses.append(send(self.client_class(), book))
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=borrow)
+        writer.start()
+        self.assertTrue(borrowing.wait(10))
+        updater = threading.Thread(target=write)
+        updater.start()
+        time.sleep(0.2)
+        done.set()
+        writer.join(10)
+        updater.join(10)
+        book.refresh_from_db()
+        return book, responses[0]
+
+    def test_batch_update_during_borrow(self):
+        book, response = self.write_during_borrow(
+            lambda client, book: client.post(
+                reverse("library:api_books_batch"),
+                [{"op": "update", "id": book.pk, "title": "Dune Messiah"}],
+                content_type="application/json",
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(book.title, "Dune Messiah")
+        self.assertEqual(book.available_copies, 1)
+
+    def test_update_during_borrow(self):
+        book, response = self.write_during_borrow(
+            lambda client, book: client.put(
+                reverse("library:api_book_detail", args=[book.pk]),
+                {"total_copies": 3},
+                content_type="application/json",
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(book.total_copies, 3)
+        # One copy on loan: 3 - 1, not the 2 + 1 read before the borrow.
+        self.assertEqual(book.available_copies, 2)
+
+
+@modify_settings(MIDDLEWARE={"prepend": "library.middleware.QueryProfilingMiddleware"})
+class QueryProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Fiction")
+        Book.objects.create(title="Dune", author="Frank Herbert", category=category)
+
+    def test_sync_request_is_profiled(self):
+        response = self.client.get(reverse("library:api_books"), {"limit": 5})
+        self.assertRegex(response["Server-Timing"], r'desc="[1-9]\d* queries"')
+
+    async def test_async_request_is_profiled(self):
+        response = await self.async_client.get(
+            reverse("library:async_api_books"), {"limit": 5}
+        )
+        self.assertRegex(response["Server-Timing"], r'desc="[1-9]\d* queries"')
+
+    def test_runs_natively_in_async_stack(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(QueryProfilingMiddleware(get_response)))
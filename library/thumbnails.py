@@ -0,0 +1,141 @@
+"""
+Fixed-size cover image variants.
+
+Every cover upload is rendered into the variants configured in
+``LIBRARY_COVER_VARIANTS`` (for the catalog grid, the detail page and a
+2x detail image for high-density screens).  Variants are cropped to their
+exact size, so templates can reserve the space with ``width`` and
+``height``, and are stored under a name derived from their content hash,
+so a URL never changes meaning and can be cached forever.
+
+The names, sizes and source of a book's variants are kept in
+``Book.cover_variants``.  Variants are built when a book is saved with a
+new cover and by ``manage.py build_thumbnails`` for existing covers.  A
+cover that cannot be read or is not an image is logged and left without
+variants, so saving the book still succeeds and ``build_thumbnails`` picks
+it up again once the file is replaced.  The image work itself lives in
+:mod:`library.imaging`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, UnidentifiedImageError
+
+from .imaging import Rendered, render_variants
+from .models import Book, BookChange
+
+
+logger = logging.getLogger("library.thumbnails")
+
+VARIANT_DIR = "book_covers/variants"
+
+
+class Cover(NamedTuple):
+    """A stored variant, as exposed to templates and the API."""
+
+    url: str
+    width: int
+    height: int
+
+
+def variant_name(kind: str, data: bytes) -> str:
+    """Return the content-addressed storage name of a variant."""
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    return f"{VARIANT_DIR}/{kind}/{digest}.jpg"
+
+
+def store_variants(book_id: int, source_name: str, rendered: Rendered) -> dict:
+    """
+    Save rendered variants and record them on the book.
+
+    Files that already exist are not written again: the same name always
+    holds the same bytes.  The book's version stamp is bumped and the
+    change logged so cached API payloads and feed clients see the URLs.
+    """
+    variants: dict = {"source": source_name}
+    for kind, (data, width, height) in rendered.items():
+        name = variant_name(kind, data)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(data))
+        variants[kind] = {"name": name, "width": width, "height": height}
+    if Book.objects.filter(pk=book_id, cover_image=source_name).update(
+        cover_variants=variants, **Book.stamp()
+    ):
+        BookChange.record([book_id])
+    return variants
+
+
+def build_variants(book: Book) -> bool:
+    """
+    Render and store the variants of ``book``'s current cover.
+
+    Returns ``False``, after logging why, if the cover file is missing, is
+    not an image, or is one Pillow refuses to decode (too many pixels, bad
+    data); the book is then left without variants.
+    """
+    try:
+        with book.cover_image.open("rb") as source:
+            data = source.read()
+        rendered = render_variants(data, settings.LIBRARY_COVER_VARIANTS)
+    except (
+        OSError,
+        UnidentifiedImageError,
+        Image.DecompressionBombError,
+        ValueError,
+    ) as exc:
+        logger.warning(
+            "Cannot build cover variants of book %s from %s: %s",
+            book.pk,
+            book.cover_image.name,
+            exc,
+        )
+        return False
+    book.cover_variants = store_variants(book.pk, book.cover_image.name, rendered)
+    return True
+
+
+def needs_variants(book: Book) -> bool:
+    """True if the book has a cover whose variants are missing or stale."""
+    variants = book.cover_variants or {}
+    return bool(book.cover_image) and (
+        variants.get("source") != book.cover_image.name
+        or any(kind not in variants for kind in settings.LIBRARY_COVER_VARIANTS)
+    )
+
+
+def covers(book: Book) -> dict[str, Cover]:
+    """The stored variants of ``book`` by kind; empty until they are built."""
+    return stored_covers(book.cover_image.name, book.cover_variants)
+
+
+def stored_covers(source_name: str | None, variants: dict | None) -> dict[str, Cover]:
+    """
+    Like :func:`covers`, from the raw ``cover_image`` and ``cover_variants``.
+
+    For callers that read book columns with ``values()``.
+    """
+    variants = variants or {}
+    if not source_name or variants.get("source") != source_name:
+        return {}
+    return {
+        kind: Cover(default_storage.url(info["name"]), info["width"], info["height"])
+        for kind, info in variants.items()
+        if kind != "source"
+    }
+
+
+def cover_saved(sender, instance: Book, **kwargs) -> None:
+    """Build variants when a book is saved with a new cover."""
+    if needs_variants(instance):
+        build_variants(instance)
+    elif not instance.cover_image and instance.cover_variants:
+        Book.objects.filter(pk=instance.pk).update(cover_variants={}, **Book.stamp())
+        BookChange.record([instance.pk])
+        instance.cover_variants = {}
@@ -6,7 +6,7 @@ all library‑related pages (catalog, book detail, borrowing and history).
 """
 from django.urls import path
 
-from . import views
+from . import async_views, views
 from django.contrib.auth import views as auth_views
 
 
@@ -20,8 +20,33 @@ urlpatterns: list = [
     path("my-history/", views.my_history, name="my_history"),
     # API endpoint for books
     path("api/books/", views.api_books, name="api_books"),
+    # Batch create/update of books (JSON array or NDJSON body)
+    path("api/books/batch/", views.api_books_batch, name="api_books_batch"),
+    # Incremental change feed for catalog sync (``?since=<seq>``)
+    path("api/books/changes/", views.api_book_changes, name="api_book_changes"),
     # API endpoint for single book operations (GET, PUT, DELETE)
     path("api/books/<int:pk>/", views.api_book_detail, name="api_book_detail"),
+    # "Patrons also borrowed" neighbours of a book
+    path(
+        "api/books/<int:pk>/related/",
+        views.api_related_books,
+        name="api_related_books",
+    ),
+    # Borrow several books in one transaction (logged-in users)
+    path("api/checkout/", views.api_checkout, name="api_checkout"),
+    # Book, copy and loan counts per category and library-wide
+    path("api/stats/", views.api_stats, name="api_stats"),
+    # Hit/miss counters of the catalog page cache (staff only)
+    path("api/cache/stats/", views.api_cache_stats, name="api_cache_stats"),
+    # Async versions of the book endpoints for ASGI deployments; same
+    # parameters and responses as the views above.
+    path("async/books/<int:pk>/", async_views.book_detail, name="async_book_detail"),
+    path("async/api/books/", async_views.api_books, name="async_api_books"),
+    path(
+        "async/api/books/<int:pk>/",
+        async_views.api_book_detail,
+        name="async_api_book_detail",
+    ),
 
     # Authentication routes.  The login and registration pages provide
     # separate views for users to authenticate without relying on the
@@ -2,135 +2,275 @@
 
 from __future__ import annotations
 
+from typing import NamedTuple
+
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth import login as auth_login
 from django.shortcuts import get_object_or_404, redirect, render
-from django.utils import timezone
+from . import (
+    catalog,
+    changefeed,
+    circulation,
+    pagecache,
+    popularity,
+    recommendations,
+    search,
+    serializers,
+    stats,
+)
+from .conditional import conditional_json, query_fingerprint
+from .models import (
+    ArchivedBorrow,
+    Book,
+    BookChange,
+    Borrow,
+    CatalogRevision,
+    Category,
+    RelatedBooksIndex,
+)
+from .pagination import InvalidCursor, apply_cursor, chunked, paginate_keyset
+from .routers import replica_reads
+from .sqlite import INTEGER_MAX, fits_integer, lock_for_update
 from django.db import transaction
-from .models import Book, Category, Borrow
-from django.http import JsonResponse
+from django.db.models import QuerySet
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 import json
 
 
+# Keyset pagination for the books API.  Books are ordered by title with the
+# primary key as a tie breaker so that cursors stay stable when several
+# books share a title.
+API_BOOK_ORDERING: tuple[str, ...] = ("title", "id")
+# Ordering used when the client searches with ``q``: best matches first.
+API_SEARCH_ORDERING: tuple[str, ...] = ("search_rank", "id")
+# Ordering for ``sort=popular``: most borrowed first.
+API_POPULAR_ORDERING: tuple[str, ...] = ("popularity_rank", "id")
+API_DEFAULT_PAGE_SIZE: int = 50
+API_MAX_PAGE_SIZE: int = 500
+# Number of rows fetched per round trip (and written per chunk) when the
+# books API streams its response.
+API_STREAM_CHUNK_SIZE: int = 2000
+# Limits for the batch endpoint: rows per bulk statement and items per call.
+API_BATCH_DEFAULT_CHUNK_SIZE: int = 500
+API_BATCH_MAX_CHUNK_SIZE: int = 5000
+API_BATCH_MAX_ITEMS: int = 50_000
+# Most books one checkout may borrow.
+CHECKOUT_MAX_BOOKS: int = 20
+# Borrowing history, newest first, and the page size for archived loans.
+HISTORY_ORDERING: tuple[str, ...] = ("-borrowed_at", "-id")
+HISTORY_ARCHIVE_PAGE_SIZE: int = 50
+# Page sizes for the change feed.
+API_CHANGES_DEFAULT_LIMIT: int = 500
+API_CHANGES_MAX_LIMIT: int = 5000
+# Fields written by bulk_update for batch updates.
+BOOK_UPDATE_FIELDS: tuple[str, ...] = (
+    "title",
+    "author",
+    "category",
+    "total_copies",
+    "available_copies",
+    "revision",
+    "updated_at",
+)
+
+
+@replica_reads
 def book_list(request):
-    """Display a list of books with optional filtering by category."""
+    """
+    Display a list of books with optional filtering by category and search.
+
+    ``sort=popular`` lists the most borrowed books of ``window`` (week,
+    month or year) instead, as of the last popularity rollup.  Anonymous
+    catalog pages are served from the page cache until the catalog
+    revision (or the rollup) changes; search results are always rendered.
+    """
     category_id = request.GET.get("category")
-    categories = Category.objects.all().order_by("name")
-    books = Book.objects.select_related("category").all().order_by("title")
+    query = request.GET.get("q", "").strip()
+    window = None
+    if request.GET.get("sort") == "popular":
+        window = popularity.parse_window(request.GET.get("window"))
+    if query:
+        return _render_book_list(request, category_id, query, window)
+    variant = f"{CatalogRevision.current().revision}:{category_id or ''}"
+    if window is not None:
+        variant += f":{window}:{popularity.generation()}"
+    return pagecache.cached_page(
+        request,
+        variant,
+        lambda: _render_book_list(request, category_id, query, window),
+    )
+
+
+def _render_book_list(
+    request, category_id: str | None, query: str, window: str | None = None
+):
+    # Counts come from the materialized statistics, not a GROUP BY.
+    categories = Category.objects.select_related("stats").order_by("name")
+    books = Book.objects.all().order_by("title")
 
     if category_id:
         books = books.filter(category_id=category_id)
+    if query:
+        books = search.search_books(books, query).order_by("search_rank", "id")
+    if window is not None:
+        books = popularity.popular_books(books, window).order_by(*API_POPULAR_ORDERING)
 
     return render(
         request,
         "library/book_list.html",
         {
-            "books": books,
+            "rows": pagecache.book_rows(books),
             "categories": categories,
+            "totals": stats.library_totals(),
             "selected_category": category_id,
+            "query": query,
+            "windows": popularity.WINDOWS,
+            "window": window,
         },
     )
 
 
+@replica_reads
 def book_detail(request, pk: int):
-    """Display the details of a single book."""
+    """
+    Display the details of a single book and what its patrons also borrowed.
+
+    Cached for anonymous users per book revision and related books index
+    generation.
+    """
+    revision = Book.objects.filter(pk=pk).values_list("revision", flat=True).first()
+    if revision is None:
+        raise Http404("Book not found")
+    generation = RelatedBooksIndex.current().generation
+    return pagecache.cached_page(
+        request, f"{revision}:{generation}", lambda: _render_book_detail(request, pk)
+    )
+
+
+def _render_book_detail(request, pk: int):
     book = get_object_or_404(Book.objects.select_related("category"), pk=pk)
-    return render(request, "library/book_detail.html", {"book": book})
+    return render(
+        request,
+        "library/book_detail.html",
+        {"book": book, "related": list(recommendations.related_books(pk))},
+    )
 
 
 @login_required
-@transaction.atomic
 def borrow_book(request, pk: int):
     """Handle borrowing a book by the logged-in user."""
     if request.method != "POST":
-        return redirect("book_detail", pk=pk)
+        return redirect("library:book_detail", pk=pk)
 
-    # Lock the book row for the duration of the transaction
-    book = get_object_or_404(Book.objects.select_for_update(), pk=pk)
-    if book.available_copies <= 0:
+    try:
+        circulation.borrow_book(request.user, pk)
+    except Book.DoesNotExist:
+        raise Http404("Book not found")
+    except circulation.BookUnavailable:
         return render(
             request,
             "library/error.html",
             {"message": "No copies available."},
         )
 
-    Borrow.objects.create(
-        borrower=request.user,
-        book=book,
-        due_date=Borrow.default_due_date(),
-    )
-    book.available_copies -= 1
-    book.save(update_fields=["available_copies"])
-
     return redirect("library:my_history")
 
 
 @login_required
-@transaction.atomic
 def return_book(request, borrow_id: int):
     """Handle returning a borrowed book by the logged-in user."""
     if request.method != "POST":
         return redirect("library:my_history")
 
-    borrow = get_object_or_404(Borrow, pk=borrow_id, borrower=request.user)
-    if borrow.returned_at is not None:
-        return redirect("library:my_history")
-
-    # Lock the associated book row
-    book = Book.objects.select_for_update().get(pk=borrow.book_id)
-
-    borrow.returned_at = timezone.now()
-    borrow.save(update_fields=["returned_at"])
-
-    book.available_copies += 1
-    # Ensure we never exceed total_copies
-    if book.available_copies > book.total_copies:
-        book.available_copies = book.total_copies
-    book.save(update_fields=["available_copies"])
+    try:
+        circulation.return_book(request.user, borrow_id)
+    except Borrow.DoesNotExist:
+        raise Http404("Borrow record not found")
 
     return redirect("library:my_history")
 
 
 @login_required
+@replica_reads
 def my_history(request):
-    """Display the borrowing history of the logged-in user."""
+    """
+    Display the borrowing history of the logged-in user.
+
+    Open and recent loans come from the ``Borrow`` table.  Loans moved to
+    the archive are only read when the user pages into them with
+    ``?archive=1``, in keyset pages of ``HISTORY_ARCHIVE_PAGE_SIZE``.
+    """
+    if "archive" in request.GET:
+        archived = ArchivedBorrow.objects.select_related("book").filter(
+            borrower=request.user
+        )
+        try:
+            page, next_cursor = paginate_keyset(
+                archived,
+                HISTORY_ORDERING,
+                HISTORY_ARCHIVE_PAGE_SIZE,
+                request.GET.get("cursor") or None,
+            )
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        return render(
+            request,
+            "library/my_history.html",
+            {"borrows": page, "archive": True, "next_cursor": next_cursor},
+        )
+
     borrows = (
-        Borrow.objects.select_related("book", "book__category")
+        Borrow.objects.select_related("book")
         .filter(borrower=request.user)
-        .order_by("-borrowed_at")
+        .order_by(*HISTORY_ORDERING)
+    )
+    has_archive = ArchivedBorrow.objects.filter(borrower=request.user).exists()
+    return render(
+        request,
+        "library/my_history.html",
+        {"borrows": borrows, "archive": False, "has_archive": has_archive},
     )
-    return render(request, "library/my_history.html", {"borrows": borrows})
 
 
 # API endpoint to list and create books
 @require_http_methods(["GET", "POST"])
 @csrf_exempt
+@replica_reads
 def api_books(request):
     """
     API endpoint that supports GET and POST operations on books.
 
     * GET: returns a list of books with their basic details in JSON format.
+      Passing ``limit`` and/or ``cursor`` switches to keyset pagination and
+      returns ``{"results": [...], "next_cursor": ...}``.  Passing
+      ``stream=json`` or ``stream=ndjson`` streams every book as a JSON
+      array or as newline-delimited JSON with constant memory.  ``q``
+      restricts the list to books matching a full-text search, best
+      matches first.  ``sort=popular`` lists only the most borrowed books
+      of ``window`` (``week``, ``month`` or ``year``; default ``month``),
+      most borrowed first.  ``fields=id,title,...`` returns only those keys
+      of each book.  Responses carry an ``ETag`` derived from the catalog
+      revision (and the popularity rollup when sorted by popularity), and
+      pages are cached until it changes.
     * POST: accepts JSON payload to create a new book. Required fields are
       `title`, `author` and `category_id`. Optional field `total_copies` defaults to 1.
     """
-    # GET request: return all books
+    # GET request: return books, either paginated, streamed or all at once
     if request.method == "GET":
-        books = Book.objects.select_related("category").all()
-        data = [
-            {
-                "id": book.id,
-                "title": book.title,
-                "author": book.author,
-                "category": book.category.name,
-                "total_copies": book.total_copies,
-                "available_copies": book.available_copies,
-            }
-            for book in books
-        ]
-        return JsonResponse(data, safe=False)
+        stamp = CatalogRevision.current()
+        version = str(stamp.revision)
+        if "sort" in request.GET:
+            version += f"-{popularity.generation()}"
+        return conditional_json(
+            request,
+            etag=f"catalog-{version}",
+            last_modified=stamp.updated_at,
+            cache_key=books_cache_key(request, version),
+            build=lambda: _api_books_get(request),
+        )
 
     # POST request: create a new book
     try:
@@ -138,36 +278,375 @@ def api_books(request):
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON body"}, status=400)
 
-    title = payload.get("title")
-    author = payload.get("author")
-    category_id = payload.get("category_id")
-    total_copies = payload.get("total_copies", 1)
-    # Validate required fields
-    if not title or not author or not category_id:
+    try:
+        book = catalog.create_book(payload)
+    except catalog.BookPayloadError as exc:
+        return JsonResponse({"error": exc.message}, status=exc.status)
+    return JsonResponse(
+        {
+            "id": book.id,
+            "message": "Book created successfully",
+        },
+        status=201,
+    )
+
+
+def _requested_fields(request, representation):
+    """The sparse fieldset of ``request``; raises :class:`serializers.InvalidFields`."""
+    return serializers.select_fields(representation, request.GET.get("fields"))
+
+
+def _stream_books(rows, fields, fmt: str):
+    """Yield the serialized rows as a JSON array or as NDJSON lines."""
+    books = serializers.serialize_rows(rows, fields)
+    dumps = serializers.dumps
+    if fmt == "ndjson":
+        yield from chunked(
+            (dumps(book) + b"\n" for book in books), API_STREAM_CHUNK_SIZE
+        )
+        return
+    yield b"["
+    rows = ((b"," if index else b"") + dumps(book) for index, book in enumerate(books))
+    yield from chunked(rows, API_STREAM_CHUNK_SIZE)
+    yield b"]"
+
+
+STREAM_CONTENT_TYPES: dict[str, str] = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class BooksQuery(NamedTuple):
+    """What a ``GET /api/books/`` request asks for, validated."""
+
+    rows: QuerySet
+    fields: dict
+    ordering: tuple[str, ...]
+    cursor: str | None
+    # ``None`` returns the whole list at once.
+    limit: int | None
+    stream: str | None
+
+
+def books_cache_key(request, version: str) -> str | None:
+    """
+    The cache key of a ``GET /api/books/`` page, or ``None`` not to cache.
+
+    Streams and the unpaginated list (the whole catalog, stored anew after
+    every borrow) are not cached.
+    """
+    if "stream" in request.GET or (
+        request.GET.get("limit") is None and not request.GET.get("cursor")
+    ):
+        return None
+    return f"library:api_books:{version}:{query_fingerprint(request)}"
+
+
+def books_query(request) -> BooksQuery | JsonResponse:
+    """Parse the ``GET /api/books/`` parameters, or return a 400 response."""
+    books = Book.objects.all()
+    cursor = request.GET.get("cursor") or None
+    limit = request.GET.get("limit")
+    stream = request.GET.get("stream")
+    query = request.GET.get("q", "").strip()
+    sort = request.GET.get("sort")
+    try:
+        fields = _requested_fields(request, serializers.BOOK_LIST_FIELDS)
+    except serializers.InvalidFields as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    ordering = API_BOOK_ORDERING
+    if query:
+        books = search.search_books(books, query)
+        ordering = API_SEARCH_ORDERING
+    if sort is not None:
+        if sort != "popular":
+            return JsonResponse({"error": "sort must be 'popular'"}, status=400)
+        window = popularity.parse_window(request.GET.get("window"))
+        if window is None:
+            return JsonResponse(
+                {"error": f"window must be one of {', '.join(popularity.WINDOWS)}"},
+                status=400,
+            )
+        books = popularity.popular_books(books, window)
+        ordering = API_POPULAR_ORDERING
+    rows = serializers.book_values(books, fields, extra=ordering)
+
+    if stream is not None:
+        if stream not in STREAM_CONTENT_TYPES:
+            return JsonResponse(
+                {"error": "stream must be either 'json' or 'ndjson'"}, status=400
+            )
+        return BooksQuery(rows, fields, ordering, cursor, None, stream)
+
+    if limit is None and cursor is None:
+        return BooksQuery(rows, fields, ordering, None, None, None)
+
+    try:
+        limit = int(limit) if limit is not None else API_DEFAULT_PAGE_SIZE
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer"}, status=400)
+    if not 1 <= limit <= API_MAX_PAGE_SIZE:
         return JsonResponse(
-            {
-                "error": "Missing required fields: title, author and category_id must be provided"
-            },
+            {"error": f"limit must be between 1 and {API_MAX_PAGE_SIZE}"},
             status=400,
         )
+    return BooksQuery(rows, fields, ordering, cursor, limit, None)
+
+
+def _api_books_get(request):
+    """
+    Build the ``GET /api/books/`` payload for :func:`api_books`.
+
+    Returns the data to serialize, or a response for errors and streams.
+    """
+    query = books_query(request)
+    if isinstance(query, JsonResponse):
+        return query
+    rows, fields, ordering, cursor, limit, stream = query
+
+    if stream is not None:
+        try:
+            rows = apply_cursor(rows, ordering, cursor)
+        except InvalidCursor:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
+        return StreamingHttpResponse(
+            _stream_books(rows.iterator(chunk_size=API_STREAM_CHUNK_SIZE), fields, stream),
+            content_type=STREAM_CONTENT_TYPES[stream],
+        )
+
+    if limit is None:
+        return list(serializers.serialize_rows(rows.order_by(*ordering), fields))
+
     try:
-        category = Category.objects.get(pk=category_id)
-    except Category.DoesNotExist:
-        return JsonResponse({"error": "Category not found"}, status=404)
-    # Create the book
-    book = Book.objects.create(
-        title=title,
-        author=author,
-        category=category,
-        total_copies=total_copies,
-        available_copies=total_copies,
+        page, next_cursor = paginate_keyset(rows, ordering, limit, cursor)
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    return {
+        "results": list(serializers.serialize_rows(page, fields)),
+        "next_cursor": next_cursor,
+    }
+
+
+def _parse_batch_body(request) -> list:
+    """
+    Parse a batch body as a JSON array or as NDJSON.
+
+    Returns a list with one entry per item; lines of an NDJSON body that are
+    not valid JSON objects are kept as ``None`` so they can be reported
+    individually.  Raises ``ValueError`` if a JSON array body is malformed.
+    """
+    body = request.body.decode("utf-8")
+    content_type = request.content_type or ""
+    if content_type != "application/x-ndjson" and body.lstrip().startswith("["):
+        items = json.loads(body)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array")
+        return items
+    items = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except json.JSONDecodeError:
+            items.append(None)
+    return items
+
+
+@require_http_methods(["POST"])
+@csrf_exempt
+def api_books_batch(request):
+    """
+    Create and update many books in one request and one transaction.
+
+    The body is a JSON array or NDJSON (one object per line).  Items with
+    ``"op": "update"`` (or with an ``id`` and no ``op``) update that book
+    like ``PUT /api/books/<id>/``; other items create a book like ``POST
+    /api/books/``, with the same validation.  Every referenced category and
+    book is loaded with one query each.  Valid items are written with
+    ``bulk_create`` / ``bulk_update`` in chunks of ``chunk_size`` rows.
+    Invalid items are skipped.  The response lists a result for every item
+    in input order.
+    """
+    try:
+        chunk_size = int(request.GET.get("chunk_size", API_BATCH_DEFAULT_CHUNK_SIZE))
+    except ValueError:
+        return JsonResponse({"error": "chunk_size must be an integer"}, status=400)
+    if not 1 <= chunk_size <= API_BATCH_MAX_CHUNK_SIZE:
+        return JsonResponse(
+            {"error": f"chunk_size must be between 1 and {API_BATCH_MAX_CHUNK_SIZE}"},
+            status=400,
+        )
+    try:
+        items = _parse_batch_body(request)
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+    if len(items) > API_BATCH_MAX_ITEMS:
+        return JsonResponse(
+            {"error": f"A batch may contain at most {API_BATCH_MAX_ITEMS} items"},
+            status=400,
+        )
+
+    results: list[dict | None] = [None] * len(items)
+    creates: list[tuple[int, dict]] = []
+    updates: list[tuple[int, dict]] = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {"index": index, "status": 400, "error": "Invalid JSON object"}
+            continue
+        op = item.get("op") or ("update" if "id" in item else "create")
+        if op == "create":
+            creates.append((index, item))
+        elif op == "update":
+            book_id = item.get("id")
+            if (
+                isinstance(book_id, int)
+                and not isinstance(book_id, bool)
+                and fits_integer(book_id)
+            ):
+                updates.append((index, item))
+            else:
+                results[index] = {
+                    "index": index,
+                    "status": 400,
+                    "error": "id must be an integer",
+                }
+        else:
+            results[index] = {
+                "index": index,
+                "status": 400,
+                "error": "op must be either 'create' or 'update'",
+            }
+
+    resolve_category = catalog.category_resolver(
+        item["category_id"]
+        for _, item in creates + updates
+        if item.get("category_id") is not None
     )
+
+    with transaction.atomic():
+        new_books: list[tuple[int, Book]] = []
+        for index, item in creates:
+            try:
+                new_books.append((index, catalog.build_book(item, resolve_category)))
+            except catalog.BookPayloadError as exc:
+                results[index] = {"index": index, "status": exc.status, "error": exc.message}
+
+        existing = lock_for_update(
+            Book.objects.filter(pk__in={item["id"] for _, item in updates}), "revision"
+        ).in_bulk()
+        counts_before = {pk: stats.BookCounts.of(book) for pk, book in existing.items()}
+        changed: dict[int, Book] = {}
+        for index, item in updates:
+            book = existing.get(item["id"])
+            if book is None:
+                results[index] = {"index": index, "status": 404, "error": "Book not found"}
+                continue
+            try:
+                catalog.apply_book_changes(book, item, resolve_category)
+            except catalog.BookPayloadError as exc:
+                results[index] = {"index": index, "status": exc.status, "error": exc.message}
+                continue
+            book.touch()
+            changed[book.pk] = book
+            results[index] = {"index": index, "status": 200, "id": book.pk}
+
+        Book.objects.bulk_create([book for _, book in new_books], batch_size=chunk_size)
+        Book.objects.bulk_update(
+            list(changed.values()), BOOK_UPDATE_FIELDS, batch_size=chunk_size
+        )
+        if new_books or changed:
+            BookChange.record(
+                [book.pk for _, book in new_books] + list(changed), batch_size=chunk_size
+            )
+            stats.apply(stats.updated_book_deltas(counts_before, changed.values()))
+            stats.apply(
+                stats.book_deltas(added=[stats.BookCounts.of(book) for _, book in new_books])
+            )
+    for index, book in new_books:
+        results[index] = {"index": index, "status": 201, "id": book.pk}
+
+    failed = sum(1 for result in results if result["status"] >= 400)
     return JsonResponse(
         {
-            "id": book.id,
-            "message": "Book created successfully",
+            "created": len(new_books),
+            "updated": sum(1 for result in results if result["status"] == 200),
+            "failed": failed,
+            "results": results,
         },
-        status=201,
+        status=200 if not failed else 207,
+    )
+
+
+def _book_detail(pk: int, fields):
+    """Build the ``GET /api/books/<pk>/`` payload for :func:`api_book_detail`."""
+    row = serializers.book_values(Book.objects.filter(pk=pk), fields).first()
+    if row is None:
+        return JsonResponse({"error": "Book not found"}, status=404)
+    return serializers.serialize(row, fields)
+
+
+@require_http_methods(["GET"])
+def api_book_changes(request):
+    """
+    Return books created, updated or deleted after the sequence ``since``.
+
+    The response is ``{"changes": [...], "next_since": ..., "next_cursor":
+    ..., "has_more": ...}``.  Each change carries ``seq``, ``id`` and
+    ``deleted``; changes that are not deletions also carry the book in the
+    ``api_books`` list representation, in its current state.
+
+    A new client starts with ``since=0``, which replays the whole catalog:
+    it follows ``next_cursor`` (passed back as ``cursor``) while
+    ``has_more`` is true.  After that, and for every later sync, it
+    passes ``next_since`` back as ``since``.  A client that fell behind
+    log compaction gets 410 and must start over from ``since=0``.
+    """
+    cursor = request.GET.get("cursor") or None
+    try:
+        since = int(request.GET.get("since", "0" if cursor else ""))
+        limit = int(request.GET.get("limit", API_CHANGES_DEFAULT_LIMIT))
+    except ValueError:
+        return JsonResponse({"error": "since and limit must be integers"}, status=400)
+    if not 0 <= since <= INTEGER_MAX or not 1 <= limit <= API_CHANGES_MAX_LIMIT:
+        return JsonResponse(
+            {
+                "error": "since must be a non-negative 64-bit integer and limit "
+                f"between 1 and {API_CHANGES_MAX_LIMIT}"
+            },
+            status=400,
+        )
+
+    next_cursor = None
+    try:
+        if since == 0:
+            changes, next_since, next_cursor = changefeed.replay(cursor, limit)
+            has_more = next_cursor is not None
+        else:
+            changes, next_since, has_more = changefeed.changes_since(since, limit)
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    except changefeed.ResyncRequired as exc:
+        return JsonResponse(
+            {"error": "Changes were compacted; resync from since=0", "floor": exc.floor},
+            status=410,
+        )
+
+    results = []
+    for change in changes:
+        entry = {"seq": change.seq, "id": change.book_id, "deleted": change.deleted}
+        if not change.deleted:
+            entry["book"] = serializers.serialize_instance(change.book)
+        results.append(entry)
+    return JsonResponse(
+        {
+            "changes": results,
+            "next_since": next_since,
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+        }
     )
 
 
@@ -177,7 +656,11 @@ def api_book_detail(request, pk: int):
     """
     API endpoint to retrieve, update or delete a single book.
 
-    * GET: return details for the specified book.
+    * GET: return details for the specified book, or only the keys listed
+      in ``fields``.  The response carries an
+      ``ETag`` and ``Last-Modified`` derived from the book's revision, a
+      matching ``If-None-Match`` is answered with 304 without loading the
+      book, and the payload is cached until the book changes.
     * PUT: update a book's details using JSON payload. Supports updating
       `title`, `author`, `category_id`, and `total_copies`. When total_copies
       is reduced below the number of currently borrowed copies, the change is
@@ -185,23 +668,26 @@ def api_book_detail(request, pk: int):
     * DELETE: remove the book from the database if no copies are currently
       borrowed.
     """
-    try:
-        book = Book.objects.select_related("category").get(pk=pk)
-    except Book.DoesNotExist:
-        return JsonResponse({"error": "Book not found"}, status=404)
-
     # GET request: return the book details
     if request.method == "GET":
-        data = {
-            "id": book.id,
-            "title": book.title,
-            "author": book.author,
-            "category": book.category.name,
-            "category_id": book.category.id,
-            "total_copies": book.total_copies,
-            "available_copies": book.available_copies,
-        }
-        return JsonResponse(data)
+        try:
+            fields = _requested_fields(request, serializers.BOOK_DETAIL_FIELDS)
+        except serializers.InvalidFields as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        stamp = Book.objects.filter(pk=pk).values_list("revision", "updated_at").first()
+        if stamp is None:
+            return JsonResponse({"error": "Book not found"}, status=404)
+        revision, updated_at = stamp
+        variant = str(revision)
+        if "fields" in request.GET:
+            variant += ":" + ",".join(fields)
+        return conditional_json(
+            request,
+            etag=f"book-{pk}-{variant}",
+            last_modified=updated_at,
+            cache_key=f"library:api_book:{pk}:{variant}",
+            build=lambda: _book_detail(pk, fields),
+        )
 
     # PUT request: update book details
     if request.method == "PUT":
@@ -209,55 +695,126 @@ def api_book_detail(request, pk: int):
             payload = json.loads(request.body.decode("utf-8"))
         except json.JSONDecodeError:
             return JsonResponse({"error": "Invalid JSON body"}, status=400)
-        # Update simple string fields
-        title = payload.get("title")
-        author = payload.get("author")
-        category_id = payload.get("category_id")
-        total_copies = payload.get("total_copies")
-        if title is not None:
-            book.title = title
-        if author is not None:
-            book.author = author
-        if category_id is not None:
-            try:
-                category = Category.objects.get(pk=category_id)
-            except Category.DoesNotExist:
-                return JsonResponse({"error": "Category not found"}, status=404)
-            book.category = category
-        if total_copies is not None:
-            # Cannot set total copies below the number of borrowed copies
-            borrowed_copies = book.total_copies - book.available_copies
-            if total_copies < borrowed_copies:
-                return JsonResponse(
-                    {
-                        "error": "total_copies cannot be less than the number of currently borrowed copies"
-                    },
-                    status=400,
-                )
-            # Adjust available_copies relative to change in total_copies
-            diff = total_copies - book.total_copies
-            book.total_copies = total_copies
-            book.available_copies += diff
-            # Ensure available_copies never negative
-            if book.available_copies < 0:
-                book.available_copies = 0
-        # Save updates
-        book.save()
+        try:
+            catalog.update_book(pk, payload)
+        except catalog.BookPayloadError as exc:
+            return JsonResponse({"error": exc.message}, status=exc.status)
         return JsonResponse({"message": "Book updated successfully"})
 
-    # DELETE request: remove the book
-    if request.method == "DELETE":
-        # Only allow deletion if no copies are currently borrowed
-        borrowed_copies = book.total_copies - book.available_copies
-        if borrowed_copies > 0:
-            return JsonResponse(
-                {
-                    "error": "Cannot delete book while copies are borrowed"
-                },
-                status=400,
-            )
-        book.delete()
-        return JsonResponse({"message": "Book deleted successfully"}, status=204)
+    # DELETE request: remove the book if no copies are currently borrowed
+    try:
+        catalog.delete_book(pk)
+    except catalog.BookPayloadError as exc:
+        return JsonResponse({"error": exc.message}, status=exc.status)
+    return JsonResponse({"message": "Book deleted successfully"}, status=204)
+
+
+@require_http_methods(["GET"])
+@replica_reads
+def api_related_books(request, pk: int):
+    """
+    Books most often borrowed by the patrons of book ``pk``, best first.
+
+    Read from the index built by ``manage.py refresh_related_books``; the
+    ``ETag`` follows its generation, and the payload is cached until the
+    next refresh.
+    """
+    if not Book.objects.filter(pk=pk).exists():
+        return JsonResponse({"error": "Book not found"}, status=404)
+    index = RelatedBooksIndex.current()
+    return conditional_json(
+        request,
+        etag=f"related-{pk}-{index.generation}",
+        last_modified=index.refreshed_at or CatalogRevision.current().updated_at,
+        cache_key=f"library:api_related:{pk}:{index.generation}",
+        build=lambda: {
+            "book_id": pk,
+            "results": [
+                recommendations.serialize(entry)
+                for entry in recommendations.related_books(pk)
+            ],
+        },
+    )
+
+
+@require_http_methods(["POST"])
+def api_checkout(request):
+    """
+    Borrow several books for the logged-in user in one transaction.
+
+    The body is ``{"book_ids": [...], "all_or_nothing": false}``.  The
+    response lists every distinct book with ``status`` ``borrowed`` (and
+    the new ``borrow_id`` and ``due_date``), ``unavailable``, ``not_found``
+    or, when ``all_or_nothing`` is set and another book failed,
+    ``skipped``.  It is 200 if every book was borrowed, 207 if some were
+    and 409 if none were.  Session clients must send the CSRF token.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+    book_ids = payload.get("book_ids") if isinstance(payload, dict) else None
+    if (
+        not isinstance(book_ids, list)
+        or not book_ids
+        or not all(
+            isinstance(book_id, int) and not isinstance(book_id, bool) and fits_integer(book_id)
+            for book_id in book_ids
+        )
+    ):
+        return JsonResponse({"error": "book_ids must be a non-empty list of integers"}, status=400)
+    if len(set(book_ids)) > CHECKOUT_MAX_BOOKS:
+        return JsonResponse(
+            {"error": f"At most {CHECKOUT_MAX_BOOKS} books can be checked out at once"},
+            status=400,
+        )
+
+    try:
+        results = circulation.checkout_books(
+            request.user, book_ids, all_or_nothing=bool(payload.get("all_or_nothing"))
+        )
+    except circulation.CirculationError as exc:
+        return JsonResponse({"error": str(exc)}, status=409)
+
+    entries = []
+    for result in results:
+        entry = {"book_id": result.book_id, "status": result.status}
+        if result.borrow is not None:
+            entry["borrow_id"] = result.borrow.pk
+            entry["due_date"] = result.borrow.due_date
+        entries.append(entry)
+    borrowed = sum(1 for result in results if result.ok)
+    return JsonResponse(
+        {"borrowed": borrowed, "failed": len(results) - borrowed, "results": entries},
+        status=200 if borrowed == len(results) else 207 if borrowed else 409,
+    )
+
+
+@require_http_methods(["GET"])
+@replica_reads
+def api_stats(request):
+    """
+    Book, copy and loan counts per category and for the whole library.
+
+    ``copies_on_loan`` follows the books' ``available_copies`` counters
+    and ``open_loans`` counts unreturned loans; the two differ only if the
+    counters have drifted.  Read from the materialized statistics, so the
+    cost does not grow with the catalog.
+    """
+    categories = stats.category_stats()
+    return JsonResponse(
+        {"library": stats.library_totals(categories), "categories": categories}
+    )
+
+
+@require_http_methods(["GET"])
+def api_cache_stats(request):
+    """Page and fragment cache hit/miss counters, for staff users."""
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Staff only"}, status=403)
+    return JsonResponse(pagecache.stats())
 
 
 # ---------------------------------------------------------------------------